@@ -50,6 +50,7 @@ LOGOUT_REDIRECT_URL = '/usuarios/login/'  # <-- agregado
 # Middleware
 # =========================
 MIDDLEWARE = [
+    'bodega_app.metricas.MetricasMiddleware',  # primero: mide el request completo
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -61,12 +62,19 @@ MIDDLEWARE = [
 
 ROOT_URLCONF = 'BodegaMati.urls'
 
+# Métricas: requests más lentos que este umbral (ms) se registran con sus
+# consultas más caras; 0 lo desactiva. METRICAS_TOKEN permite a Prometheus
+# leer /metrics con "Authorization: Bearer <token>" sin sesión de admin.
+METRICAS_LENTO_MS = config("METRICAS_LENTO_MS", default=0, cast=int)
+METRICAS_TOKEN = config("METRICAS_TOKEN", default="")
+
 # =========================
 # Templates
 # =========================
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        # DjangoTemplates con el tiempo de render medido (ver bodega_app/metricas.py)
+        'BACKEND': 'bodega_app.metricas.DjangoTemplatesMedidos',
         'DIRS': [],  # Si tenés carpeta global /templates, agregala aquí
         'APP_DIRS': True,
         'OPTIONS': {
@@ -93,6 +101,63 @@ DATABASES = {
     )
 }
 
+# Réplica de solo lectura opcional para reportes, historial y exportaciones
+# (ver bodega_app/routers.py). En los tests apunta a la base principal.
+if config("DATABASE_REPLICA_URL", default=""):
+    DATABASES['replica'] = dj_database_url.parse(
+        config("DATABASE_REPLICA_URL"),
+        conn_max_age=600,
+        ssl_require=True
+    )
+    DATABASES['replica']['TEST'] = {'MIRROR': 'default'}
+
+DATABASE_ROUTERS = ['bodega_app.routers.ReplicaRouter']
+
+# =========================
+# Caché
+# =========================
+# El caché "default" (contadores, sellos de versión, tendencias) lo invalidan
+# tanto el servidor web como el runner de trabajos (worker en el Procfile),
+# que corre en otra máquina: por eso va en la base por defecto. La tabla la
+# crea `manage.py createcachetable` (paso release del Procfile; a mano en
+# desarrollo). Con web y runner en la misma máquina se puede usar el caché
+# en disco, que no consulta la base:
+# DJANGO_CACHE_BACKEND=django.core.cache.backends.filebased.FileBasedCache,
+# DJANGO_CACHE_LOCATION=/tmp/bodega_cache y TRABAJOS_CACHE_COMPARTIDO=True.
+# Los carritos solo los usa el servidor web: quedan en disco, compartidos
+# por sus workers de gunicorn.
+CACHES = {
+    'default': {
+        'BACKEND': config("DJANGO_CACHE_BACKEND", default='django.core.cache.backends.db.DatabaseCache'),
+        'LOCATION': config("DJANGO_CACHE_LOCATION", default="bodega_cache"),
+    },
+    'carritos': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': config("CARRITO_CACHE_DIR", default="/tmp/bodega_carritos"),
+    },
+}
+
+# Carrito de ventas (ver bodega_app/carrito.py)
+CARRITO_BACKEND = config("CARRITO_BACKEND", default="bodega_app.carrito.CacheCarrito")
+CARRITO_CACHE = 'carritos'
+CARRITO_TTL = 60 * 60 * 12
+
+# Descuento de stock al vender: "optimista" (UPDATE condicional) o "bloqueo" (SELECT FOR UPDATE)
+VENTA_MODO = config("VENTA_MODO", default="optimista")
+
+# Vencimiento de los contadores del dashboard (se invalidan con cada escritura)
+DASHBOARD_CACHE_TTL = config("DASHBOARD_CACHE_TTL", default=300, cast=int)
+
+# Meses completos que se conservan en Venta/DetalleVenta/Compra (ver bodega_app/archivo.py)
+ARCHIVO_MESES = config("ARCHIVO_MESES", default=24, cast=int)
+
+# Trabajos en segundo plano (ver bodega_app/trabajos.py y manage.py runjobs)
+# True si el runner comparte el disco con el servidor web (y con él el caché en disco)
+TRABAJOS_CACHE_COMPARTIDO = config("TRABAJOS_CACHE_COMPARTIDO", default=False, cast=bool)
+TRABAJOS_HILOS = config("TRABAJOS_HILOS", default=2, cast=int)
+# Un trabajo en curso sin avances durante este tiempo se da por interrumpido
+TRABAJOS_TIMEOUT_MINUTOS = config("TRABAJOS_TIMEOUT_MINUTOS", default=30, cast=int)
+
 # =========================
 # Validación de contraseñas
 # =========================
@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Usuario, Proveedor, Producto, Venta, DetalleVenta, Compra
+from .models import Usuario, Proveedor, Producto, Venta, DetalleVenta, Compra, OrdenCompra, ResumenDiario, ResumenProductoDiario, MovimientoStock, SnapshotStock, PeriodoArchivado, VentaArchivada, CompraArchivada, Trabajo
 
 @admin.register(Usuario)
 class UsuarioAdmin(admin.ModelAdmin):
@@ -13,8 +13,10 @@ class ProveedorAdmin(admin.ModelAdmin):
 
 @admin.register(Producto)
 class ProductoAdmin(admin.ModelAdmin):
-    list_display = ("nombre", "proveedor", "precio_compra", "precio_venta", "stock", "stock_minimo")
-    search_fields = ("nombre",)
+    list_display = ("nombre", "codigo", "proveedor", "precio_compra", "precio_venta", "stock", "stock_minimo")
+    search_fields = ("nombre", "codigo")
+    # El stock cambia por compras, ventas o editar_productos, que lo registran en el libro de movimientos
+    readonly_fields = ("stock",)
 
 class DetalleVentaInline(admin.TabularInline):
     model = DetalleVenta
@@ -28,5 +30,63 @@ class VentaAdmin(admin.ModelAdmin):
 
 @admin.register(Compra)
 class CompraAdmin(admin.ModelAdmin):
-    list_display = ("id", "fecha", "producto", "cantidad", "precio_total", "proveedor")
+    list_display = ("id", "fecha", "producto", "cantidad", "precio_total", "proveedor", "orden")
+    date_hierarchy = "fecha"
+
+class CompraInline(admin.TabularInline):
+    model = Compra
+    fields = ("producto", "cantidad", "precio_total")
+    readonly_fields = fields  # el stock se corrige desde la vista de la orden
+    extra = 0
+    can_delete = False
+
+@admin.register(OrdenCompra)
+class OrdenCompraAdmin(admin.ModelAdmin):
+    list_display = ("id", "fecha", "proveedor")
+    list_select_related = ("proveedor",)
+    date_hierarchy = "fecha"
+    inlines = [CompraInline]
+
+@admin.register(ResumenDiario)
+class ResumenDiarioAdmin(admin.ModelAdmin):
+    list_display = ("fecha", "cantidad_ventas", "total_ventas", "total_compras")
+    date_hierarchy = "fecha"
+
+@admin.register(ResumenProductoDiario)
+class ResumenProductoDiarioAdmin(admin.ModelAdmin):
+    list_display = ("fecha", "producto", "cantidad_vendida", "total_vendido", "cantidad_comprada", "total_comprado")
+    list_select_related = ("producto",)
+    date_hierarchy = "fecha"
+
+@admin.register(MovimientoStock)
+class MovimientoStockAdmin(admin.ModelAdmin):
+    list_display = ("fecha", "producto", "cantidad", "tipo", "referencia")
+    list_filter = ("tipo",)
+    list_select_related = ("producto",)
+    date_hierarchy = "fecha"
+
+@admin.register(SnapshotStock)
+class SnapshotStockAdmin(admin.ModelAdmin):
+    list_display = ("fecha", "producto", "stock")
+    list_select_related = ("producto",)
+    date_hierarchy = "fecha"
+
+@admin.register(PeriodoArchivado)
+class PeriodoArchivadoAdmin(admin.ModelAdmin):
+    list_display = ("mes", "ventas", "detalles", "compras", "archivado_en")
+
+@admin.register(VentaArchivada)
+class VentaArchivadaAdmin(admin.ModelAdmin):
+    list_display = ("id", "fecha", "tipo", "total")
     date_hierarchy = "fecha"
+
+@admin.register(CompraArchivada)
+class CompraArchivadaAdmin(admin.ModelAdmin):
+    list_display = ("id", "fecha", "producto_id", "cantidad", "precio_total")
+    date_hierarchy = "fecha"
+
+@admin.register(Trabajo)
+class TrabajoAdmin(admin.ModelAdmin):
+    list_display = ("id", "tipo", "estado", "progreso", "creado_por", "creado_en", "terminado_en")
+    list_filter = ("tipo", "estado")
+    list_select_related = ("creado_por",)
@@ -0,0 +1,132 @@
+"""
+Archivo de ventas y compras de meses cerrados.
+
+`archivar_mes` pasa las ventas (con sus detalles) y las compras de un mes a
+tablas compactas: una fila por venta con los detalles en una columna JSON,
+y las compras sin claves foráneas ni índices más allá de la fecha. Así las
+tablas calientes (Venta, DetalleVenta, Compra) y sus índices dejan de crecer
+con la historia.
+
+Los reportes, tendencias, márgenes y la reposición ya leen de ResumenDiario /
+ResumenProductoDiario, que siguen cubriendo los meses archivados. Como
+después ya no se pueden reconstruir, `archivar_mes` los recalcula con las
+filas que va a mover, en la misma transacción: un mes archivado antes de
+cargar el histórico de resúmenes no queda en cero. Lo que sí cambia después
+de archivar:
+
+- los meses se archivan del más viejo al más nuevo, y `limite_archivo` es
+  el primer día sin archivar;
+- la ingesta rechaza ventas anteriores al límite (no puede ver sus claves);
+- reconstruir_resumenes no recalcula días archivados;
+- las exportaciones CSV leen también las tablas de archivo.
+"""
+import io
+from datetime import timedelta
+from django.core.management import call_command
+from django.db import transaction
+from django.db.models import Exists, Max, Min, OuterRef
+from django.utils import timezone
+from .models import (
+    Compra, CompraArchivada, DetalleVenta, OrdenCompra, PeriodoArchivado, Venta, VentaArchivada,
+)
+from .periodos import rango_timestamps
+from .tendencias import siguiente_periodo
+
+LOTE = 2000
+
+def limite_archivo():
+    """Primer día del primer mes sin archivar, o None si no se archivó nada."""
+    ultimo = PeriodoArchivado.objects.aggregate(m=Max("mes"))["m"]
+    return siguiente_periodo(ultimo, "mes") if ultimo else None
+
+def corte_por_meses(meses, hoy=None):
+    """Primer día del mes que queda `meses` meses antes del actual: se archiva lo anterior."""
+    corte = (hoy or timezone.localdate()).replace(day=1)
+    for _ in range(meses):
+        corte = (corte - timedelta(days=1)).replace(day=1)
+    return corte
+
+def meses_a_archivar(corte):
+    """Meses (primer día) con ventas o compras en tablas calientes anteriores a `corte`."""
+    fechas = [
+        f for f in (
+            Venta.objects.aggregate(m=Min("fecha"))["m"],
+            Compra.objects.aggregate(m=Min("fecha"))["m"],
+        ) if f is not None
+    ]
+    if not fechas:
+        return []
+    mes = timezone.localdate(min(fechas)).replace(day=1)
+    meses = []
+    while mes < corte:
+        meses.append(mes)
+        mes = siguiente_periodo(mes, "mes")
+    return meses
+
+def _mover_ventas(ini, fin, lote):
+    ventas = detalles = 0
+    qs = Venta.objects.filter(fecha__gte=ini, fecha__lt=fin).order_by("id")
+    while True:
+        filas = list(qs.values_list("id", "fecha", "tipo", "total", "clave_cliente")[:lote])
+        if not filas:
+            return ventas, detalles
+        ids = [f[0] for f in filas]
+        por_venta = {}
+        for vid, pid, cantidad, precio, precio_actual, costo in (
+            DetalleVenta.objects.filter(venta_id__in=ids).order_by("id")
+            .values_list("venta_id", "producto_id", "cantidad", "precio_unitario",
+                         "producto__precio_venta", "costo_unitario")
+        ):
+            # Se guarda el precio efectivo: el actual del producto puede cambiar después
+            por_venta.setdefault(vid, []).append([pid, cantidad, int(precio or precio_actual), int(costo)])
+        VentaArchivada.objects.bulk_create([
+            VentaArchivada(id=vid, fecha=fecha, tipo=tipo, total=total, clave_cliente=clave,
+                           detalles=por_venta.get(vid, []))
+            for vid, fecha, tipo, total, clave in filas
+        ])
+        detalles += DetalleVenta.objects.filter(venta_id__in=ids).delete()[0]
+        # DELETE directo: el collector traería cada venta para mandar su post_delete
+        ventas += Venta.objects.filter(id__in=ids)._raw_delete(Venta.objects.db)
+
+def _mover_compras(ini, fin, lote):
+    compras = 0
+    qs = Compra.objects.filter(fecha__gte=ini, fecha__lt=fin).order_by("id")
+    while True:
+        filas = list(qs.values_list(
+            "id", "fecha", "producto_id", "proveedor_id", "orden_id", "cantidad", "precio_total",
+        )[:lote])
+        if not filas:
+            break
+        CompraArchivada.objects.bulk_create([
+            CompraArchivada(id=cid, fecha=fecha, producto_id=pid, proveedor_id=prov, orden_id=orden,
+                            cantidad=cantidad, precio_total=total)
+            for cid, fecha, pid, prov, orden, cantidad, total in filas
+        ])
+        compras += Compra.objects.filter(id__in=[f[0] for f in filas])._raw_delete(Compra.objects.db)
+    # Las órdenes del mes quedaron sin líneas
+    OrdenCompra.objects.filter(fecha__gte=ini, fecha__lt=fin).exclude(
+        Exists(Compra.objects.filter(orden=OuterRef("pk"))),
+    ).delete()
+    return compras
+
+@transaction.atomic
+def archivar_mes(mes, lote=LOTE):
+    """
+    Recalcula los resúmenes del mes de `mes` (hora local) y mueve sus
+    ventas, detalles y compras a las tablas de archivo en lotes de `lote`.
+    Devuelve el PeriodoArchivado.
+    """
+    mes = mes.replace(day=1)
+    ultimo_dia = siguiente_periodo(mes, "mes") - timedelta(days=1)
+    # Con los detalles todavía en las tablas calientes: es la última vez que se puede
+    call_command("reconstruir_resumenes", desde=mes.isoformat(), hasta=ultimo_dia.isoformat(), stdout=io.StringIO())
+    ini, fin = rango_timestamps(mes, ultimo_dia)
+    ventas, detalles = _mover_ventas(ini, fin, lote)
+    compras = _mover_compras(ini, fin, lote)
+    periodo, _ = PeriodoArchivado.objects.get_or_create(mes=mes)
+    periodo.ventas += ventas
+    periodo.detalles += detalles
+    periodo.compras += compras
+    periodo.archivado_en = timezone.now()
+    periodo.save()
+    return periodo
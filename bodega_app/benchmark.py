@@ -0,0 +1,209 @@
+"""
+Benchmark de vistas: siembra catálogos e históricos de distintos tamaños,
+recorre las vistas con el cliente de pruebas y mide consultas SQL, tiempo
+y tamaño de respuesta. Lo usan el comando `benchmark` y los tests.
+
+Los presupuestos viven en presupuestos_benchmark.json: la cantidad de
+consultas no debería depender del tamaño de los datos, el tiempo sí tiene
+un margen por tamaño.
+"""
+import io
+import json
+import statistics
+import threading
+import time
+from contextlib import nullcontext
+from datetime import timedelta
+from pathlib import Path
+from types import SimpleNamespace
+from django.core.management import call_command
+from django.db import connection, connections
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from .carrito import Carrito, get_backend
+from .models import DetalleVenta, Producto, Venta
+from .vender import VentaError, crear_venta
+from .versiones import cambiar_version
+
+PRESUPUESTOS = Path(__file__).with_name("presupuestos_benchmark.json")
+
+TAMANOS = {
+    # nombre: (productos, ventas, líneas por venta)
+    "chico": (50, 200, 3),
+    "mediano": (1000, 5000, 4),
+    "grande": (5000, 50000, 5),
+}
+
+def caches_aislados(nombre):
+    """
+    CACHES en memoria del proceso para una corrida: la base de pruebas está
+    aislada, pero el caché configurado (carritos, contadores, sellos) es el
+    real y no hay que vaciarlo ni llenarlo con datos sembrados.
+    """
+    return {
+        alias: {"BACKEND": "django.core.cache.backends.locmem.LocMemCache", "LOCATION": f"benchmark-{nombre}-{alias}"}
+        for alias in ("default", "carritos")
+    }
+
+DIAS_HISTORIAL = 60
+LINEAS_CARRITO = 20
+
+def sembrar(productos, ventas, lineas, lote=2000):
+    """Crea `productos`, `ventas` con `lineas` detalles cada una repartidas en DIAS_HISTORIAL días."""
+    Producto.objects.bulk_create(
+        [
+            Producto(nombre=f"Bench {i:06d}", precio_compra=50, precio_venta=100 + i % 50,
+                     stock=10**6, stock_minimo=i % 20)
+            for i in range(productos)
+        ],
+        batch_size=lote,
+    )
+    ids = list(Producto.objects.order_by("id").values_list("id", flat=True))
+    ahora = timezone.now()
+    for inicio in range(0, ventas, lote):
+        creadas = Venta.objects.bulk_create([
+            Venta(total=0, tipo="minorista", fecha=ahora - timedelta(days=n % DIAS_HISTORIAL))
+            for n in range(inicio, min(inicio + lote, ventas))
+        ])
+        DetalleVenta.objects.bulk_create(
+            [
+                DetalleVenta(venta_id=v.pk, producto_id=ids[(v.pk * 7 + j) % len(ids)],
+                             cantidad=1 + j, precio_unitario=100, costo_unitario=50)
+                for v in creadas for j in range(lineas)
+            ],
+            batch_size=lote,
+        )
+    call_command("reconstruir_resumenes", stdout=io.StringIO())
+    cambiar_version(Producto)
+
+def _cargar_carrito(client, producto_ids):
+    carrito = Carrito()
+    for p in Producto.objects.filter(id__in=producto_ids):
+        carrito.agregar(p, 1)
+    get_backend().guardar(SimpleNamespace(session=client.session, user=None), carrito)
+
+def escenarios():
+    """(nombre, preparar(client) o None, método, url)."""
+    ids = list(Producto.objects.order_by("id").values_list("id", flat=True)[:LINEAS_CARRITO])
+    return [
+        ("dashboard", None, "get", reverse("bodega:dashboard")),
+        ("ventas", lambda c: _cargar_carrito(c, ids), "get", reverse("bodega:ventas")),
+        ("confirmar_venta", lambda c: _cargar_carrito(c, ids), "get", reverse("bodega:confirmar_venta")),
+        ("reportes_mes", None, "get", reverse("bodega:reportes") + "?periodo=mes"),
+        ("tendencias_mes", None, "get", reverse("bodega:reportes_tendencias") + "?por=mes"),
+        ("ventas_historial", None, "get", reverse("bodega:ventas_historial")),
+        ("productos", None, "get", reverse("bodega:productos")),
+        ("productos_buscar", None, "get", reverse("bodega:productos_buscar") + "?q=bench 00"),
+    ]
+
+def medir(usuario, repeticiones=5, envolver=nullcontext):
+    """
+    Devuelve {vista: {"consultas", "ms", "bytes"}} (mediana de tiempo, máximo
+    de consultas). `envolver()` rodea cada pedido dentro de la medición: los
+    tests pasan captureOnCommitCallbacks(execute=True) para que también
+    cuente lo que corre después del COMMIT, que en un TestCase no llega.
+    """
+    client = Client()
+    client.force_login(usuario)
+    resultados = {}
+    for nombre, preparar, metodo, url in escenarios():
+        consultas, tiempos, tamano = [], [], 0
+        for _ in range(repeticiones):
+            if preparar:
+                preparar(client)
+            with CaptureQueriesContext(connection) as ctx:
+                t0 = time.perf_counter()
+                with envolver():
+                    resp = getattr(client, metodo)(url)
+                tiempos.append((time.perf_counter() - t0) * 1000)
+            if resp.status_code >= 400:
+                raise RuntimeError(f"{nombre}: HTTP {resp.status_code}")
+            consultas.append(len(ctx.captured_queries))
+            tamano = len(resp.content)
+        resultados[nombre] = {
+            "consultas": max(consultas),
+            "ms": round(statistics.median(tiempos), 2),
+            "bytes": tamano,
+        }
+    return resultados
+
+def medir_checkouts(modo, cajas=8, ventas_por_caja=25, lineas=5):
+    """
+    `cajas` hilos venden en paralelo el mismo carrito de `lineas` productos,
+    con stock para la mitad de los intentos. Devuelve vendidas, rechazadas,
+    stock final del primer producto y ventas por segundo. Solo tiene sentido
+    en PostgreSQL (SQLite serializa toda la base).
+    """
+    intentos = cajas * ventas_por_caja
+    productos = Producto.objects.bulk_create([
+        Producto(nombre=f"Concurrencia {modo} {i}", precio_compra=1, precio_venta=2, stock=intentos // 2)
+        for i in range(lineas)
+    ])
+    carrito = [{"producto_id": p.pk, "cantidad": 1} for p in productos]
+    barrera = threading.Barrier(cajas)
+    resultados = []
+    lock = threading.Lock()
+
+    def caja():
+        vendidas = rechazadas = 0
+        try:
+            barrera.wait()
+            for _ in range(ventas_por_caja):
+                try:
+                    crear_venta(carrito, modo=modo)
+                    vendidas += 1
+                except VentaError:
+                    rechazadas += 1
+        finally:
+            connections.close_all()
+        with lock:
+            resultados.append((vendidas, rechazadas))
+
+    hilos = [threading.Thread(target=caja) for _ in range(cajas)]
+    t0 = time.perf_counter()
+    for h in hilos:
+        h.start()
+    for h in hilos:
+        h.join()
+    segundos = time.perf_counter() - t0
+    vendidas = sum(v for v, _ in resultados)
+    return {
+        "vendidas": vendidas,
+        "rechazadas": sum(r for _, r in resultados),
+        "stock_final": Producto.objects.get(pk=productos[0].pk).stock,
+        "por_segundo": round(intentos / segundos, 1),
+    }
+
+def cargar_presupuestos(ruta=PRESUPUESTOS):
+    with open(ruta, encoding="utf-8") as f:
+        return json.load(f)
+
+def excesos(tamano, resultados, presupuestos):
+    """Lista de mensajes por cada vista que supera su presupuesto en `tamano`."""
+    errores = []
+    for vista, r in resultados.items():
+        p = presupuestos.get(vista)
+        if not p:
+            continue
+        if r["consultas"] > p["consultas"]:
+            errores.append(f"{vista} [{tamano}]: {r['consultas']} consultas (máx. {p['consultas']})")
+        limite_ms = p.get("ms", {}).get(tamano)
+        if limite_ms is not None and r["ms"] > limite_ms:
+            errores.append(f"{vista} [{tamano}]: {r['ms']} ms (máx. {limite_ms})")
+    return errores
+
+def tabla_comparativa(actual, anterior=None):
+    """Texto con una fila por vista y tamaño; si hay corrida anterior, agrega las diferencias."""
+    anterior = anterior or {}
+    filas = [f"{'vista':<18} {'tamaño':<8} {'consultas':>9} {'ms':>9} {'bytes':>9}  {'Δ consultas':>11} {'Δ ms':>9}"]
+    for tamano, vistas in actual.items():
+        for vista, r in vistas.items():
+            previo = anterior.get(tamano, {}).get(vista)
+            dq = f"{r['consultas'] - previo['consultas']:+d}" if previo else "-"
+            dms = f"{r['ms'] - previo['ms']:+.1f}" if previo else "-"
+            filas.append(
+                f"{vista:<18} {tamano:<8} {r['consultas']:>9} {r['ms']:>9.1f} {r['bytes']:>9}  {dq:>11} {dms:>9}"
+            )
+    return "\n".join(filas)
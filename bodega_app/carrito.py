@@ -0,0 +1,124 @@
+"""
+Carrito de ventas con almacenamiento intercambiable.
+
+El carrito se guarda en forma compacta, indexado por producto:
+`{"<producto_id>": [cantidad, precio, tipo, nombre]}`, así agregar, modificar
+o quitar una línea es O(1). El backend se elige con `settings.CARRITO_BACKEND`:
+
+- `CacheCarrito` (por defecto): usa el caché `settings.CARRITO_CACHE`; cada
+  click no reescribe la fila de `django_session`.
+- `SesionCarrito`: el comportamiento anterior, dentro de `request.session`.
+"""
+from django.conf import settings
+from django.core.cache import caches
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from django.utils.functional import cached_property
+from django.utils.module_loading import import_string
+
+class Carrito:
+    def __init__(self, lineas=None):
+        self.lineas = dict(lineas or {})
+
+    def __len__(self):
+        return len(self.lineas)
+
+    def __bool__(self):
+        return bool(self.lineas)
+
+    def __contains__(self, producto_id):
+        return str(producto_id) in self.lineas
+
+    def agregar(self, producto, cantidad, tipo="minorista"):
+        """Suma `cantidad` de `producto`; si ya está, conserva su precio y tipo."""
+        linea = self.lineas.get(str(producto.id))
+        if linea:
+            linea[0] += cantidad
+        else:
+            self.lineas[str(producto.id)] = [cantidad, int(producto.precio_venta), tipo, producto.nombre]
+
+    def cantidad(self, producto_id):
+        linea = self.lineas.get(str(producto_id))
+        return linea[0] if linea else 0
+
+    def modificar(self, producto_id, cantidad):
+        linea = self.lineas.get(str(producto_id))
+        if linea is None:
+            return False
+        linea[0] = cantidad
+        return True
+
+    def quitar(self, producto_id):
+        return self.lineas.pop(str(producto_id), None) is not None
+
+    def items(self):
+        """Líneas como dicts, en el orden en que se agregaron."""
+        return [
+            {
+                "producto_id": int(pid),
+                "producto": nombre,
+                "precio": precio,
+                "cantidad": cantidad,
+                "total": precio * cantidad,
+                "tipo": tipo,
+            }
+            for pid, (cantidad, precio, tipo, nombre) in self.lineas.items()
+        ]
+
+    @property
+    def total(self):
+        return sum(cantidad * precio for cantidad, precio, _, _ in self.lineas.values())
+
+class SesionCarrito:
+    """Guarda el carrito en la sesión (escribe django_session en cada cambio)."""
+    clave = "carrito"
+
+    def cargar(self, request):
+        datos = request.session.get(self.clave)
+        return Carrito(datos if isinstance(datos, dict) else None)
+
+    def guardar(self, request, carrito):
+        request.session[self.clave] = carrito.lineas
+        request.session.modified = True
+
+    def vaciar(self, request):
+        request.session.pop(self.clave, None)
+
+class CacheCarrito:
+    """Guarda el carrito en un caché de Django, indexado por sesión."""
+    def __init__(self, alias=None, timeout=None):
+        self.alias = alias or getattr(settings, "CARRITO_CACHE", "default")
+        self.timeout = timeout if timeout is not None else getattr(settings, "CARRITO_TTL", 60 * 60 * 12)
+
+    @cached_property
+    def cache(self):
+        return caches[self.alias]
+
+    def _clave(self, request):
+        # Con login la sesión siempre tiene clave; el usuario queda como respaldo.
+        sesion = request.session.session_key or f"u{request.user.pk}"
+        return f"carrito:{sesion}"
+
+    def cargar(self, request):
+        return Carrito(self.cache.get(self._clave(request)))
+
+    def guardar(self, request, carrito):
+        self.cache.set(self._clave(request), carrito.lineas, self.timeout)
+
+    def vaciar(self, request):
+        self.cache.delete(self._clave(request))
+
+_backend = None
+
+def get_backend():
+    global _backend
+    if _backend is None:
+        ruta = getattr(settings, "CARRITO_BACKEND", "bodega_app.carrito.CacheCarrito")
+        _backend = import_string(ruta)()
+    return _backend
+
+@receiver(setting_changed)
+def _descartar_backend(setting, **kwargs):
+    global _backend
+    if setting in ("CARRITO_BACKEND", "CARRITO_CACHE", "CARRITO_TTL", "CACHES"):
+        _backend = None
@@ -0,0 +1,135 @@
+"""
+Conciliación del stock contra la historia de compras y ventas.
+
+El stock esperado de un producto es lo comprado menos lo vendido, más los
+ajustes manuales e importaciones del libro de movimientos (que no dejan
+Compra ni DetalleVenta). Para los meses archivados, las compras y ventas ya
+no están en las tablas calientes: se toman de ResumenProductoDiario, que
+sigue cubriendo esos días.
+
+Los productos anteriores al libro traen un stock que la historia no explica
+(cargado a mano, importado sin compras). Para ellos se parte del saldo de
+apertura, el snapshot que dejó la migración del libro, y se suma solo lo
+posterior. Se lo reconoce por ser un snapshot sin movimientos previos: los
+de tomar_snapshots() siempre los tienen. Si el archivo llega al día de la
+apertura, ese día se toma entero como anterior a ella.
+
+Todo se calcula en la base con subconsultas agregadas por producto, de a
+`lote` productos por consulta (paginando por id), así recorrer un catálogo
+grande con mucha historia no trae filas de detalle a Python.
+
+Corregir un desvío fija el stock en el esperado y lo registra en el libro
+como movimiento "conciliacion". Ese tipo no entra en el esperado: si
+contara, cada corrección correría el esperado lo mismo que el stock.
+"""
+from django.db import transaction
+from django.db.models import Exists, IntegerField, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce, TruncDate
+from .archivo import limite_archivo
+from .contadores import invalidar_dashboard
+from .inventario import ORIGEN, registrar_movimientos
+from .models import Compra, DetalleVenta, MovimientoStock, Producto, ResumenProductoDiario, SnapshotStock
+from .versiones import cambiar_version
+
+LOTE = 1000
+# Movimientos que cambian el stock sin pasar por una compra o una venta
+TIPOS_AJUSTE = ("ajuste", "importacion")
+
+def _suma(qs, campo):
+    """Subconsulta con la suma de `campo` de `qs` para el producto de la fila externa (0 si no hay)."""
+    suma = qs.filter(producto=OuterRef("pk")).order_by().values("producto").annotate(s=Sum(campo)).values("s")
+    return Coalesce(Subquery(suma, output_field=IntegerField()), Value(0))
+
+def _con_esperado(limite):
+    """Productos anotados con `esperado`; `limite` es el de limite_archivo()."""
+    apertura = (
+        SnapshotStock.objects.filter(producto=OuterRef("pk"))
+        .filter(~Exists(MovimientoStock.objects.filter(producto=OuterRef("producto"), fecha__lte=OuterRef("fecha"))))
+        .order_by("fecha")[:1]
+    )
+    # Sin apertura, `desde` es el origen y cuenta toda la historia
+    desde = OuterRef("desde")
+    esperado = (
+        Coalesce(Subquery(apertura.values("stock")), Value(0))
+        + _suma(Compra.objects.filter(fecha__gt=desde), "cantidad")
+        - _suma(DetalleVenta.objects.filter(venta__fecha__gt=desde), "cantidad")
+        + _suma(MovimientoStock.objects.filter(tipo__in=TIPOS_AJUSTE, fecha__gt=desde), "cantidad")
+    )
+    if limite:
+        archivados = ResumenProductoDiario.objects.filter(fecha__lt=limite, fecha__gt=OuterRef("desde_dia"))
+        esperado = esperado + _suma(archivados, "cantidad_comprada") - _suma(archivados, "cantidad_vendida")
+    return (
+        Producto.objects
+        .annotate(desde=Coalesce(Subquery(apertura.values("fecha")), Value(ORIGEN)))
+        .annotate(desde_dia=TruncDate("desde"))
+        .annotate(esperado=esperado)
+    )
+
+def tandas(lote=LOTE):
+    """
+    Recorre el catálogo de a `lote` productos por consulta. Genera, por
+    tanda, (productos recorridos, desvíos), con un dict (id, nombre, codigo,
+    stock, esperado, diferencia) por producto cuyo stock no coincide.
+    """
+    ultimo, recorridos, limite = 0, 0, limite_archivo()
+    while True:
+        tanda = list(
+            _con_esperado(limite).filter(pk__gt=ultimo).order_by("id")
+            .values("id", "nombre", "codigo", "stock", "esperado")[:lote]
+        )
+        if not tanda:
+            return
+        ultimo = tanda[-1]["id"]
+        recorridos += len(tanda)
+        filas = [f for f in tanda if f["stock"] != f["esperado"]]
+        for f in filas:
+            f["diferencia"] = f["stock"] - f["esperado"]
+        yield recorridos, filas
+
+def desvios(lote=LOTE):
+    """Los desvíos de todas las tandas."""
+    for _, filas in tandas(lote):
+        yield from filas
+
+@transaction.atomic
+def corregir(ids):
+    """
+    Lleva al esperado el stock de los productos `ids` que sigan desviados.
+    Los que darían stock negativo (falta historia) no se tocan.
+    Devuelve (corregidos, omitidos) como listas de ids.
+    """
+    # Primero se bloquea y después se recalcula: así la suma ve las ventas que confirmaron mientras se esperaba
+    productos = {p.id: p for p in Producto.objects.select_for_update().filter(pk__in=ids).order_by("id")}
+    deltas, cambiados, omitidos = {}, [], []
+    for pid, esperado in _con_esperado(limite_archivo()).filter(pk__in=list(productos)).values_list("id", "esperado"):
+        p = productos[pid]
+        if p.stock == esperado:
+            continue
+        if esperado < 0:
+            omitidos.append(pid)
+            continue
+        deltas[pid] = esperado - p.stock
+        p.stock = esperado
+        cambiados.append(p)
+    if cambiados:
+        Producto.objects.bulk_create(cambiados, update_conflicts=True, unique_fields=["id"], update_fields=["stock"])
+        registrar_movimientos(deltas, "conciliacion")
+        invalidar_dashboard()  # bulk_create no dispara señales
+        cambiar_version(Producto)
+    return sorted(deltas), omitidos
+
+def conciliar(corregir_desvios=False, lote=LOTE, informar=None):
+    """
+    Lista los desvíos y, si `corregir_desvios`, los corrige con una
+    transacción por tanda; cada fila lleva "corregido". `informar`, si se
+    pasa, recibe la cantidad de productos recorridos después de cada tanda.
+    """
+    resultado = []
+    for recorridos, filas in tandas(lote):
+        corregidos = set(corregir([f["id"] for f in filas])[0]) if corregir_desvios and filas else set()
+        for f in filas:
+            f["corregido"] = f["id"] in corregidos
+        resultado += filas
+        if informar:
+            informar(recorridos)
+    return resultado
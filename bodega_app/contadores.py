@@ -0,0 +1,35 @@
+"""
+Contadores del dashboard servidos desde el caché de Django.
+
+Se invalidan al confirmar cualquier escritura de Producto, Venta o Compra
+(ver signals.py y las llamadas explícitas en operaciones masivas, que no
+disparan señales). DASHBOARD_CACHE_TTL es solo una red de seguridad.
+"""
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+from .models import Producto, ResumenDiario
+
+def _clave(hoy):
+    return f"dashboard:contadores:{hoy.isoformat()}"
+
+def _calcular(hoy):
+    return {
+        "total_productos": Producto.objects.count(),
+        "stock_bajo": Producto.objects.filter(stock__lte=F("stock_minimo")).count(),
+        "total_ventas_dia": (
+            ResumenDiario.objects.filter(fecha=hoy).values_list("total_ventas", flat=True).first() or 0
+        ),
+    }
+
+def contadores_dashboard():
+    hoy = timezone.localdate()
+    return cache.get_or_set(
+        _clave(hoy), lambda: _calcular(hoy), getattr(settings, "DASHBOARD_CACHE_TTL", 300),
+    )
+
+def invalidar_dashboard():
+    """Borra los contadores cuando la transacción en curso se confirma."""
+    transaction.on_commit(lambda: cache.delete(_clave(timezone.localdate())))
@@ -1,4 +1,7 @@
+from functools import wraps
+from django.http import JsonResponse
 from django.shortcuts import redirect
+from .routers import en_replica
 
 def rol_admin_required(view_func):
     def wrapper(request, *args, **kwargs):
@@ -8,3 +11,28 @@ def rol_admin_required(view_func):
             return view_func(request, *args, **kwargs)
         return redirect('bodega:dashboard')
     return wrapper
+
+def api_login_required(view_func):
+    """Como login_required, pero responde 401 en JSON en lugar de redirigir al login."""
+    @wraps(view_func)
+    def wrapper(request, *args, **kwargs):
+        if not request.user.is_authenticated:
+            return JsonResponse({"error": "Autenticación requerida."}, status=401)
+        return view_func(request, *args, **kwargs)
+    return wrapper
+
+def usar_replica(view_func):
+    """Las lecturas de la vista (y de su respuesta en streaming) van a la réplica, si hay."""
+    @wraps(view_func)
+    def wrapper(request, *args, **kwargs):
+        with en_replica():
+            response = view_func(request, *args, **kwargs)
+        if response.streaming:
+            response.streaming_content = _iterar_en_replica(response.streaming_content)
+        return response
+    return wrapper
+
+def _iterar_en_replica(contenido):
+    # El generador del CSV consulta la base recién cuando el servidor lo recorre
+    with en_replica():
+        yield from contenido
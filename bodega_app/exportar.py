@@ -0,0 +1,112 @@
+"""
+Exportación CSV de ventas, detalles de venta y compras.
+
+Las filas se generan con `.iterator()` (cursor del lado del servidor en
+PostgreSQL) y se escriben a medida que se leen, así la memoria no depende
+del tamaño del rango y el primer byte sale enseguida.
+
+Si el rango toca meses archivados (ver archivo.py), primero salen las filas
+de las tablas de archivo, que son anteriores a todo lo que sigue en las
+tablas calientes.
+"""
+import csv
+from django.utils import timezone
+from .archivo import limite_archivo
+from .models import Compra, CompraArchivada, DetalleVenta, Producto, Proveedor, Venta, VentaArchivada
+from .periodos import inicio_del_dia
+
+LOTE = 2000
+
+def _fecha(valor):
+    return timezone.localtime(valor).strftime("%Y-%m-%d %H:%M:%S")
+
+def _toca_archivo(ini):
+    limite = limite_archivo()
+    return limite is not None and ini < inicio_del_dia(limite)
+
+def _nombres(modelo, ids, conocidos):
+    """Completa `conocidos` ({id: nombre}) con los `ids` que falten; una consulta si hace falta."""
+    faltan = set(ids) - conocidos.keys() - {None}
+    if faltan:
+        conocidos.update(modelo.objects.filter(pk__in=faltan).values_list("id", "nombre"))
+        conocidos.update({i: f"#{i}" for i in faltan - conocidos.keys()})  # borrados después
+    return conocidos
+
+def _ventas(ini, fin):
+    yield ["venta_id", "fecha", "tipo", "total"]
+    qs = (
+        Venta.objects.filter(fecha__gte=ini, fecha__lt=fin)
+        .order_by("fecha", "id")
+        .values_list("id", "fecha", "tipo", "total")
+    )
+    if _toca_archivo(ini):
+        archivadas = (
+            VentaArchivada.objects.filter(fecha__gte=ini, fecha__lt=fin)
+            .order_by("fecha", "id")
+            .values_list("id", "fecha", "tipo", "total")
+        )
+        for vid, fecha, tipo, total in archivadas.iterator(chunk_size=LOTE):
+            yield [vid, _fecha(fecha), tipo, total]
+    for vid, fecha, tipo, total in qs.iterator(chunk_size=LOTE):
+        yield [vid, _fecha(fecha), tipo, total]
+
+def _detalles(ini, fin):
+    yield ["venta_id", "fecha", "producto", "cantidad", "precio_unitario", "subtotal", "costo_unitario"]
+    qs = (
+        DetalleVenta.objects.filter(venta__fecha__gte=ini, venta__fecha__lt=fin)
+        .order_by("venta__fecha", "venta_id", "id")
+        .values_list("venta_id", "venta__fecha", "producto__nombre", "cantidad",
+                     "precio_unitario", "producto__precio_venta", "costo_unitario")
+    )
+    if _toca_archivo(ini):
+        archivadas = (
+            VentaArchivada.objects.filter(fecha__gte=ini, fecha__lt=fin)
+            .order_by("fecha", "id")
+            .values_list("id", "fecha", "detalles")
+        )
+        productos = {}
+        for vid, fecha, detalles in archivadas.iterator(chunk_size=LOTE):
+            _nombres(Producto, (d[0] for d in detalles), productos)
+            for pid, cantidad, pu, costo in detalles:
+                yield [vid, _fecha(fecha), productos[pid], cantidad, pu, pu * cantidad, costo]
+    for vid, fecha, producto, cantidad, precio, precio_actual, costo in qs.iterator(chunk_size=LOTE):
+        pu = precio or precio_actual
+        yield [vid, _fecha(fecha), producto, cantidad, pu, pu * cantidad, costo]
+
+def _compras(ini, fin):
+    yield ["compra_id", "fecha", "producto", "proveedor", "cantidad", "precio_total"]
+    qs = (
+        Compra.objects.filter(fecha__gte=ini, fecha__lt=fin)
+        .order_by("fecha", "id")
+        .values_list("id", "fecha", "producto__nombre", "proveedor__nombre", "cantidad", "precio_total")
+    )
+    if _toca_archivo(ini):
+        archivadas = (
+            CompraArchivada.objects.filter(fecha__gte=ini, fecha__lt=fin)
+            .order_by("fecha", "id")
+            .values_list("id", "fecha", "producto_id", "proveedor_id", "cantidad", "precio_total")
+        )
+        productos, proveedores = {}, {}
+        for cid, fecha, pid, prov, cantidad, total in archivadas.iterator(chunk_size=LOTE):
+            _nombres(Producto, [pid], productos)
+            _nombres(Proveedor, [prov], proveedores)
+            yield [cid, _fecha(fecha), productos[pid], proveedores.get(prov, ""), cantidad, total]
+    for cid, fecha, producto, proveedor, cantidad, total in qs.iterator(chunk_size=LOTE):
+        yield [cid, _fecha(fecha), producto, proveedor or "", cantidad, total]
+
+EXPORTACIONES = {
+    "ventas": _ventas,
+    "detalles": _detalles,
+    "compras": _compras,
+}
+
+class _Eco:
+    """Pseudo-buffer para csv.writer: devuelve lo escrito en vez de guardarlo."""
+    def write(self, valor):
+        return valor
+
+def filas_csv(tipo, ini, fin):
+    """Genera las líneas CSV (texto) de la exportación `tipo` en [ini, fin)."""
+    writer = csv.writer(_Eco())
+    for fila in EXPORTACIONES[tipo](ini, fin):
+        yield writer.writerow(fila)
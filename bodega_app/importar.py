@@ -0,0 +1,138 @@
+"""
+Importación masiva del catálogo desde CSV.
+
+Columnas: nombre, precio_compra, precio_venta, stock, stock_minimo, proveedor.
+Cada lote se procesa en su propia transacción con una cantidad fija de
+consultas: una búsqueda de proveedores (más un INSERT si hay nuevos), una de
+productos existentes, un único INSERT ... ON CONFLICT (nombre) DO UPDATE y
+el registro de los cambios de stock en el libro de movimientos.
+"""
+import csv
+from django.db import transaction
+from .contadores import invalidar_dashboard
+from .inventario import registrar_movimientos
+from .models import Producto, Proveedor
+from .versiones import cambiar_version
+
+COLUMNAS = ("nombre", "precio_compra", "precio_venta", "stock", "stock_minimo", "proveedor")
+LOTE = 1000
+MAX_ERRORES = 50
+
+class ResultadoImportacion:
+    def __init__(self):
+        self.insertados = 0
+        self.actualizados = 0
+        self.rechazados = 0
+        self.errores = []
+
+    def rechazar(self, linea, motivo):
+        self.rechazados += 1
+        if len(self.errores) < MAX_ERRORES:
+            self.errores.append(f"Línea {linea}: {motivo}")
+
+def _entero(valor, campo, obligatorio=True):
+    valor = (valor or "").strip()
+    if not valor:
+        if obligatorio:
+            raise ValueError(f"{campo} es obligatorio.")
+        return None
+    if not valor.isdigit():
+        raise ValueError(f"{campo} debe ser un entero no negativo.")
+    return int(valor)
+
+def _parse_fila(fila):
+    nombre = (fila.get("nombre") or "").strip()
+    if not nombre:
+        raise ValueError("nombre es obligatorio.")
+    if len(nombre) > Producto._meta.get_field("nombre").max_length:
+        raise ValueError("nombre demasiado largo.")
+    return {
+        "nombre": nombre,
+        "precio_compra": _entero(fila.get("precio_compra"), "precio_compra"),
+        "precio_venta": _entero(fila.get("precio_venta"), "precio_venta"),
+        "stock": _entero(fila.get("stock"), "stock", obligatorio=False),
+        "stock_minimo": _entero(fila.get("stock_minimo"), "stock_minimo", obligatorio=False),
+        "proveedor": (fila.get("proveedor") or "").strip(),
+    }
+
+def _proveedores(nombres):
+    """{nombre: id} de los proveedores pedidos, creando los que falten."""
+    if not nombres:
+        return {}
+    ids = dict(Proveedor.objects.filter(nombre__in=nombres).values_list("nombre", "id"))
+    faltan = [n for n in nombres if n not in ids]
+    if faltan:
+        Proveedor.objects.bulk_create([Proveedor(nombre=n) for n in faltan], ignore_conflicts=True)
+        ids.update(Proveedor.objects.filter(nombre__in=faltan).values_list("nombre", "id"))
+    return ids
+
+@transaction.atomic
+def _procesar_lote(filas, resultado):
+    # Si un nombre se repite dentro del lote, gana la última fila
+    por_nombre = {f["nombre"]: f for f in filas}
+    proveedores = _proveedores({f["proveedor"] for f in por_nombre.values() if f["proveedor"]})
+    existentes = {
+        nombre: (stock, stock_minimo, proveedor_id)
+        for nombre, stock, stock_minimo, proveedor_id in Producto.objects
+        .select_for_update()
+        .filter(nombre__in=list(por_nombre))
+        .values_list("nombre", "stock", "stock_minimo", "proveedor_id")
+    }
+
+    productos = []
+    for nombre, f in por_nombre.items():
+        # Columna ausente o celda vacía: se conserva el valor del producto
+        stock, stock_minimo, proveedor_id = existentes.get(nombre, (0, 5, None))
+        productos.append(Producto(
+            nombre=nombre,
+            precio_compra=f["precio_compra"],
+            precio_venta=f["precio_venta"],
+            stock=stock if f["stock"] is None else f["stock"],
+            stock_minimo=stock_minimo if f["stock_minimo"] is None else f["stock_minimo"],
+            proveedor_id=proveedores[f["proveedor"]] if f["proveedor"] else proveedor_id,
+        ))
+    Producto.objects.bulk_create(
+        productos,
+        update_conflicts=True,
+        unique_fields=["nombre"],
+        update_fields=["precio_compra", "precio_venta", "stock", "stock_minimo", "proveedor"],
+    )
+    ids = dict(Producto.objects.filter(nombre__in=list(por_nombre)).values_list("nombre", "id"))
+    registrar_movimientos(
+        {ids[p.nombre]: p.stock - existentes.get(p.nombre, (0, 0, None))[0] for p in productos},
+        "importacion",
+    )
+    invalidar_dashboard()  # bulk_create no dispara señales
+    cambiar_version(Producto, Proveedor)
+    resultado.actualizados += len(existentes)
+    resultado.insertados += len(por_nombre) - len(existentes)
+
+def importar_productos(archivo, lote=LOTE):
+    """
+    Importa el catálogo desde `archivo` (iterable de líneas de texto CSV con
+    encabezado). Upsert por `Producto.nombre`; devuelve un ResultadoImportacion.
+    """
+    resultado = ResultadoImportacion()
+    lector = csv.DictReader(archivo)
+    if lector.fieldnames is None:
+        resultado.errores.append("El archivo está vacío.")
+        return resultado
+    lector.fieldnames = [c.strip().lower() for c in lector.fieldnames]
+    faltan = [c for c in COLUMNAS[:3] if c not in lector.fieldnames]
+    if faltan:
+        resultado.errores.append(f"Faltan columnas: {', '.join(faltan)}.")
+        return resultado
+
+    filas = []
+    for fila in lector:
+        try:
+            filas.append(_parse_fila(fila))
+        except ValueError as e:
+            resultado.rechazar(lector.line_num, e)
+            continue
+        if len(filas) >= lote:
+            _procesar_lote(filas, resultado)
+            filas = []
+    if filas:
+        _procesar_lote(filas, resultado)
+    return resultado
@@ -0,0 +1,217 @@
+"""
+Ingesta de ventas registradas sin conexión en las cajas.
+
+Cada venta trae un UUID generado por la terminal, que se guarda en
+`Venta.clave_cliente` (índice único): reenviar el mismo lote no vende dos
+veces. Un lote se procesa en una transacción con una cantidad fija de
+consultas, sin importar cuántas ventas traiga:
+
+- un SELECT de las claves ya registradas y uno de productos (FOR UPDATE),
+  más uno del límite del archivo histórico;
+- INSERT masivos de Venta (con la hora de la caja) y DetalleVenta;
+- un único upsert de stock, el libro de movimientos y los resúmenes
+  agrupados por día.
+
+Las ventas que no pueden aplicarse (producto desconocido, stock
+insuficiente, datos inválidos) se rechazan de a una y se informan; el resto
+del lote se registra igual.
+"""
+import uuid
+from datetime import datetime, timedelta
+from decimal import Decimal
+from django.db import IntegrityError, transaction
+from django.db.models import Q
+from django.utils import timezone
+from .archivo import limite_archivo
+from .contadores import invalidar_dashboard
+from .inventario import registrar_movimientos_por_referencia
+from .models import DetalleVenta, Producto, Venta
+from .periodos import inicio_del_dia
+from .resumenes import registrar_ventas
+from .versiones import cambiar_version
+
+LOTE = 500
+MAX_VENTAS_POR_LOTE = 1000
+# Tolerancia para relojes de caja adelantados
+MARGEN_FUTURO = timedelta(minutes=10)
+
+class ResultadoIngesta:
+    def __init__(self):
+        self.registradas = []
+        self.repetidas = []
+        self.rechazadas = []
+
+    def rechazar(self, clave, motivo):
+        self.rechazadas.append({"uuid": clave, "error": str(motivo)})
+
+    def sumar(self, otro):
+        self.registradas += otro.registradas
+        self.repetidas += otro.repetidas
+        self.rechazadas += otro.rechazadas
+
+    def como_dict(self):
+        return {"registradas": self.registradas, "repetidas": self.repetidas, "rechazadas": self.rechazadas}
+
+def _parse_venta(datos, ahora, archivado_hasta=None):
+    """Valida una venta del lote; devuelve (uuid, fecha, tipo, items) o lanza ValueError."""
+    if not isinstance(datos, dict):
+        raise ValueError("Venta inválida.")
+    try:
+        clave = str(uuid.UUID(str(datos.get("uuid", ""))))
+    except ValueError:
+        raise ValueError("uuid inválido.")
+
+    fecha = ahora
+    if datos.get("fecha"):
+        try:
+            fecha = datetime.fromisoformat(str(datos["fecha"]))
+        except ValueError:
+            raise ValueError("fecha inválida (usar ISO 8601).")
+        if timezone.is_naive(fecha):
+            fecha = timezone.make_aware(fecha)
+        if fecha > ahora + MARGEN_FUTURO:
+            raise ValueError("fecha en el futuro.")
+        if archivado_hasta and fecha < archivado_hasta:
+            # Sus claves ya no están en Venta: no se podría detectar un reenvío
+            raise ValueError("fecha en un período archivado.")
+
+    tipo = datos.get("tipo", "minorista")
+    if not isinstance(tipo, str) or tipo not in dict(Venta.TIPO_VENTA):
+        raise ValueError("Tipo de venta inválido.")
+
+    items = datos.get("items")
+    if not isinstance(items, list) or not items:
+        raise ValueError("La venta no tiene ítems.")
+    lineas = []
+    for item in items:
+        if not isinstance(item, dict):
+            raise ValueError("Ítem inválido.")
+        cantidad = item.get("cantidad", 1)
+        if not isinstance(cantidad, int) or isinstance(cantidad, bool) or cantidad <= 0:
+            raise ValueError("Cantidad inválida.")
+        precio = item.get("precio")
+        if precio is not None and (not isinstance(precio, int) or isinstance(precio, bool) or precio < 0):
+            raise ValueError("Precio inválido.")
+        if item.get("codigo"):
+            ref = ("codigo", str(item["codigo"]))
+        elif isinstance(item.get("producto_id"), int):
+            ref = ("id", item["producto_id"])
+        else:
+            raise ValueError("Cada ítem necesita producto_id o codigo.")
+        lineas.append((ref, cantidad, precio))
+    return clave, fecha, tipo, lineas
+
+@transaction.atomic
+def _procesar_lote(ventas, resultado):
+    ahora = timezone.now()
+    limite = limite_archivo()
+    archivado_hasta = inicio_del_dia(limite) if limite else None
+    validas = {}
+    for datos in ventas:
+        try:
+            clave, fecha, tipo, lineas = _parse_venta(datos, ahora, archivado_hasta)
+        except ValueError as e:
+            resultado.rechazar(datos.get("uuid") if isinstance(datos, dict) else None, e)
+            continue
+        if clave in validas:
+            resultado.repetidas.append(clave)
+        else:
+            validas[clave] = (fecha, tipo, lineas)
+    if not validas:
+        return
+
+    ids = {ref[1] for _, _, lineas in validas.values() for ref, _, _ in lineas if ref[0] == "id"}
+    codigos = {ref[1] for _, _, lineas in validas.values() for ref, _, _ in lineas if ref[0] == "codigo"}
+    # Orden fijo de bloqueo: dos lotes con productos en común no se trancan entre sí
+    productos = {
+        p.id: p for p in Producto.objects.select_for_update()
+        .filter(Q(pk__in=ids) | Q(codigo__in=codigos)).order_by("id")
+    }
+    por_codigo = {p.codigo: p for p in productos.values() if p.codigo}
+
+    # Las claves se consultan con los productos ya bloqueados: un reenvío simultáneo del
+    # mismo lote espera acá y después ve las ventas del primero
+    ya_registradas = set(Venta.objects.filter(clave_cliente__in=list(validas)).values_list("clave_cliente", flat=True))
+
+    stock = {pid: p.stock for pid, p in productos.items()}
+    aceptadas = []
+    for clave, (fecha, tipo, lineas) in validas.items():
+        if clave in ya_registradas:
+            resultado.repetidas.append(clave)
+            continue
+        try:
+            resueltas = []
+            cantidades = {}
+            for (campo, valor), cantidad, precio in lineas:
+                p = productos.get(valor) if campo == "id" else por_codigo.get(valor)
+                if p is None:
+                    raise ValueError(f"Producto desconocido: {valor}.")
+                cantidades[p.id] = cantidades.get(p.id, 0) + cantidad
+                resueltas.append((p, cantidad, Decimal(p.precio_venta if precio is None else precio)))
+            for pid, cantidad in cantidades.items():
+                if cantidad > stock[pid]:
+                    raise ValueError(f"Stock insuficiente para {productos[pid].nombre}.")
+        except ValueError as e:
+            resultado.rechazar(clave, e)
+            continue
+        for pid, cantidad in cantidades.items():
+            stock[pid] -= cantidad
+        aceptadas.append((clave, fecha, tipo, resueltas, cantidades))
+    if not aceptadas:
+        return
+
+    creadas = Venta.objects.bulk_create([
+        Venta(clave_cliente=clave, fecha=fecha, tipo=tipo,
+              total=sum(precio * cantidad for _, cantidad, precio in resueltas))
+        for clave, fecha, tipo, resueltas, _ in aceptadas
+    ], batch_size=LOTE)
+
+    detalles = DetalleVenta.objects.bulk_create([
+        DetalleVenta(venta=venta, producto=p, cantidad=cantidad, precio_unitario=precio, costo_unitario=p.precio_compra)
+        for venta, (_, _, _, resueltas, _) in zip(creadas, aceptadas)
+        for p, cantidad, precio in resueltas
+    ], batch_size=LOTE)
+
+    # Las filas están bloqueadas desde el SELECT: el stock nuevo se escribe en un solo upsert
+    cambiados = []
+    for pid, restante in stock.items():
+        if restante != productos[pid].stock:
+            productos[pid].stock = restante
+            cambiados.append(productos[pid])
+    Producto.objects.bulk_create(cambiados, update_conflicts=True, unique_fields=["id"], update_fields=["stock"])
+    registrar_movimientos_por_referencia(
+        {venta.id: {pid: -c for pid, c in cantidades.items()} for venta, (*_, cantidades) in zip(creadas, aceptadas)},
+        "venta",
+    )
+    registrar_ventas(creadas, detalles)
+    invalidar_dashboard()  # bulk_create no dispara señales
+    cambiar_version(Producto)
+    resultado.registradas += [v.clave_cliente for v in creadas]
+
+def ingerir_ventas(ventas, lote=LOTE):
+    """
+    Registra `ventas` (iterable de dicts con uuid, fecha, tipo e items) en
+    lotes de `lote`. Devuelve un ResultadoIngesta con las claves registradas,
+    las repetidas y los rechazos con su motivo.
+    """
+    resultado = ResultadoIngesta()
+    pendientes = []
+    for venta in ventas:
+        pendientes.append(venta)
+        if len(pendientes) >= lote:
+            _procesar_con_reintento(pendientes, resultado)
+            pendientes = []
+    if pendientes:
+        _procesar_con_reintento(pendientes, resultado)
+    return resultado
+
+def _procesar_con_reintento(ventas, resultado):
+    parcial = ResultadoIngesta()
+    try:
+        _procesar_lote(ventas, parcial)
+    except IntegrityError:
+        # Otra caja registró alguna de estas claves con un lote distinto al mismo
+        # tiempo: se deshizo todo el lote y al repetirlo esas claves ya figuran
+        parcial = ResultadoIngesta()
+        _procesar_lote(ventas, parcial)
+    resultado.sumar(parcial)
@@ -0,0 +1,81 @@
+"""
+Libro de movimientos de stock y snapshots periódicos.
+
+Cada vista que cambia `Producto.stock` registra el cambio con
+`registrar_movimientos` dentro de la misma transacción. El stock de un
+producto en un momento T se obtiene del último snapshot anterior a T más la
+suma de los movimientos posteriores (ver `stock_en`), así la consulta no
+depende de cuánta historia haya.
+"""
+from datetime import datetime
+from django.db.models import IntegerField, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+from .models import MovimientoStock, Producto, SnapshotStock
+
+# Anterior a todo movimiento: el "desde" de un producto sin snapshot
+ORIGEN = timezone.make_aware(datetime(2000, 1, 1))
+
+def registrar_movimientos(deltas, tipo, referencia=None):
+    """Guarda {producto_id: cantidad} (con signo) en un solo INSERT; ignora los ceros."""
+    registrar_movimientos_por_referencia({referencia: deltas}, tipo)
+
+def registrar_movimientos_por_referencia(por_referencia, tipo, lote=1000):
+    """Como registrar_movimientos, para varias referencias ({referencia: deltas}) a la vez."""
+    ahora = timezone.now()
+    movimientos = [
+        MovimientoStock(producto_id=pid, cantidad=cantidad, tipo=tipo, referencia=referencia, fecha=ahora)
+        for referencia, deltas in por_referencia.items()
+        for pid, cantidad in deltas.items() if cantidad
+    ]
+    if movimientos:
+        MovimientoStock.objects.bulk_create(movimientos, batch_size=lote)
+
+def stock_en(producto_id, momento):
+    """Stock del producto en `momento`: último snapshot <= momento más los movimientos siguientes."""
+    snapshot = (
+        SnapshotStock.objects.filter(producto_id=producto_id, fecha__lte=momento)
+        .order_by("-fecha").values("fecha", "stock").first()
+    )
+    desde, base = (snapshot["fecha"], snapshot["stock"]) if snapshot else (ORIGEN, 0)
+    suma = MovimientoStock.objects.filter(
+        producto_id=producto_id, fecha__gt=desde, fecha__lte=momento,
+    ).aggregate(s=Sum("cantidad"))["s"]
+    return base + (suma or 0)
+
+def tomar_snapshots(momento, lote=1000):
+    """
+    Crea un snapshot en `momento` para cada producto con movimientos desde su
+    último snapshot. Se calcula solo con el libro (snapshot previo + movimientos),
+    en una consulta agregada; conviene usar un `momento` algo anterior a ahora
+    para no dejar afuera transacciones que todavía no confirmaron.
+    Devuelve la cantidad de snapshots creados.
+    """
+    ultimo = SnapshotStock.objects.filter(producto=OuterRef("pk"), fecha__lte=momento).order_by("-fecha")
+    movimientos = (
+        MovimientoStock.objects
+        .filter(producto=OuterRef("pk"), fecha__gt=OuterRef("snap_fecha"), fecha__lte=momento)
+        .order_by()
+        .values("producto")
+        .annotate(s=Sum("cantidad"))
+        .values("s")
+    )
+    productos = (
+        Producto.objects
+        .annotate(
+            snap_fecha=Coalesce(Subquery(ultimo.values("fecha")[:1]), Value(ORIGEN)),
+            snap_stock=Coalesce(Subquery(ultimo.values("stock")[:1]), Value(0)),
+        )
+        .annotate(delta=Subquery(movimientos, output_field=IntegerField()))
+        .filter(delta__isnull=False)
+        .values_list("id", "snap_stock", "delta")
+    )
+    creados, pendientes = 0, []
+    for pid, base, delta in productos.iterator(chunk_size=lote):
+        pendientes.append(SnapshotStock(producto_id=pid, fecha=momento, stock=base + delta))
+        if len(pendientes) >= lote:
+            creados += len(SnapshotStock.objects.bulk_create(pendientes, ignore_conflicts=True))
+            pendientes = []
+    if pendientes:
+        creados += len(SnapshotStock.objects.bulk_create(pendientes, ignore_conflicts=True))
+    return creados
@@ -0,0 +1,52 @@
+import time
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from bodega_app.archivo import LOTE, archivar_mes, corte_por_meses, meses_a_archivar
+from bodega_app.models import Compra, DetalleVenta, Venta
+from bodega_app.resumenes import consolidar_pendientes
+
+class Command(BaseCommand):
+    help = (
+        "Pasa las ventas, detalles y compras de los meses cerrados más viejos que --meses "
+        "a las tablas de archivo. Los resúmenes diarios de esos meses se recalculan antes y se conservan."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--meses", type=int, default=settings.ARCHIVO_MESES,
+            help=f"Meses completos que quedan sin archivar, además del actual (por defecto {settings.ARCHIVO_MESES}).",
+        )
+        parser.add_argument("--lote", type=int, default=LOTE, help=f"Filas por lote (por defecto {LOTE}).")
+        parser.add_argument("--simular", action="store_true", help="Solo lista los meses que se archivarían.")
+
+    def handle(self, *args, **opts):
+        if opts["meses"] < 0 or opts["lote"] <= 0:
+            raise CommandError("--meses no puede ser negativo y --lote debe ser positivo.")
+        meses = meses_a_archivar(corte_por_meses(opts["meses"]))
+        if not meses:
+            self.stdout.write("No hay meses para archivar.")
+            return
+        if opts["simular"]:
+            for mes in meses:
+                self.stdout.write(f"{mes:%Y-%m}")
+            return
+
+        t0 = time.perf_counter()
+        # Los resúmenes de los meses archivados ya no pueden reconstruirse: tienen que estar completos
+        consolidar_pendientes()
+        for mes in meses:
+            # Una transacción por mes: si se corta, lo ya archivado queda
+            periodo = archivar_mes(mes, lote=opts["lote"])
+            if periodo.ventas or periodo.compras:
+                self.stdout.write(
+                    f"{mes:%Y-%m}: {periodo.ventas} ventas, {periodo.detalles} detalles, {periodo.compras} compras."
+                )
+        if connection.vendor == "postgresql":
+            # Recuperar el espacio de las filas borradas y actualizar estadísticas
+            with connection.cursor() as cursor:
+                for modelo in (Venta, DetalleVenta, Compra):
+                    cursor.execute(f"VACUUM ANALYZE {connection.ops.quote_name(modelo._meta.db_table)}")
+        self.stdout.write(self.style.SUCCESS(
+            f"{len(meses)} meses archivados en {time.perf_counter() - t0:.1f} s."
+        ))
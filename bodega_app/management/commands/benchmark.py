@@ -0,0 +1,95 @@
+import json
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.runner import DiscoverRunner
+from django.test.utils import override_settings, setup_test_environment, teardown_test_environment
+from bodega_app import benchmark
+from bodega_app.vender import MODOS
+
+class Command(BaseCommand):
+    help = (
+        "Mide consultas SQL, tiempo y tamaño de respuesta de las vistas principales "
+        "sobre una base de pruebas sembrada, y falla si alguna supera su presupuesto."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--tamanos", default="chico,mediano",
+            help=f"Tamaños a sembrar, separados por coma ({', '.join(benchmark.TAMANOS)}).",
+        )
+        parser.add_argument("--repeticiones", type=int, default=5)
+        parser.add_argument("--guardar", help="Guarda los resultados en este JSON.")
+        parser.add_argument("--comparar", help="JSON de una corrida anterior para mostrar diferencias.")
+        parser.add_argument("--presupuestos", default=str(benchmark.PRESUPUESTOS))
+        parser.add_argument(
+            "--checkouts", action="store_true",
+            help="Compara ventas concurrentes en modo optimista y con bloqueo (requiere PostgreSQL).",
+        )
+
+    def handle(self, *args, **opts):
+        tamanos = [t.strip() for t in opts["tamanos"].split(",") if t.strip()]
+        desconocidos = [t for t in tamanos if t not in benchmark.TAMANOS]
+        if desconocidos:
+            raise CommandError(f"Tamaños desconocidos: {', '.join(desconocidos)}.")
+        presupuestos = benchmark.cargar_presupuestos(opts["presupuestos"])
+        anterior = None
+        if opts["comparar"]:
+            with open(opts["comparar"], encoding="utf-8") as f:
+                anterior = json.load(f)
+
+        resultados, errores = {}, []
+        setup_test_environment()
+        runner = DiscoverRunner(verbosity=0, interactive=False)
+        try:
+            for tamano in tamanos:
+                # Base de pruebas y caché nuevos por tamaño, para no mezclar datos
+                viejas = runner.setup_databases()
+                try:
+                    with override_settings(CACHES=benchmark.caches_aislados(tamano)):
+                        self._medir_tamano(tamano, opts, presupuestos, resultados, errores)
+                finally:
+                    runner.teardown_databases(viejas)
+        finally:
+            teardown_test_environment()
+
+        if opts["checkouts"]:
+            with override_settings(CACHES=benchmark.caches_aislados("checkouts")):
+                self._checkouts()
+
+        self.stdout.write(benchmark.tabla_comparativa(resultados, anterior))
+        if opts["guardar"]:
+            with open(opts["guardar"], "w", encoding="utf-8") as f:
+                json.dump(resultados, f, indent=2)
+        if errores:
+            raise CommandError("Presupuestos superados:\n" + "\n".join(errores))
+        self.stdout.write(self.style.SUCCESS("Todas las vistas dentro del presupuesto."))
+
+    def _medir_tamano(self, tamano, opts, presupuestos, resultados, errores):
+        self.stderr.write(f"Sembrando '{tamano}'...")
+        benchmark.sembrar(*benchmark.TAMANOS[tamano])
+        usuario = get_user_model().objects.create_user(username="bench", password="bench")
+        resultados[tamano] = benchmark.medir(usuario, opts["repeticiones"])
+        errores += benchmark.excesos(tamano, resultados[tamano], presupuestos)
+
+    def _checkouts(self):
+        if connection.vendor != "postgresql":
+            self.stderr.write(self.style.WARNING("--checkouts necesita PostgreSQL; se omite."))
+            return
+        setup_test_environment()
+        runner = DiscoverRunner(verbosity=0, interactive=False)
+        viejas = runner.setup_databases()
+        try:
+            por_segundo = {}
+            for modo in MODOS:
+                r = benchmark.medir_checkouts(modo)
+                por_segundo[modo] = r["por_segundo"]
+                self.stdout.write(
+                    f"checkout {modo:<10} {r['por_segundo']:>8} intentos/s · vendidas {r['vendidas']} · "
+                    f"rechazadas {r['rechazadas']} · stock final {r['stock_final']}"
+                )
+            if por_segundo["bloqueo"]:
+                self.stdout.write(f"optimista / bloqueo: {por_segundo['optimista'] / por_segundo['bloqueo']:.2f}x")
+        finally:
+            runner.teardown_databases(viejas)
+            teardown_test_environment()
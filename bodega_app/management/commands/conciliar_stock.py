@@ -0,0 +1,28 @@
+import time
+from django.core.management.base import BaseCommand, CommandError
+from bodega_app.conciliacion import LOTE, conciliar
+
+class Command(BaseCommand):
+    help = (
+        "Compara el stock de cada producto con el esperado según compras, ventas y ajustes, "
+        "y lista los desviados. Con --corregir los lleva al esperado (queda en el libro de movimientos)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--corregir", action="store_true", help="Corrige los desvíos en bloque.")
+        parser.add_argument("--lote", type=int, default=LOTE, help=f"Productos por consulta (por defecto {LOTE}).")
+
+    def handle(self, *args, **opts):
+        if opts["lote"] <= 0:
+            raise CommandError("--lote debe ser positivo.")
+        t0 = time.perf_counter()
+        filas = conciliar(opts["corregir"], lote=opts["lote"])
+        for f in filas:
+            estado = ""
+            if opts["corregir"]:
+                estado = " (corregido)" if f["corregido"] else " (sin corregir: el esperado es negativo)"
+            self.stdout.write(f"{f['nombre']}: stock {f['stock']}, esperado {f['esperado']} ({f['diferencia']:+d}){estado}")
+        corregidos = sum(f["corregido"] for f in filas)
+        self.stdout.write(self.style.SUCCESS(
+            f"{len(filas)} productos desviados, {corregidos} corregidos, en {time.perf_counter() - t0:.1f} s."
+        ))
@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand, CommandError
+from bodega_app.resumenes import LOTE_PENDIENTES, consolidar_pendientes
+
+class Command(BaseCommand):
+    help = (
+        "Suma a los resúmenes diarios los aportes de ventas que quedaron pendientes "
+        "(normalmente lo hace runjobs en cada vuelta; sirve para correrlo desde cron sin el runner)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--lote", type=int, default=LOTE_PENDIENTES,
+            help=f"Filas por transacción (por defecto {LOTE_PENDIENTES}).",
+        )
+
+    def handle(self, *args, **opts):
+        if opts["lote"] <= 0:
+            raise CommandError("--lote debe ser positivo.")
+        n = consolidar_pendientes(opts["lote"])
+        self.stdout.write(self.style.SUCCESS(f"{n} aportes pendientes consolidados."))
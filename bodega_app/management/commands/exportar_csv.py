@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from bodega_app.exportar import EXPORTACIONES, filas_csv
+from bodega_app.periodos import parse_fecha, rango_timestamps
+from bodega_app.routers import en_replica
+
+class Command(BaseCommand):
+    help = "Exporta ventas, detalles de venta o compras de un rango de fechas a CSV."
+
+    def add_arguments(self, parser):
+        parser.add_argument("tipo", choices=sorted(EXPORTACIONES))
+        parser.add_argument("--desde", help="Primer día (AAAA-MM-DD). Por defecto, hoy.")
+        parser.add_argument("--hasta", help="Último día (AAAA-MM-DD). Por defecto, igual a --desde.")
+        parser.add_argument("--salida", help="Archivo de salida. Por defecto, la salida estándar.")
+
+    def handle(self, *args, **opts):
+        desde = parse_fecha(opts["desde"]) if opts["desde"] else timezone.localdate()
+        hasta = parse_fecha(opts["hasta"]) if opts["hasta"] else desde
+        if desde is None or hasta is None:
+            raise CommandError("Fechas inválidas (usar AAAA-MM-DD).")
+        if desde > hasta:
+            raise CommandError("--desde no puede ser posterior a --hasta.")
+
+        ini, fin = rango_timestamps(desde, hasta)
+        with en_replica():
+            if not opts["salida"]:
+                for linea in filas_csv(opts["tipo"], ini, fin):
+                    self.stdout.write(linea, ending="")
+                return
+
+            with open(opts["salida"], "w", newline="", encoding="utf-8") as destino:
+                destino.writelines(filas_csv(opts["tipo"], ini, fin))
+        self.stderr.write(self.style.SUCCESS(f"Exportado a {opts['salida']}."))
@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand, CommandError
+from bodega_app.importar import LOTE, importar_productos
+
+class Command(BaseCommand):
+    help = (
+        "Importa o actualiza productos desde un CSV con columnas "
+        "nombre, precio_compra, precio_venta, stock, stock_minimo, proveedor."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("archivo")
+        parser.add_argument("--lote", type=int, default=LOTE, help=f"Filas por transacción (por defecto {LOTE}).")
+
+    def handle(self, *args, **opts):
+        try:
+            with open(opts["archivo"], newline="", encoding="utf-8-sig") as f:
+                r = importar_productos(f, lote=opts["lote"])
+        except OSError as e:
+            raise CommandError(str(e))
+
+        for error in r.errores:
+            self.stderr.write(self.style.WARNING(error))
+        self.stdout.write(self.style.SUCCESS(
+            f"Insertados: {r.insertados} · Actualizados: {r.actualizados} · Rechazados: {r.rechazados}"
+        ))
@@ -0,0 +1,42 @@
+import json
+import time
+from django.core.management.base import BaseCommand, CommandError
+from bodega_app.ingesta import LOTE, ingerir_ventas
+
+class Command(BaseCommand):
+    help = (
+        "Registra ventas hechas sin conexión desde un archivo JSON Lines (una venta por línea, "
+        "con uuid, fecha, tipo e items). Reprocesar el mismo archivo no duplica ventas."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("archivo")
+        parser.add_argument("--lote", type=int, default=LOTE, help=f"Ventas por transacción (por defecto {LOTE}).")
+
+    def handle(self, *args, **opts):
+        invalidas = []
+
+        def leer(f):
+            for n, linea in enumerate(f, start=1):
+                if not linea.strip():
+                    continue
+                try:
+                    yield json.loads(linea)
+                except ValueError:
+                    invalidas.append(n)
+
+        t0 = time.perf_counter()
+        try:
+            with open(opts["archivo"], encoding="utf-8") as f:
+                r = ingerir_ventas(leer(f), lote=opts["lote"])
+        except OSError as e:
+            raise CommandError(str(e))
+
+        for n in invalidas:
+            self.stderr.write(self.style.WARNING(f"Línea {n}: JSON inválido."))
+        for rechazo in r.rechazadas:
+            self.stderr.write(self.style.WARNING(f"{rechazo['uuid']}: {rechazo['error']}"))
+        self.stdout.write(self.style.SUCCESS(
+            f"Registradas: {len(r.registradas)} · Repetidas: {len(r.repetidas)} · "
+            f"Rechazadas: {len(r.rechazadas) + len(invalidas)} · {time.perf_counter() - t0:.1f} s"
+        ))
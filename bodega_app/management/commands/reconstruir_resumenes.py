@@ -0,0 +1,119 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Count, DecimalField, F, Min, Sum
+from django.db.models.functions import Coalesce, NullIf, TruncDate
+from django.utils import timezone
+from bodega_app.archivo import limite_archivo
+from bodega_app.models import Compra, DetalleVenta, ResumenDiario, ResumenPendiente, ResumenProductoDiario, Venta
+from bodega_app.periodos import parse_fecha, rango_timestamps
+from bodega_app.tendencias import invalidar_tendencias
+
+LOTE = 1000
+
+def _parse_fecha(valor):
+    fecha = parse_fecha(valor)
+    if fecha is None:
+        raise CommandError(f"Fecha inválida: {valor} (usar AAAA-MM-DD).")
+    return fecha
+
+class Command(BaseCommand):
+    help = (
+        "Recalcula los resúmenes diarios a partir de Venta, DetalleVenta y Compra. "
+        "Sirve para cargar el histórico o corregir cambios hechos desde el admin."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--desde", help="Primer día a recalcular (AAAA-MM-DD). Por defecto, el más antiguo.")
+        parser.add_argument("--hasta", help="Último día a recalcular (AAAA-MM-DD). Por defecto, hoy.")
+
+    def handle(self, *args, **opts):
+        desde = _parse_fecha(opts["desde"]) if opts["desde"] else self._primer_dia()
+        hasta = _parse_fecha(opts["hasta"]) if opts["hasta"] else timezone.localdate()
+        if desde is None:
+            self.stdout.write(self.style.WARNING("No hay ventas ni compras registradas."))
+            return
+        if desde > hasta:
+            raise CommandError("--desde no puede ser posterior a --hasta.")
+        limite = limite_archivo()
+        if limite and desde < limite:
+            # Sin los detalles no se pueden recalcular: se conservan los resúmenes que hay
+            self.stdout.write(self.style.WARNING(f"Los días anteriores al {limite} están archivados y no se recalculan."))
+            desde = limite
+            if desde > hasta:
+                return
+
+        ini, fin = rango_timestamps(desde, hasta)
+
+        with transaction.atomic():
+            ResumenDiario.objects.filter(fecha__gte=desde, fecha__lte=hasta).delete()
+            ResumenProductoDiario.objects.filter(fecha__gte=desde, fecha__lte=hasta).delete()
+            # Las ventas con aportes sin consolidar ya están en Venta: se cuentan abajo
+            ResumenPendiente.objects.filter(fecha__gte=desde, fecha__lte=hasta).delete()
+
+            dias = {}
+            for r in (
+                Venta.objects.filter(fecha__gte=ini, fecha__lt=fin)
+                .annotate(dia=TruncDate("fecha"))
+                .values("dia", "tipo")
+                .annotate(n=Count("id"), total=Sum("total"))
+            ):
+                dia = dias.setdefault(r["dia"], ResumenDiario(fecha=r["dia"]))
+                dia.cantidad_ventas += r["n"]
+                dia.total_ventas += r["total"] or 0
+                if r["tipo"] == "mayorista":
+                    dia.cantidad_mayorista = r["n"]
+                    dia.total_mayorista = r["total"] or 0
+
+            productos = {}
+            subtotal = F("cantidad") * Coalesce(NullIf("precio_unitario", 0), "producto__precio_venta")
+            for r in (
+                DetalleVenta.objects.filter(venta__fecha__gte=ini, venta__fecha__lt=fin)
+                .annotate(dia=TruncDate("venta__fecha"))
+                .values("dia", "producto_id")
+                .annotate(
+                    cantidad_total=Sum("cantidad"),
+                    monto=Sum(subtotal, output_field=DecimalField(max_digits=18, decimal_places=0)),
+                    costo=Sum(F("cantidad") * F("costo_unitario"),
+                              output_field=DecimalField(max_digits=18, decimal_places=0)),
+                )
+            ):
+                fila = productos.setdefault(
+                    (r["dia"], r["producto_id"]),
+                    ResumenProductoDiario(fecha=r["dia"], producto_id=r["producto_id"]),
+                )
+                fila.cantidad_vendida = r["cantidad_total"] or 0
+                fila.total_vendido = r["monto"] or 0
+                fila.costo_vendido = r["costo"] or 0
+
+            for r in (
+                Compra.objects.filter(fecha__gte=ini, fecha__lt=fin)
+                .annotate(dia=TruncDate("fecha"))
+                .values("dia", "producto_id")
+                .annotate(cantidad_total=Sum("cantidad"), monto=Sum("precio_total"))
+            ):
+                fila = productos.setdefault(
+                    (r["dia"], r["producto_id"]),
+                    ResumenProductoDiario(fecha=r["dia"], producto_id=r["producto_id"]),
+                )
+                fila.cantidad_comprada = r["cantidad_total"] or 0
+                fila.total_comprado = r["monto"] or 0
+                dia = dias.setdefault(r["dia"], ResumenDiario(fecha=r["dia"]))
+                dia.total_compras += fila.total_comprado
+
+            ResumenDiario.objects.bulk_create(dias.values(), batch_size=LOTE)
+            ResumenProductoDiario.objects.bulk_create(productos.values(), batch_size=LOTE)
+            invalidar_tendencias()
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Resúmenes recalculados del {desde} al {hasta}: "
+            f"{len(dias)} días, {len(productos)} filas por producto."
+        ))
+
+    def _primer_dia(self):
+        fechas = [
+            f for f in (
+                Venta.objects.aggregate(m=Min("fecha"))["m"],
+                Compra.objects.aggregate(m=Min("fecha"))["m"],
+            ) if f is not None
+        ]
+        return timezone.localdate(min(fechas)) if fechas else None
@@ -0,0 +1,82 @@
+import multiprocessing
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+import django
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DatabaseError
+from bodega_app.resumenes import consolidar_pendientes
+from bodega_app.trabajos import ejecutar, problema_de_cache, rescatar_colgados, tomar_siguiente
+
+class Command(BaseCommand):
+    help = (
+        "Ejecuta los trabajos encolados (exportaciones, reconstrucción de resúmenes, ...) "
+        "en un pool de hilos o de procesos, y en cada vuelta consolida los resúmenes de las "
+        "ventas. Pensado para correr como proceso aparte (ver Procfile)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--hilos", type=int, default=settings.TRABAJOS_HILOS,
+            help=f"Trabajos simultáneos (por defecto {settings.TRABAJOS_HILOS}).",
+        )
+        parser.add_argument(
+            "--procesos", action="store_true",
+            help="Usa procesos en lugar de hilos (para trabajos que ocupan la CPU en Python).",
+        )
+        parser.add_argument("--espera", type=float, default=2.0, help="Segundos entre consultas a la cola.")
+        parser.add_argument("--una-vez", action="store_true", help="Termina cuando la cola queda vacía.")
+
+    def handle(self, *args, **opts):
+        n = opts["hilos"]
+        if n <= 0:
+            raise CommandError("--hilos debe ser positivo.")
+        problema = problema_de_cache()
+        if problema:
+            # Las invalidaciones de las tareas no llegarían al servidor web
+            raise CommandError(f"El runner necesita un caché compartido con el servidor web: {problema}")
+        rescatados = rescatar_colgados()
+        if rescatados:
+            self.stdout.write(self.style.WARNING(f"{rescatados} trabajos interrumpidos marcados como error."))
+
+        if opts["procesos"]:
+            # spawn: cada proceso abre sus propias conexiones en lugar de heredar las del runner
+            pool = ProcessPoolExecutor(n, mp_context=multiprocessing.get_context("spawn"), initializer=django.setup)
+        else:
+            pool = ThreadPoolExecutor(n, thread_name_prefix="trabajo")
+
+        en_curso = {}
+        try:
+            while True:
+                self._consolidar()
+                while len(en_curso) < n:
+                    pk = tomar_siguiente()
+                    if pk is None:
+                        break
+                    en_curso[pool.submit(ejecutar, pk)] = pk
+                    self.stdout.write(f"Trabajo {pk} iniciado.")
+                if not en_curso:
+                    if opts["una_vez"]:
+                        break
+                    time.sleep(opts["espera"])
+                    continue
+                listos, _ = wait(en_curso, timeout=opts["espera"], return_when=FIRST_COMPLETED)
+                for futuro in listos:
+                    pk = en_curso.pop(futuro)
+                    error = futuro.exception()
+                    if error:
+                        self.stderr.write(f"Trabajo {pk}: {error}")
+                    else:
+                        self.stdout.write(f"Trabajo {pk} finalizado.")
+        except KeyboardInterrupt:
+            self.stdout.write("Esperando a que terminen los trabajos en curso...")
+        finally:
+            pool.shutdown(wait=True)
+
+    def _consolidar(self):
+        # Los aportes del checkout (ResumenPendiente) se suman acá, fuera de los pedidos
+        try:
+            consolidar_pendientes()
+        except DatabaseError as e:
+            # Lo pendiente queda para la vuelta siguiente
+            self.stderr.write(f"No se pudieron consolidar los resúmenes: {e}")
@@ -0,0 +1,23 @@
+from datetime import timedelta
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from bodega_app.inventario import tomar_snapshots
+
+class Command(BaseCommand):
+    help = (
+        "Guarda un snapshot de stock para los productos con movimientos desde su último "
+        "snapshot. Pensado para correr periódicamente (p. ej. cada noche)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--margen-minutos", type=int, default=5,
+            help="El snapshot se toma este tiempo antes de ahora, para no cortar transacciones en curso.",
+        )
+
+    def handle(self, *args, **opts):
+        momento = timezone.now() - timedelta(minutes=opts["margen_minutos"])
+        creados = tomar_snapshots(momento)
+        self.stdout.write(self.style.SUCCESS(
+            f"{creados} snapshots al {timezone.localtime(momento):%Y-%m-%d %H:%M}."
+        ))
@@ -0,0 +1,40 @@
+import time
+from django.db.models import Count, Sum
+from django.core.management.base import BaseCommand, CommandError
+from bodega_app.reposicion import COBERTURA, DIAS, PLAZO, guardar_stock_minimo, sugerencias
+
+class Command(BaseCommand):
+    help = (
+        "Calcula la demanda diaria de cada producto y sugiere cuánto pedir a cada proveedor. "
+        "Con --guardar reemplaza stock_minimo por el sugerido en los productos con ventas."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--dias", type=int, default=DIAS, help=f"Días de historia para el promedio (por defecto {DIAS}).")
+        parser.add_argument("--plazo", type=int, default=PLAZO, help=f"Días de entrega del proveedor (por defecto {PLAZO}).")
+        parser.add_argument("--cobertura", type=int, default=COBERTURA,
+                            help=f"Días extra que debe cubrir el pedido (por defecto {COBERTURA}).")
+        parser.add_argument("--guardar", action="store_true", help="Actualiza stock_minimo con el valor sugerido.")
+
+    def handle(self, *args, **opts):
+        if opts["dias"] <= 0 or opts["plazo"] < 0 or opts["cobertura"] < 0:
+            raise CommandError("--dias debe ser positivo y --plazo/--cobertura no negativos.")
+        params = {k: opts[k] for k in ("dias", "plazo", "cobertura")}
+
+        t0 = time.perf_counter()
+        por_proveedor = (
+            sugerencias(**params)
+            .filter(cantidad_sugerida__gt=0)
+            .values("proveedor__nombre")
+            .annotate(productos=Count("id"), unidades=Sum("cantidad_sugerida"))
+            .order_by("proveedor__nombre")
+        )
+        for fila in por_proveedor:
+            self.stdout.write(
+                f"{fila['proveedor__nombre'] or 'Sin proveedor'}: "
+                f"{fila['productos']} productos, {fila['unidades']} unidades"
+            )
+        if opts["guardar"]:
+            n = guardar_stock_minimo(**params)
+            self.stdout.write(f"stock_minimo actualizado en {n} productos.")
+        self.stdout.write(self.style.SUCCESS(f"Listo en {time.perf_counter() - t0:.1f} s."))
@@ -0,0 +1,155 @@
+"""
+Instrumentación por request: duración, consultas SQL, tiempo en SQL y tiempo
+de render de templates, agrupados por nombre de URL.
+
+- `MetricasMiddleware` mide cada request y agrega el header `Server-Timing`.
+- `DjangoTemplatesMedidos` es el backend de templates de Django con el render cronometrado.
+- `texto_prometheus()` arma la salida de /metrics.
+
+Los histogramas viven en memoria del proceso (un worker de gunicorn por
+defecto, ver Procfile); con varios workers cada uno reporta lo suyo.
+Si `METRICAS_LENTO_MS` está definido, los requests más lentos que ese umbral
+se registran en el logger "bodega_app.lentos" con sus consultas más caras.
+"""
+import bisect
+import contextvars
+import logging
+import threading
+import time
+from contextlib import ExitStack
+from django.conf import settings
+from django.db import connections
+from django.template.backends.django import DjangoTemplates, Template
+
+logger = logging.getLogger("bodega_app.lentos")
+
+_medicion = contextvars.ContextVar("bodega_medicion", default=None)
+
+BUCKETS_SEGUNDOS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+BUCKETS_CONSULTAS = (1, 2, 5, 10, 20, 50, 100, 200, 500)
+TOP_CONSULTAS = 5
+
+class Histograma:
+    def __init__(self, nombre, ayuda, buckets):
+        self.nombre = nombre
+        self.ayuda = ayuda
+        self.buckets = buckets
+        self.series = {}  # vista -> [conteos por bucket..., +Inf], suma
+        self._lock = threading.Lock()
+
+    def observar(self, vista, valor):
+        i = bisect.bisect_left(self.buckets, valor)
+        with self._lock:
+            conteos, suma = self.series.get(vista) or ([0] * (len(self.buckets) + 1), 0)
+            conteos[i] += 1
+            self.series[vista] = (conteos, suma + valor)
+
+    def texto(self):
+        lineas = [f"# HELP {self.nombre} {self.ayuda}", f"# TYPE {self.nombre} histogram"]
+        with self._lock:
+            series = {v: (list(c), s) for v, (c, s) in self.series.items()}
+        for vista, (conteos, suma) in sorted(series.items()):
+            acumulado = 0
+            for limite, n in zip(self.buckets + ("+Inf",), conteos):
+                acumulado += n
+                lineas.append(f'{self.nombre}_bucket{{vista="{vista}",le="{limite}"}} {acumulado}')
+            lineas.append(f'{self.nombre}_sum{{vista="{vista}"}} {suma:.6f}')
+            lineas.append(f'{self.nombre}_count{{vista="{vista}"}} {acumulado}')
+        return lineas
+
+DURACION = Histograma("bodega_request_duration_seconds", "Duración del request.", BUCKETS_SEGUNDOS)
+CONSULTAS = Histograma("bodega_sql_queries", "Consultas SQL por request.", BUCKETS_CONSULTAS)
+TIEMPO_SQL = Histograma("bodega_sql_duration_seconds", "Tiempo total en SQL por request.", BUCKETS_SEGUNDOS)
+TIEMPO_TEMPLATES = Histograma(
+    "bodega_template_duration_seconds", "Tiempo de render de templates por request.", BUCKETS_SEGUNDOS,
+)
+HISTOGRAMAS = (DURACION, CONSULTAS, TIEMPO_SQL, TIEMPO_TEMPLATES)
+
+class _Medicion:
+    __slots__ = ("consultas", "sql", "templates", "detalle")
+
+    def __init__(self, detalle):
+        self.consultas = 0
+        self.sql = 0.0
+        self.templates = 0.0
+        # (segundos, sql) de cada consulta; solo si está activo el log de lentos
+        self.detalle = [] if detalle else None
+
+def _envolver_consulta(execute, sql, params, many, context):
+    m = _medicion.get()
+    if m is None:
+        return execute(sql, params, many, context)
+    t0 = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        dur = time.perf_counter() - t0
+        m.consultas += 1
+        m.sql += dur
+        if m.detalle is not None:
+            m.detalle.append((dur, sql))
+
+class MetricasMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.lento_ms = getattr(settings, "METRICAS_LENTO_MS", None)
+
+    def __call__(self, request):
+        medicion = _Medicion(detalle=bool(self.lento_ms))
+        token = _medicion.set(medicion)
+        t0 = time.perf_counter()
+        try:
+            with ExitStack() as stack:
+                for conn in connections.all():
+                    stack.enter_context(conn.execute_wrapper(_envolver_consulta))
+                response = self.get_response(request)
+        finally:
+            _medicion.reset(token)
+        total = time.perf_counter() - t0
+
+        match = getattr(request, "resolver_match", None)
+        vista = match.view_name if match else "sin_ruta"
+        DURACION.observar(vista, total)
+        CONSULTAS.observar(vista, medicion.consultas)
+        TIEMPO_SQL.observar(vista, medicion.sql)
+        TIEMPO_TEMPLATES.observar(vista, medicion.templates)
+
+        response["Server-Timing"] = (
+            f"app;dur={total * 1000:.1f}, "
+            f'sql;dur={medicion.sql * 1000:.1f};desc="{medicion.consultas} consultas", '
+            f"tpl;dur={medicion.templates * 1000:.1f}"
+        )
+        if self.lento_ms and total * 1000 >= self.lento_ms:
+            peores = sorted(medicion.detalle, key=lambda d: d[0], reverse=True)[:TOP_CONSULTAS]
+            logger.warning(
+                "Request lento %s %s (%s): %.0f ms, %d consultas, %.0f ms en SQL\n%s",
+                request.method, request.path, vista, total * 1000, medicion.consultas, medicion.sql * 1000,
+                "\n".join(f"  {d * 1000:.1f} ms  {sql[:300]}" for d, sql in peores),
+            )
+        return response
+
+class _TemplateMedido(Template):
+    def render(self, context=None, request=None):
+        m = _medicion.get()
+        if m is None:
+            return super().render(context, request)
+        t0 = time.perf_counter()
+        try:
+            return super().render(context, request)
+        finally:
+            m.templates += time.perf_counter() - t0
+
+class DjangoTemplatesMedidos(DjangoTemplates):
+    """Backend DjangoTemplates que suma el tiempo de render a la medición del request."""
+
+    def from_string(self, template_code):
+        return _TemplateMedido(self.engine.from_string(template_code), self)
+
+    def get_template(self, template_name):
+        return _TemplateMedido(super().get_template(template_name).template, self)
+
+def texto_prometheus():
+    lineas = []
+    for h in HISTOGRAMAS:
+        lineas += h.texto()
+    return "\n".join(lineas) + "\n"
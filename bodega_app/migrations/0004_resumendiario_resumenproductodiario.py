@@ -0,0 +1,40 @@
+# Generated by Django 5.2.5 on 2026-10-18 09:45
+
+import django.db.models.deletion
+from decimal import Decimal
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bodega_app', '0003_remove_producto_prod_precio_compra_gte_0_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ResumenDiario',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fecha', models.DateField(unique=True)),
+                ('cantidad_ventas', models.PositiveIntegerField(default=0)),
+                ('total_ventas', models.DecimalField(decimal_places=0, default=Decimal('0'), max_digits=14)),
+                ('total_compras', models.DecimalField(decimal_places=0, default=Decimal('0'), max_digits=14)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='ResumenProductoDiario',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fecha', models.DateField()),
+                ('cantidad_vendida', models.IntegerField(default=0)),
+                ('total_vendido', models.DecimalField(decimal_places=0, default=Decimal('0'), max_digits=14)),
+                ('cantidad_comprada', models.IntegerField(default=0)),
+                ('total_comprado', models.DecimalField(decimal_places=0, default=Decimal('0'), max_digits=14)),
+                ('producto', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='resumenes', to='bodega_app.producto')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('fecha', 'producto'), name='resumen_producto_dia_unico')],
+            },
+        ),
+    ]
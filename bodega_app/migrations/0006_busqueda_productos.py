@@ -0,0 +1,37 @@
+# Generated by Django 5.2.5 on 2026-10-18 09:47
+
+import django.db.models.functions.text
+from django.db import migrations, models
+
+
+def crear_indice_trigram(apps, schema_editor):
+    # Índice trigram para búsquedas por subcadena (icontains usa UPPER(...) LIKE).
+    # Solo existe en PostgreSQL; en otros motores queda el índice por prefijo.
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    schema_editor.execute(
+        'CREATE INDEX IF NOT EXISTS producto_nombre_trgm_idx '
+        'ON bodega_app_producto USING gin (UPPER(nombre::text) gin_trgm_ops)'
+    )
+
+
+def borrar_indice_trigram(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('DROP INDEX IF EXISTS producto_nombre_trgm_idx')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bodega_app', '0005_indices_fecha'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='producto',
+            index=models.Index(django.db.models.functions.text.Lower('nombre'), name='producto_nombre_lower_idx'),
+        ),
+        migrations.RunPython(crear_indice_trigram, borrar_indice_trigram),
+    ]
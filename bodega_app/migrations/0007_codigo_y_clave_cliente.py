@@ -0,0 +1,23 @@
+# Generated by Django 5.2.5 on 2026-10-18 09:51
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bodega_app', '0006_busqueda_productos'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='producto',
+            name='codigo',
+            field=models.CharField(blank=True, max_length=50, null=True, unique=True),
+        ),
+        migrations.AddField(
+            model_name='venta',
+            name='clave_cliente',
+            field=models.CharField(blank=True, max_length=64, null=True, unique=True),
+        ),
+    ]
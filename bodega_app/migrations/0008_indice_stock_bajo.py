@@ -0,0 +1,17 @@
+# Generated by Django 5.2.5 on 2026-10-18 09:53
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bodega_app', '0007_codigo_y_clave_cliente'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='producto',
+            index=models.Index(condition=models.Q(('stock__lte', models.F('stock_minimo'))), fields=['proveedor', 'stock'], name='producto_stock_bajo_idx'),
+        ),
+    ]
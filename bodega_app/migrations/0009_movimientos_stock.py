@@ -0,0 +1,54 @@
+# Generated by Django 5.2.5 on 2026-10-18 09:57
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+def snapshot_inicial(apps, schema_editor):
+    # El libro arranca acá: el stock actual de cada producto queda como punto de partida.
+    Producto = apps.get_model('bodega_app', 'Producto')
+    SnapshotStock = apps.get_model('bodega_app', 'SnapshotStock')
+    ahora = django.utils.timezone.now()
+    SnapshotStock.objects.bulk_create(
+        [SnapshotStock(producto_id=pid, fecha=ahora, stock=stock)
+         for pid, stock in Producto.objects.values_list('id', 'stock')],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bodega_app', '0008_indice_stock_bajo'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MovimientoStock',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fecha', models.DateTimeField(default=django.utils.timezone.now)),
+                ('cantidad', models.IntegerField()),
+                ('tipo', models.CharField(choices=[('venta', 'Venta'), ('compra', 'Compra'), ('compra_edicion', 'Edición de compra'), ('compra_anulacion', 'Anulación de compra'), ('ajuste', 'Ajuste manual'), ('importacion', 'Importación')], max_length=20)),
+                ('referencia', models.BigIntegerField(blank=True, null=True)),
+                ('producto', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='movimientos', to='bodega_app.producto')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['producto', 'fecha'], name='movimiento_producto_fecha_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='SnapshotStock',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fecha', models.DateTimeField()),
+                ('stock', models.IntegerField()),
+                ('producto', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='snapshots', to='bodega_app.producto')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('producto', 'fecha'), name='snapshot_producto_fecha_unico')],
+            },
+        ),
+        migrations.RunPython(snapshot_inicial, migrations.RunPython.noop),
+    ]
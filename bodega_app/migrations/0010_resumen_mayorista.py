@@ -0,0 +1,42 @@
+# Generated by Django 5.2.5 on 2026-10-18 10:00
+
+from decimal import Decimal
+from django.db import migrations, models
+from django.db.models import Count, Sum
+from django.db.models.functions import TruncDate
+
+
+def cargar_mayorista(apps, schema_editor):
+    # Completa el reparto mayorista de los días que ya tienen resumen.
+    ResumenDiario = apps.get_model('bodega_app', 'ResumenDiario')
+    Venta = apps.get_model('bodega_app', 'Venta')
+    for r in (
+        Venta.objects.filter(tipo='mayorista')
+        .annotate(dia=TruncDate('fecha'))
+        .values('dia')
+        .annotate(n=Count('id'), total=Sum('total'))
+    ):
+        ResumenDiario.objects.filter(fecha=r['dia']).update(
+            cantidad_mayorista=r['n'], total_mayorista=r['total'] or 0,
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bodega_app', '0009_movimientos_stock'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='resumendiario',
+            name='cantidad_mayorista',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='resumendiario',
+            name='total_mayorista',
+            field=models.DecimalField(decimal_places=0, default=Decimal('0'), max_digits=14),
+        ),
+        migrations.RunPython(cargar_mayorista, migrations.RunPython.noop),
+    ]
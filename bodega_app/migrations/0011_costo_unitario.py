@@ -0,0 +1,38 @@
+# Generated by Django 5.2.5 on 2026-10-18 10:02
+
+from decimal import Decimal
+from django.db import migrations, models
+from django.db.models import F, OuterRef, Subquery
+
+
+def cargar_costos(apps, schema_editor):
+    # Para las ventas anteriores no hay costo histórico: se usa el precio de compra actual.
+    Producto = apps.get_model('bodega_app', 'Producto')
+    DetalleVenta = apps.get_model('bodega_app', 'DetalleVenta')
+    ResumenProductoDiario = apps.get_model('bodega_app', 'ResumenProductoDiario')
+    costo = Subquery(Producto.objects.filter(pk=OuterRef('producto_id')).values('precio_compra')[:1])
+    DetalleVenta.objects.update(costo_unitario=costo)
+    ResumenProductoDiario.objects.filter(cantidad_vendida__gt=0).update(
+        costo_vendido=F('cantidad_vendida') * costo,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bodega_app', '0010_resumen_mayorista'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='detalleventa',
+            name='costo_unitario',
+            field=models.DecimalField(decimal_places=0, default=0, max_digits=12),
+        ),
+        migrations.AddField(
+            model_name='resumenproductodiario',
+            name='costo_vendido',
+            field=models.DecimalField(decimal_places=0, default=Decimal('0'), max_digits=14),
+        ),
+        migrations.RunPython(cargar_costos, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.2.5 on 2026-10-18 10:04
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bodega_app', '0011_costo_unitario'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='resumenproductodiario',
+            index=models.Index(fields=['producto', 'fecha'], name='resumen_producto_fecha_idx'),
+        ),
+    ]
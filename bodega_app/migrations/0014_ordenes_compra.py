@@ -0,0 +1,31 @@
+# Generated by Django 5.2.5 on 2026-10-18 10:20
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bodega_app', '0013_venta_fecha_explicita'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OrdenCompra',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fecha', models.DateTimeField(auto_now_add=True)),
+                ('proveedor', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='bodega_app.proveedor')),
+            ],
+        ),
+        migrations.AddField(
+            model_name='compra',
+            name='orden',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='lineas', to='bodega_app.ordencompra'),
+        ),
+        migrations.AddIndex(
+            model_name='ordencompra',
+            index=models.Index(fields=['fecha'], name='orden_compra_fecha_idx'),
+        ),
+    ]
@@ -0,0 +1,54 @@
+# Generated by Django 5.2.5 on 2026-10-18 10:23
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bodega_app', '0014_ordenes_compra'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PeriodoArchivado',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('mes', models.DateField(unique=True)),
+                ('ventas', models.PositiveIntegerField(default=0)),
+                ('detalles', models.PositiveIntegerField(default=0)),
+                ('compras', models.PositiveIntegerField(default=0)),
+                ('archivado_en', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='CompraArchivada',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('fecha', models.DateTimeField()),
+                ('producto_id', models.BigIntegerField()),
+                ('proveedor_id', models.BigIntegerField(blank=True, null=True)),
+                ('orden_id', models.BigIntegerField(blank=True, null=True)),
+                ('cantidad', models.PositiveIntegerField()),
+                ('precio_total', models.DecimalField(decimal_places=0, max_digits=12)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['fecha'], name='compra_archivada_fecha_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='VentaArchivada',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('fecha', models.DateTimeField()),
+                ('tipo', models.CharField(choices=[('minorista', 'Minorista'), ('mayorista', 'Mayorista')], max_length=10)),
+                ('total', models.DecimalField(decimal_places=0, max_digits=12)),
+                ('clave_cliente', models.CharField(blank=True, max_length=64, null=True)),
+                ('detalles', models.JSONField(default=list)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['fecha'], name='venta_archivada_fecha_idx')],
+            },
+        ),
+    ]
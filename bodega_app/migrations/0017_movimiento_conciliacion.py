@@ -0,0 +1,18 @@
+# Generated by Django 5.2.5 on 2026-10-18 10:31
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bodega_app', '0016_trabajos'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='movimientostock',
+            name='tipo',
+            field=models.CharField(choices=[('venta', 'Venta'), ('compra', 'Compra'), ('compra_edicion', 'Edición de compra'), ('compra_anulacion', 'Anulación de compra'), ('ajuste', 'Ajuste manual'), ('importacion', 'Importación'), ('conciliacion', 'Conciliación')], max_length=20),
+        ),
+    ]
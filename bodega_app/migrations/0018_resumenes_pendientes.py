@@ -0,0 +1,30 @@
+# Generated by Django 5.2.5 on 2026-10-18 10:42
+
+import django.db.models.deletion
+from decimal import Decimal
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bodega_app', '0017_movimiento_conciliacion'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ResumenPendiente',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fecha', models.DateField()),
+                ('cantidad_ventas', models.PositiveIntegerField(default=0)),
+                ('total_ventas', models.DecimalField(decimal_places=0, default=Decimal('0'), max_digits=14)),
+                ('cantidad_mayorista', models.PositiveIntegerField(default=0)),
+                ('total_mayorista', models.DecimalField(decimal_places=0, default=Decimal('0'), max_digits=14)),
+                ('cantidad_vendida', models.IntegerField(default=0)),
+                ('total_vendido', models.DecimalField(decimal_places=0, default=Decimal('0'), max_digits=14)),
+                ('costo_vendido', models.DecimalField(decimal_places=0, default=Decimal('0'), max_digits=14)),
+                ('producto', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, to='bodega_app.producto')),
+            ],
+        ),
+    ]
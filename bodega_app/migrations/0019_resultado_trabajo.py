@@ -0,0 +1,21 @@
+# Generated by Django 5.2.5 on 2026-10-18 10:49
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bodega_app', '0018_resumenes_pendientes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ResultadoTrabajo',
+            fields=[
+                ('trabajo', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='resultado', serialize=False, to='bodega_app.trabajo')),
+                ('contenido', models.BinaryField()),
+            ],
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 5.2.5 on 2026-10-18 11:20
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    # El resultado pasa de una fila por trabajo a varias (trozos). Se recrea la
+    # tabla: los resultados guardados hasta acá se pierden y hay que volver a
+    # correr esos trabajos para descargarlos.
+
+    dependencies = [
+        ('bodega_app', '0019_resultado_trabajo'),
+    ]
+
+    operations = [
+        migrations.DeleteModel(
+            name='ResultadoTrabajo',
+        ),
+        migrations.CreateModel(
+            name='ResultadoTrabajo',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('orden', models.PositiveIntegerField()),
+                ('contenido', models.BinaryField()),
+                ('trabajo', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='trozos', to='bodega_app.trabajo')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('trabajo', 'orden'), name='resultado_trabajo_orden_unico')],
+            },
+        ),
+    ]
@@ -1,5 +1,7 @@
 from decimal import Decimal
 from django.db import models
+from django.db.models.functions import Lower
+from django.utils import timezone
 from django.contrib.auth.models import AbstractUser
 
 class Usuario(AbstractUser):
@@ -21,12 +23,26 @@ class Proveedor(models.Model):
 
 class Producto(models.Model):
     nombre = models.CharField(max_length=100, unique=True)
+    codigo = models.CharField(max_length=50, unique=True, null=True, blank=True)  # código de barras
     precio_compra = models.DecimalField(max_digits=12, decimal_places=0)
     precio_venta = models.DecimalField(max_digits=12, decimal_places=0)
     stock = models.PositiveIntegerField(default=0)
     stock_minimo = models.PositiveIntegerField(default=5)
     proveedor = models.ForeignKey(Proveedor, on_delete=models.SET_NULL, null=True, blank=True)
 
+    class Meta:
+        indexes = [
+            # Búsqueda por prefijo sin distinguir mayúsculas (ver buscar_productos)
+            models.Index(Lower('nombre'), name='producto_nombre_lower_idx'),
+            # Índice parcial: solo contiene los productos con stock bajo, así
+            # la lista de reposición y el contador no recorren todo el catálogo.
+            models.Index(
+                fields=['proveedor', 'stock'],
+                condition=models.Q(stock__lte=models.F('stock_minimo')),
+                name='producto_stock_bajo_idx',
+            ),
+        ]
+
     def __str__(self):
         return self.nombre
 
@@ -40,8 +56,16 @@ class Venta(models.Model):
         ('mayorista', 'Mayorista'),
     ]
     total = models.DecimalField(max_digits=12, decimal_places=0, default=Decimal('0'))
-    fecha = models.DateTimeField(auto_now_add=True)
+    # Ahora, salvo las ventas cargadas sin conexión, que traen la hora de la caja
+    fecha = models.DateTimeField(default=timezone.now, editable=False)
     tipo = models.CharField(max_length=10, choices=TIPO_VENTA)
+    # Clave generada por la terminal: evita registrar dos veces la misma venta
+    clave_cliente = models.CharField(max_length=64, unique=True, null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['fecha'], name='venta_fecha_idx'),
+        ]
 
     def __str__(self):
         return f"Venta {self.id} - {self.fecha.strftime('%Y-%m-%d %H:%M')}"
@@ -51,6 +75,13 @@ class DetalleVenta(models.Model):
     producto = models.ForeignKey(Producto, on_delete=models.CASCADE)
     cantidad = models.PositiveIntegerField()
     precio_unitario = models.DecimalField(max_digits=12, decimal_places=0, default=0)
+    # Costo del producto al momento de la venta (precio_compra cambia con cada compra)
+    costo_unitario = models.DecimalField(max_digits=12, decimal_places=0, default=0)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['venta', 'producto'], name='detalle_venta_producto_idx'),
+        ]
 
     def __str__(self):
         return f"{self.cantidad} x {self.producto.nombre}"
@@ -60,12 +91,240 @@ class DetalleVenta(models.Model):
         pu = self.precio_unitario or self.producto.precio_venta
         return pu * self.cantidad
 
+class OrdenCompra(models.Model):
+    """Entrega de un proveedor con varias líneas; cada línea es una Compra."""
+    proveedor = models.ForeignKey(Proveedor, on_delete=models.SET_NULL, null=True, blank=True)
+    fecha = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['fecha'], name='orden_compra_fecha_idx'),
+        ]
+
+    def __str__(self):
+        return f"Orden {self.id} - {self.fecha.strftime('%Y-%m-%d %H:%M')}"
+
 class Compra(models.Model):
     producto = models.ForeignKey(Producto, on_delete=models.CASCADE, related_name='compras')
+    # Nulo en las compras sueltas (una por formulario)
+    orden = models.ForeignKey(OrdenCompra, on_delete=models.CASCADE, null=True, blank=True, related_name='lineas')
     cantidad = models.PositiveIntegerField()
     precio_total = models.DecimalField(max_digits=12, decimal_places=0)
     proveedor = models.ForeignKey(Proveedor, on_delete=models.SET_NULL, null=True, blank=True)
     fecha = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['fecha'], name='compra_fecha_idx'),
+            models.Index(fields=['producto', 'fecha'], name='compra_producto_fecha_idx'),
+        ]
+
     def __str__(self):
         return f"Compra {self.id} - {self.fecha.strftime('%Y-%m-%d %H:%M')}"
+
+# -------------------------
+# Resúmenes diarios (rollups)
+# -------------------------
+class ResumenDiario(models.Model):
+    """Totales de un día (hora local), mantenidos junto con cada venta/compra."""
+    fecha = models.DateField(unique=True)
+    cantidad_ventas = models.PositiveIntegerField(default=0)
+    total_ventas = models.DecimalField(max_digits=14, decimal_places=0, default=Decimal('0'))
+    total_compras = models.DecimalField(max_digits=14, decimal_places=0, default=Decimal('0'))
+    # Parte mayorista de las ventas; lo minorista es la diferencia con los totales
+    cantidad_mayorista = models.PositiveIntegerField(default=0)
+    total_mayorista = models.DecimalField(max_digits=14, decimal_places=0, default=Decimal('0'))
+
+    def __str__(self):
+        return f"Resumen {self.fecha}"
+
+class ResumenProductoDiario(models.Model):
+    """Cantidades y montos vendidos/comprados de un producto en un día."""
+    fecha = models.DateField()
+    producto = models.ForeignKey(Producto, on_delete=models.CASCADE, related_name='resumenes')
+    cantidad_vendida = models.IntegerField(default=0)
+    total_vendido = models.DecimalField(max_digits=14, decimal_places=0, default=Decimal('0'))
+    costo_vendido = models.DecimalField(max_digits=14, decimal_places=0, default=Decimal('0'))
+    cantidad_comprada = models.IntegerField(default=0)
+    total_comprado = models.DecimalField(max_digits=14, decimal_places=0, default=Decimal('0'))
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['fecha', 'producto'], name='resumen_producto_dia_unico'),
+        ]
+        indexes = [
+            # Historia de un producto (reposición, tendencia por producto)
+            models.Index(fields=['producto', 'fecha'], name='resumen_producto_fecha_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.producto} - {self.fecha}"
+
+class ResumenPendiente(models.Model):
+    """
+    Aporte de una venta a los resúmenes, todavía sin sumar. La venta solo
+    inserta estas filas; `consolidar_pendientes` las suma a ResumenDiario /
+    ResumenProductoDiario fuera del pedido (runjobs). Sin producto: totales del día.
+    """
+    fecha = models.DateField()
+    producto = models.ForeignKey(Producto, on_delete=models.CASCADE, null=True, blank=True)
+    cantidad_ventas = models.PositiveIntegerField(default=0)
+    total_ventas = models.DecimalField(max_digits=14, decimal_places=0, default=Decimal('0'))
+    cantidad_mayorista = models.PositiveIntegerField(default=0)
+    total_mayorista = models.DecimalField(max_digits=14, decimal_places=0, default=Decimal('0'))
+    cantidad_vendida = models.IntegerField(default=0)
+    total_vendido = models.DecimalField(max_digits=14, decimal_places=0, default=Decimal('0'))
+    costo_vendido = models.DecimalField(max_digits=14, decimal_places=0, default=Decimal('0'))
+
+    def __str__(self):
+        return f"Pendiente {self.fecha} {self.producto_id or 'totales'}"
+
+# -------------------------
+# Movimientos de stock (libro mayor)
+# -------------------------
+class MovimientoStock(models.Model):
+    """Cambio de stock de un producto; se escribe en la misma transacción que el cambio."""
+    TIPOS = [
+        ('venta', 'Venta'),
+        ('compra', 'Compra'),
+        ('compra_edicion', 'Edición de compra'),
+        ('compra_anulacion', 'Anulación de compra'),
+        ('ajuste', 'Ajuste manual'),
+        ('importacion', 'Importación'),
+        ('conciliacion', 'Conciliación'),
+    ]
+    producto = models.ForeignKey(Producto, on_delete=models.CASCADE, related_name='movimientos')
+    fecha = models.DateTimeField(default=timezone.now)
+    cantidad = models.IntegerField()  # positivo entra, negativo sale
+    tipo = models.CharField(max_length=20, choices=TIPOS)
+    referencia = models.BigIntegerField(null=True, blank=True)  # id de la venta/compra que lo originó
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['producto', 'fecha'], name='movimiento_producto_fecha_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.producto} {self.cantidad:+d} ({self.tipo})"
+
+class SnapshotStock(models.Model):
+    """Stock de un producto en un momento dado, según el libro de movimientos."""
+    producto = models.ForeignKey(Producto, on_delete=models.CASCADE, related_name='snapshots')
+    fecha = models.DateTimeField()
+    stock = models.IntegerField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['producto', 'fecha'], name='snapshot_producto_fecha_unico'),
+        ]
+
+    def __str__(self):
+        return f"{self.producto} = {self.stock} @ {self.fecha:%Y-%m-%d %H:%M}"
+
+# -------------------------
+# Archivo histórico (ver archivo.py)
+# -------------------------
+class PeriodoArchivado(models.Model):
+    """Mes cuyas ventas y compras se pasaron a las tablas de archivo."""
+    mes = models.DateField(unique=True)  # primer día del mes
+    ventas = models.PositiveIntegerField(default=0)
+    detalles = models.PositiveIntegerField(default=0)
+    compras = models.PositiveIntegerField(default=0)
+    archivado_en = models.DateTimeField(default=timezone.now)
+
+    def __str__(self):
+        return f"Archivo {self.mes:%Y-%m}"
+
+class VentaArchivada(models.Model):
+    """
+    Venta de un mes archivado, con el mismo id que tenía. Los detalles van en
+    una sola columna: [[producto_id, cantidad, precio_unitario, costo_unitario], ...].
+    """
+    id = models.BigIntegerField(primary_key=True)
+    fecha = models.DateTimeField()
+    tipo = models.CharField(max_length=10, choices=Venta.TIPO_VENTA)
+    total = models.DecimalField(max_digits=12, decimal_places=0)
+    clave_cliente = models.CharField(max_length=64, null=True, blank=True)
+    detalles = models.JSONField(default=list)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['fecha'], name='venta_archivada_fecha_idx'),
+        ]
+
+    def __str__(self):
+        return f"Venta {self.id} - {self.fecha.strftime('%Y-%m-%d %H:%M')} (archivada)"
+
+class CompraArchivada(models.Model):
+    """Compra de un mes archivado; sin claves foráneas, sobrevive al borrado del producto."""
+    id = models.BigIntegerField(primary_key=True)
+    fecha = models.DateTimeField()
+    producto_id = models.BigIntegerField()
+    proveedor_id = models.BigIntegerField(null=True, blank=True)
+    orden_id = models.BigIntegerField(null=True, blank=True)
+    cantidad = models.PositiveIntegerField()
+    precio_total = models.DecimalField(max_digits=12, decimal_places=0)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['fecha'], name='compra_archivada_fecha_idx'),
+        ]
+
+    def __str__(self):
+        return f"Compra {self.id} - {self.fecha.strftime('%Y-%m-%d %H:%M')} (archivada)"
+
+# -------------------------
+# Trabajos en segundo plano (ver trabajos.py)
+# -------------------------
+class Trabajo(models.Model):
+    """Operación larga encolada desde una vista; la ejecuta `manage.py runjobs`."""
+    ESTADOS = [
+        ('pendiente', 'Pendiente'),
+        ('en_curso', 'En curso'),
+        ('terminado', 'Terminado'),
+        ('error', 'Error'),
+        ('cancelado', 'Cancelado'),
+    ]
+    tipo = models.CharField(max_length=50)
+    parametros = models.JSONField(default=dict, blank=True)
+    estado = models.CharField(max_length=10, choices=ESTADOS, default='pendiente')
+    progreso = models.PositiveSmallIntegerField(default=0)  # porcentaje
+    mensaje = models.CharField(max_length=200, blank=True)
+    cancelar = models.BooleanField(default=False)  # pedido por el usuario; el trabajo lo ve al informar avance
+    archivo = models.CharField(max_length=255, blank=True)  # nombre del resultado (ver ResultadoTrabajo)
+    creado_por = models.ForeignKey(Usuario, on_delete=models.SET_NULL, null=True, blank=True)
+    creado_en = models.DateTimeField(default=timezone.now)
+    iniciado_en = models.DateTimeField(null=True, blank=True)
+    actualizado_en = models.DateTimeField(null=True, blank=True)
+    terminado_en = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['estado', 'id'], name='trabajo_estado_idx'),
+        ]
+
+    def __str__(self):
+        return f"Trabajo {self.id} ({self.tipo}, {self.estado})"
+
+    @property
+    def activo(self):
+        return self.estado in ('pendiente', 'en_curso')
+
+class ResultadoTrabajo(models.Model):
+    """
+    Un trozo del archivo que dejó un trabajo. Va en la base y no en disco: el
+    runner puede correr en otra máquina que el servidor web que lo ofrece
+    para descargar. En trozos, para que ni el runner ni la descarga tengan
+    el archivo entero en memoria.
+    """
+    trabajo = models.ForeignKey(Trabajo, on_delete=models.CASCADE, related_name='trozos')
+    orden = models.PositiveIntegerField()
+    contenido = models.BinaryField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['trabajo', 'orden'], name='resultado_trabajo_orden_unico'),
+        ]
+
+    def __str__(self):
+        return f"Resultado del trabajo {self.trabajo_id} ({self.orden})"
@@ -0,0 +1,223 @@
+"""
+Órdenes de compra de varias líneas (una entrega de un proveedor).
+
+Cada línea es una Compra con `orden` apuntando a la OrdenCompra, así los
+resúmenes, los márgenes y el historial de compras las ven igual que a las
+compras sueltas. Registrar, editar o anular una orden es una transacción
+con una cantidad fija de consultas, sin importar cuántas líneas tenga:
+
+- SELECT ... FOR UPDATE de los productos (y un INSERT masivo de los que no
+  existen, que se crean con stock 0 y el proveedor de la orden);
+- INSERT masivo de las líneas (o UPDATE/DELETE al editar);
+- un único upsert de stock y precio_compra sobre las filas ya bloqueadas;
+- el libro de movimientos y los resúmenes agrupados por día.
+
+Una orden con errores no se registra: se informan todos juntos.
+"""
+import csv
+from decimal import Decimal
+from django.db import transaction
+from django.db.models import F, Q
+from .contadores import invalidar_dashboard
+from .inventario import registrar_movimientos_por_referencia
+from .models import Compra, OrdenCompra, Producto
+from .resumenes import registrar_compras
+from .versiones import cambiar_version
+
+COLUMNAS = ("producto", "cantidad", "precio_compra")
+MAX_LINEAS = 500
+
+class OrdenError(Exception):
+    """La orden no puede registrarse; `errores` lista los motivos."""
+
+    def __init__(self, errores):
+        self.errores = list(errores)
+        super().__init__("; ".join(self.errores))
+
+def _entero(valor, campo, minimo):
+    valor = str(valor or "").strip()
+    if not valor.isdigit() or int(valor) < minimo:
+        raise ValueError(f"{campo} debe ser un entero mayor o igual a {minimo}.")
+    return int(valor)
+
+def leer_lineas(filas):
+    """
+    Valida `filas` (pares (número, dict con producto, cantidad, precio_compra))
+    y devuelve [(producto, cantidad, precio_unitario)]. `producto` es el
+    código de barras o el nombre. Las filas sin producto se ignoran.
+    """
+    lineas, errores = [], []
+    for numero, fila in filas:
+        producto = (fila.get("producto") or "").strip()
+        if not producto:
+            continue
+        try:
+            if len(producto) > Producto._meta.get_field("nombre").max_length:
+                raise ValueError("producto demasiado largo.")
+            lineas.append((
+                producto,
+                _entero(fila.get("cantidad"), "cantidad", 1),
+                _entero(fila.get("precio_compra"), "precio_compra", 0),
+            ))
+        except ValueError as e:
+            errores.append(f"Línea {numero}: {e}")
+    if len(lineas) > MAX_LINEAS:
+        errores.append(f"La orden no puede tener más de {MAX_LINEAS} líneas.")
+    if not lineas and not errores:
+        errores.append("La orden no tiene líneas.")
+    if errores:
+        raise OrdenError(errores)
+    return lineas
+
+def lineas_de_formulario(datos):
+    """Líneas de un formulario con listas paralelas producto, cantidad y precio_compra."""
+    columnas = [datos.getlist(c) for c in COLUMNAS]
+    return leer_lineas(
+        (numero, dict(zip(COLUMNAS, valores)))
+        for numero, valores in enumerate(zip(*columnas), start=1)
+    )
+
+def lineas_de_csv(archivo):
+    """Líneas de un CSV con encabezado producto, cantidad, precio_compra."""
+    lector = csv.DictReader(archivo)
+    if lector.fieldnames is None:
+        raise OrdenError(["El archivo está vacío."])
+    lector.fieldnames = [c.strip().lower() for c in lector.fieldnames]
+    faltan = [c for c in COLUMNAS if c not in lector.fieldnames]
+    if faltan:
+        raise OrdenError([f"Faltan columnas: {', '.join(faltan)}."])
+    return leer_lineas((lector.line_num, fila) for fila in lector)
+
+def _bloquear(filtro):
+    # Orden fijo de bloqueo, como en la ingesta de ventas
+    return {p.id: p for p in Producto.objects.select_for_update().filter(filtro).order_by("id")}
+
+def _aplicar_stock(productos, deltas, precios=None):
+    """
+    Suma {producto_id: delta} al stock y fija {producto_id: precio_compra} en
+    filas ya bloqueadas, con un solo INSERT ... ON CONFLICT (id) DO UPDATE.
+    """
+    precios = precios or {}
+    errores = []
+    cambiados = []
+    for pid in deltas.keys() | precios.keys():
+        p = productos[pid]
+        p.stock += deltas.get(pid, 0)
+        if p.stock < 0:
+            errores.append(f"{p.nombre}: el stock quedaría negativo (ya se vendieron unidades).")
+        if pid in precios:
+            p.precio_compra = precios[pid]
+        cambiados.append(p)
+    if errores:
+        raise OrdenError(errores)
+    Producto.objects.bulk_create(
+        cambiados, update_conflicts=True, unique_fields=["id"], update_fields=["stock", "precio_compra"],
+    )
+
+def precios_sobre_venta(orden):
+    """Productos de `orden` que quedaron con precio de compra mayor al de venta (solo un aviso)."""
+    return list(
+        Producto.objects.filter(compras__orden=orden, precio_compra__gt=F("precio_venta"))
+        .distinct().order_by("nombre").values_list("nombre", flat=True)
+    )
+
+def _terminar():
+    invalidar_dashboard()  # bulk_create y update no disparan señales
+    cambiar_version(Producto)
+
+@transaction.atomic
+def crear_orden(proveedor, lineas):
+    """
+    Registra una orden de `proveedor` (o None) con `lineas` de leer_lineas.
+    Los productos desconocidos se crean; el stock y el precio de compra se
+    actualizan en bloque. Lanza OrdenError si alguna línea no puede aplicarse.
+    """
+    referencias = {ref for ref, _, _ in lineas}
+    productos = _bloquear(Q(codigo__in=referencias) | Q(nombre__in=referencias))
+    por_ref = {p.nombre: p for p in productos.values()}
+    por_ref.update({p.codigo: p for p in productos.values() if p.codigo})
+
+    nuevos = {}
+    for ref, _, precio in lineas:
+        if ref not in por_ref:
+            nuevos[ref] = precio
+    if nuevos:
+        Producto.objects.bulk_create([
+            Producto(nombre=ref, precio_compra=precio, precio_venta=precio, stock=0, proveedor=proveedor)
+            for ref, precio in nuevos.items()
+        ], ignore_conflicts=True)
+        creados = _bloquear(Q(nombre__in=list(nuevos)))
+        productos.update(creados)
+        por_ref.update({p.nombre: p for p in creados.values()})
+        cambiar_version(Producto)
+
+    orden = OrdenCompra.objects.create(proveedor=proveedor)
+    compras = Compra.objects.bulk_create([
+        Compra(orden=orden, producto=por_ref[ref], cantidad=cantidad, precio_total=precio * cantidad,
+               proveedor=proveedor)
+        for ref, cantidad, precio in lineas
+    ])
+
+    deltas, precios = {}, {}
+    for compra, (_, _, precio) in zip(compras, lineas):
+        deltas[compra.producto_id] = deltas.get(compra.producto_id, 0) + compra.cantidad
+        precios[compra.producto_id] = precio  # si el producto se repite, vale la última línea
+    _aplicar_stock(productos, deltas, precios)
+    registrar_movimientos_por_referencia({c.id: {c.producto_id: c.cantidad} for c in compras}, "compra")
+    registrar_compras((c, c.cantidad, c.precio_total) for c in compras)
+    _terminar()
+    return orden
+
+@transaction.atomic
+def editar_orden(orden, cambios):
+    """
+    Aplica `cambios` ({compra_id: (cantidad, precio_unitario)}) a las líneas
+    de `orden`; cantidad 0 borra la línea. El stock se corrige por la
+    diferencia, como en compras_editar, pero en bloque.
+    """
+    lineas = {c.id: c for c in orden.lineas.all()}
+    productos = _bloquear(Q(pk__in={c.producto_id for c in lineas.values()}))
+
+    deltas, ajustes, borrar, actualizar = {}, [], [], []
+    for compra_id, (cantidad, precio) in cambios.items():
+        compra = lineas.get(compra_id)
+        if compra is None:
+            continue
+        total = Decimal(precio) * cantidad
+        delta = cantidad - compra.cantidad
+        if not delta and total == compra.precio_total:
+            continue
+        deltas[compra.producto_id] = deltas.get(compra.producto_id, 0) + delta
+        ajustes.append((compra, delta, total - compra.precio_total))
+        if cantidad:
+            compra.cantidad, compra.precio_total = cantidad, total
+            actualizar.append(compra)
+        else:
+            borrar.append(compra.id)
+    if not ajustes:
+        return 0
+
+    _aplicar_stock(productos, deltas)
+    # Los resúmenes van al día de la línea: se suman antes de tocarla
+    registrar_compras(ajustes)
+    registrar_movimientos_por_referencia(
+        {c.id: {c.producto_id: delta} for c, delta, _ in ajustes}, "compra_edicion",
+    )
+    Compra.objects.bulk_update(actualizar, ["cantidad", "precio_total"])
+    Compra.objects.filter(pk__in=borrar).delete()
+    _terminar()
+    return len(ajustes)
+
+@transaction.atomic
+def anular_orden(orden):
+    """Borra la orden y sus líneas descontando del stock lo que había entrado."""
+    lineas = list(orden.lineas.all())
+    productos = _bloquear(Q(pk__in={c.producto_id for c in lineas}))
+    deltas = {}
+    for c in lineas:
+        deltas[c.producto_id] = deltas.get(c.producto_id, 0) - c.cantidad
+    _aplicar_stock(productos, deltas)
+    registrar_compras((c, -c.cantidad, -c.precio_total) for c in lineas)
+    registrar_movimientos_por_referencia({c.id: {c.producto_id: -c.cantidad} for c in lineas}, "compra_anulacion")
+    orden.delete()
+    _terminar()
@@ -0,0 +1,108 @@
+"""
+Paginación por cursor (keyset) para los listados.
+
+En lugar de OFFSET/COUNT(*), cada página se pide "a partir de" los valores de
+orden de la última fila vista, p. ej. `(fecha, id) < (f, i)`. La página N
+cuesta lo mismo que la primera porque la base arranca directo desde el índice.
+"""
+import base64
+import json
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+
+def codificar_cursor(valores):
+    crudo = json.dumps([v.isoformat() if hasattr(v, "isoformat") else v for v in valores])
+    return base64.urlsafe_b64encode(crudo.encode()).decode().rstrip("=")
+
+def decodificar_cursor(cursor):
+    """Devuelve la lista de valores del cursor, o None si falta o es inválido."""
+    if not cursor:
+        return None
+    try:
+        relleno = "=" * (-len(cursor) % 4)
+        valores = json.loads(base64.urlsafe_b64decode(cursor + relleno))
+    except (ValueError, TypeError):
+        return None
+    return valores if isinstance(valores, list) else None
+
+def _despues_de(orden, valores):
+    """
+    Q para las filas que van después de `valores` según `orden`
+    (lista de campos, con '-' para descendente): comparación lexicográfica.
+    """
+    condicion = Q()
+    for i, campo in enumerate(orden):
+        nombre = campo.lstrip("-")
+        lookup = "lt" if campo.startswith("-") else "gt"
+        paso = Q(**{f"{nombre}__{lookup}": valores[i]})
+        for anterior, valor in zip(orden[:i], valores[:i]):
+            paso &= Q(**{anterior.lstrip("-"): valor})
+        condicion |= paso
+    return condicion
+
+def _valores_del_orden(modelo, orden, valores):
+    """
+    Convierte los valores del cursor al tipo de cada campo de `orden`; None si
+    no corresponden (cursor armado a mano): así nunca llegan a la consulta.
+    """
+    if valores is None or len(valores) != len(orden):
+        return None
+    convertidos = []
+    for campo, valor in zip(orden, valores):
+        if valor is None:
+            return None
+        try:
+            convertidos.append(modelo._meta.get_field(campo.lstrip("-")).to_python(valor))
+        except (ValidationError, TypeError, ValueError):
+            return None
+    return convertidos
+
+def _invertir(orden):
+    return [c[1:] if c.startswith("-") else f"-{c}" for c in orden]
+
+class Pagina:
+    def __init__(self, items, cursor_anterior, cursor_siguiente):
+        self.items = items
+        self.cursor_anterior = cursor_anterior
+        self.cursor_siguiente = cursor_siguiente
+
+    def __iter__(self):
+        return iter(self.items)
+
+    def __len__(self):
+        return len(self.items)
+
+def paginar(qs, orden, request, por_pagina=50):
+    """
+    Pagina `qs` por los campos `orden` (el último debe ser único, p. ej. 'id').
+    Lee `cursor` y `dir` ('sig' o 'ant') de request.GET.
+    """
+    valores = _valores_del_orden(qs.model, orden, decodificar_cursor(request.GET.get("cursor")))
+    hacia_atras = valores is not None and request.GET.get("dir") == "ant"
+
+    if hacia_atras:
+        qs = qs.filter(_despues_de(_invertir(orden), valores)).order_by(*_invertir(orden))
+    else:
+        if valores is not None:
+            qs = qs.filter(_despues_de(orden, valores))
+        qs = qs.order_by(*orden)
+
+    items = list(qs[:por_pagina + 1])
+    hay_mas = len(items) > por_pagina
+    items = items[:por_pagina]
+    if hacia_atras:
+        items.reverse()
+
+    def _cursor(obj):
+        return codificar_cursor([getattr(obj, c.lstrip("-")) for c in orden])
+
+    if hacia_atras:
+        hay_anterior, hay_siguiente = hay_mas, True
+    else:
+        hay_anterior, hay_siguiente = valores is not None, hay_mas
+
+    return Pagina(
+        items,
+        _cursor(items[0]) if items and hay_anterior else None,
+        _cursor(items[-1]) if items and hay_siguiente else None,
+    )
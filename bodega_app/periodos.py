@@ -0,0 +1,53 @@
+"""
+Cálculo de períodos de reporte en la zona horaria de la bodega.
+
+Los filtros sobre `fecha` se hacen con rangos semiabiertos de timestamps
+(`fecha__gte=ini, fecha__lt=fin`) en lugar de `fecha__date=...`, para que la
+base pueda usar los índices de la columna.
+"""
+from datetime import date, datetime, time, timedelta
+from django.utils import timezone
+
+PERIODOS = (
+    ("dia", "Día"),
+    ("semana", "Semana"),
+    ("mes", "Mes"),
+    ("personalizado", "Personalizado"),
+)
+
+def parse_fecha(valor):
+    """Convierte 'AAAA-MM-DD' en date; devuelve None si está vacío o es inválido."""
+    try:
+        return date.fromisoformat((valor or "").strip())
+    except ValueError:
+        return None
+
+def inicio_del_dia(dia):
+    """Medianoche local (America/Asuncion, según TIME_ZONE) de `dia`, con zona horaria."""
+    return timezone.make_aware(datetime.combine(dia, time.min))
+
+def rango_timestamps(desde, hasta):
+    """Rango semiabierto [desde 00:00, hasta+1 00:00) en hora local."""
+    return inicio_del_dia(desde), inicio_del_dia(hasta + timedelta(days=1))
+
+def rango_fechas(periodo, desde=None, hasta=None, hoy=None):
+    """
+    Devuelve (desde, hasta), ambos inclusive, para el período pedido.
+    `desde` sirve de día de referencia para día/semana/mes; si falta se usa hoy.
+    Lanza ValueError si el período personalizado está incompleto o invertido.
+    """
+    ref = desde or hoy or timezone.localdate()
+    if periodo == "semana":
+        inicio = ref - timedelta(days=ref.weekday())
+        return inicio, inicio + timedelta(days=6)
+    if periodo == "mes":
+        inicio = ref.replace(day=1)
+        siguiente = (inicio + timedelta(days=32)).replace(day=1)
+        return inicio, siguiente - timedelta(days=1)
+    if periodo == "personalizado":
+        if desde is None or hasta is None:
+            raise ValueError("Indicá las fechas desde y hasta.")
+        if desde > hasta:
+            raise ValueError("La fecha desde no puede ser posterior a hasta.")
+        return desde, hasta
+    return ref, ref
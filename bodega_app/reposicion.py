@@ -0,0 +1,74 @@
+"""
+Sugerencias de reposición según la velocidad de venta.
+
+La demanda diaria de cada producto es el promedio de lo vendido en los
+últimos `dias` días cerrados (de ResumenProductoDiario). Con eso se calcula:
+
+- dias_cobertura: cuántos días alcanza el stock actual.
+- minimo_sugerido: lo que se vende durante el `plazo` de entrega del proveedor.
+- cantidad_sugerida: lo que hay que pedir para cubrir plazo + `cobertura` días.
+
+Todo el cálculo es una sola consulta: la base lo resuelve para todo el
+catálogo a la vez, sin recorrer productos en Python.
+"""
+from datetime import timedelta
+from django.db import transaction
+from django.db.models import Exists, F, FloatField, IntegerField, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Cast, Ceil, Coalesce, Greatest, NullIf
+from django.utils import timezone
+from .contadores import invalidar_dashboard
+from .models import Producto, ResumenProductoDiario
+from .versiones import cambiar_version
+
+DIAS = 28
+PLAZO = 7
+COBERTURA = 14
+
+def _ventana(dias, hoy):
+    """Últimos `dias` días completos (hoy todavía no terminó)."""
+    hoy = hoy or timezone.localdate()
+    return hoy - timedelta(days=dias), hoy - timedelta(days=1)
+
+def _demanda(dias, hoy):
+    desde, hasta = _ventana(dias, hoy)
+    vendido = (
+        ResumenProductoDiario.objects
+        .filter(producto=OuterRef("pk"), fecha__gte=desde, fecha__lte=hasta)
+        .order_by()
+        .values("producto")
+        .annotate(s=Sum("cantidad_vendida"))
+        .values("s")
+    )
+    return Cast(Coalesce(Subquery(vendido, output_field=IntegerField()), 0), FloatField()) / dias
+
+def sugerencias(dias=DIAS, plazo=PLAZO, cobertura=COBERTURA, hoy=None):
+    """Productos anotados con demanda, dias_cobertura, minimo_sugerido y cantidad_sugerida."""
+    return (
+        Producto.objects
+        .annotate(demanda=_demanda(dias, hoy))
+        .annotate(
+            dias_cobertura=Cast(F("stock"), FloatField()) / NullIf(F("demanda"), Value(0.0)),
+            minimo_sugerido=Cast(Ceil(F("demanda") * plazo), IntegerField()),
+            cantidad_sugerida=Greatest(
+                Cast(Ceil(F("demanda") * (plazo + cobertura)), IntegerField()) - F("stock"), Value(0),
+            ),
+        )
+    )
+
+@transaction.atomic
+def guardar_stock_minimo(dias=DIAS, plazo=PLAZO, cobertura=COBERTURA, hoy=None):
+    """
+    Reemplaza stock_minimo por el sugerido con un único UPDATE, solo en los
+    productos que se vendieron en la ventana (el resto conserva el valor
+    cargado a mano). Devuelve la cantidad de productos actualizados.
+    """
+    desde, hasta = _ventana(dias, hoy)
+    vendidos = ResumenProductoDiario.objects.filter(
+        producto=OuterRef("pk"), fecha__gte=desde, fecha__lte=hasta, cantidad_vendida__gt=0,
+    )
+    actualizados = Producto.objects.filter(Exists(vendidos)).update(
+        stock_minimo=Cast(Ceil(_demanda(dias, hoy) * plazo), IntegerField()),
+    )
+    invalidar_dashboard()  # update() no dispara señales
+    cambiar_version(Producto)
+    return actualizados
@@ -0,0 +1,170 @@
+"""
+Mantenimiento incremental de los resúmenes diarios.
+
+Las vistas que registran ventas o compras llaman a estas funciones dentro de
+su misma transacción, así los reportes leen unas pocas filas ya sumadas en
+lugar de recorrer los detalles del día. Cada función usa una cantidad fija
+de consultas, sin importar cuántos productos toque.
+
+El checkout es la excepción: todas las cajas suman a la misma fila de
+ResumenDiario (la de hoy), y actualizarla dentro de la venta haría que las
+ventas esperen una detrás de otra aunque no compartan productos. La venta
+solo inserta su aporte en ResumenPendiente (`registrar_venta_pendiente`) y
+`consolidar_pendientes` lo suma en lotes fuera del pedido: lo llama el runner
+de trabajos (runjobs) en cada vuelta, o `manage.py consolidar_resumenes`.
+Hasta entonces, los totales de hoy no incluyen esas ventas.
+"""
+from decimal import Decimal
+from django.db import transaction
+from django.db.models import F, Sum
+from django.utils import timezone
+from .contadores import invalidar_dashboard
+from .models import ResumenDiario, ResumenPendiente, ResumenProductoDiario
+from .tendencias import invalidar_tendencias
+
+_CAMPOS_PRODUCTO = ("cantidad_vendida", "total_vendido", "costo_vendido", "cantidad_comprada", "total_comprado")
+_CAMPOS_PENDIENTE_DIA = ("cantidad_ventas", "total_ventas", "cantidad_mayorista", "total_mayorista")
+_CAMPOS_PENDIENTE_PRODUCTO = ("cantidad_vendida", "total_vendido", "costo_vendido")
+LOTE_PENDIENTES = 500
+
+def dia_local(fecha):
+    """Día calendario (hora de la bodega) de un datetime con zona horaria."""
+    return timezone.localdate(fecha)
+
+def sumar_dia(dia, cantidad_ventas=0, total_ventas=0, total_compras=0, cantidad_mayorista=0, total_mayorista=0):
+    ResumenDiario.objects.bulk_create([ResumenDiario(fecha=dia)], ignore_conflicts=True)
+    ResumenDiario.objects.filter(fecha=dia).update(
+        cantidad_ventas=F("cantidad_ventas") + cantidad_ventas,
+        total_ventas=F("total_ventas") + Decimal(total_ventas),
+        total_compras=F("total_compras") + Decimal(total_compras),
+        cantidad_mayorista=F("cantidad_mayorista") + cantidad_mayorista,
+        total_mayorista=F("total_mayorista") + Decimal(total_mayorista),
+    )
+    if dia < timezone.localdate():
+        # Cambió un día ya cerrado: las tendencias guardadas quedan viejas
+        invalidar_tendencias()
+
+def sumar_productos(dia, deltas):
+    """
+    Aplica `deltas` ({producto_id: {campo: valor}}) a los resúmenes por
+    producto del día con tres consultas, sin importar cuántos productos sean:
+    INSERT ... ON CONFLICT DO NOTHING de las filas que falten, SELECT ... FOR
+    UPDATE de todas y un INSERT ... ON CONFLICT DO UPDATE con los nuevos valores.
+    """
+    if not deltas:
+        return
+    ResumenProductoDiario.objects.bulk_create(
+        [ResumenProductoDiario(fecha=dia, producto_id=pid) for pid in deltas],
+        ignore_conflicts=True,
+    )
+    filas = list(
+        ResumenProductoDiario.objects.select_for_update()
+        .filter(fecha=dia, producto_id__in=list(deltas)).order_by("producto_id")
+    )
+    for fila in filas:
+        for campo, valor in deltas[fila.producto_id].items():
+            setattr(fila, campo, getattr(fila, campo) + valor)
+    ResumenProductoDiario.objects.bulk_create(
+        filas,
+        update_conflicts=True,
+        unique_fields=["fecha", "producto"],
+        update_fields=list(_CAMPOS_PRODUCTO),
+    )
+
+def registrar_venta(venta, detalles):
+    registrar_ventas([venta], detalles)
+
+def _agrupar_ventas(ventas, detalles):
+    """{día: (totales del día, {producto_id: deltas})} de `ventas` y sus `detalles`."""
+    dias = {}
+    ventas_por_id = {}
+    for venta in ventas:
+        dia = dia_local(venta.fecha)
+        ventas_por_id[venta.pk] = dia
+        totales = dias.setdefault(dia, [
+            {"cantidad_ventas": 0, "total_ventas": Decimal("0"), "cantidad_mayorista": 0, "total_mayorista": Decimal("0")},
+            {},
+        ])[0]
+        totales["cantidad_ventas"] += 1
+        totales["total_ventas"] += venta.total
+        if venta.tipo == "mayorista":
+            totales["cantidad_mayorista"] += 1
+            totales["total_mayorista"] += venta.total
+    for d in detalles:
+        deltas = dias[ventas_por_id[d.venta_id]][1]
+        fila = deltas.setdefault(
+            d.producto_id, {"cantidad_vendida": 0, "total_vendido": Decimal("0"), "costo_vendido": Decimal("0")},
+        )
+        fila["cantidad_vendida"] += d.cantidad
+        fila["total_vendido"] += d.subtotal
+        fila["costo_vendido"] += d.costo_unitario * d.cantidad
+    return dias
+
+def registrar_ventas(ventas, detalles):
+    """Suma varias ventas (y sus detalles) con las mismas consultas por día que una sola venta."""
+    for dia, (totales, deltas) in _agrupar_ventas(ventas, detalles).items():
+        sumar_dia(dia, **totales)
+        sumar_productos(dia, deltas)
+
+def registrar_venta_pendiente(venta, detalles):
+    """
+    Como registrar_venta, para el checkout: un solo INSERT en ResumenPendiente,
+    sin bloquear filas compartidas. Lo consolida después el runner de trabajos.
+    """
+    filas = []
+    for dia, (totales, deltas) in _agrupar_ventas([venta], detalles).items():
+        filas.append(ResumenPendiente(fecha=dia, **totales))
+        filas += [ResumenPendiente(fecha=dia, producto_id=pid, **d) for pid, d in deltas.items()]
+    ResumenPendiente.objects.bulk_create(filas)
+
+@transaction.atomic
+def _consolidar_lote(lote):
+    # SKIP LOCKED: si otra caja ya está consolidando, se sigue con el resto en lugar de esperarla
+    ids = list(
+        ResumenPendiente.objects.select_for_update(skip_locked=True)
+        .order_by("id").values_list("id", flat=True)[:lote]
+    )
+    if not ids:
+        return 0
+    qs = ResumenPendiente.objects.filter(id__in=ids).order_by()
+    for r in (
+        qs.filter(producto__isnull=True).values("fecha")
+        .annotate(**{c: Sum(c) for c in _CAMPOS_PENDIENTE_DIA}).order_by("fecha")
+    ):
+        sumar_dia(r.pop("fecha"), **r)
+    por_dia = {}
+    for r in (
+        qs.filter(producto__isnull=False).values("fecha", "producto_id")
+        .annotate(**{c: Sum(c) for c in _CAMPOS_PENDIENTE_PRODUCTO})
+    ):
+        por_dia.setdefault(r.pop("fecha"), {})[r.pop("producto_id")] = r
+    for dia in sorted(por_dia):
+        sumar_productos(dia, por_dia[dia])
+    qs.delete()
+    invalidar_dashboard()  # el total del día recién ahora incluye las ventas
+    return len(ids)
+
+def consolidar_pendientes(lote=LOTE_PENDIENTES):
+    """Suma los ResumenPendiente a los resúmenes, de a `lote` filas por transacción. Devuelve cuántas sumó."""
+    total = 0
+    while True:
+        n = _consolidar_lote(lote)
+        if not n:
+            return total
+        total += n
+
+def registrar_compra(compra, cantidad, total):
+    """Suma (o resta, con valores negativos) una compra en el día en que se registró."""
+    registrar_compras([(compra, cantidad, total)])
+
+def registrar_compras(cambios):
+    """Como registrar_compra para varios (compra, cantidad, total), con las consultas de un día por día."""
+    dias = {}
+    for compra, cantidad, total in cambios:
+        deltas = dias.setdefault(dia_local(compra.fecha), {})
+        fila = deltas.setdefault(compra.producto_id, {"cantidad_comprada": 0, "total_comprado": Decimal("0")})
+        fila["cantidad_comprada"] += cantidad
+        fila["total_comprado"] += Decimal(total)
+    for dia, deltas in dias.items():
+        sumar_dia(dia, total_compras=sum(f["total_comprado"] for f in deltas.values()))
+        sumar_productos(dia, deltas)
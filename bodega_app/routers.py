@@ -0,0 +1,51 @@
+"""
+Ruteo opcional de lecturas a una réplica.
+
+Si DATABASE_REPLICA_URL está definido, settings.py agrega el alias
+"replica". Las vistas de reportes e historial marcadas con
+`decorators.usar_replica` (y cualquier código dentro de `en_replica()`)
+leen de ahí. Todo lo demás, incluidas las escrituras, el dashboard y la
+venta, sigue en "default", así cada request lee lo que acaba de escribir.
+"""
+import contextvars
+from contextlib import contextmanager
+from django.db import DEFAULT_DB_ALIAS, connections
+
+REPLICA = "replica"
+
+_en_replica = contextvars.ContextVar("bodega_en_replica", default=False)
+
+def hay_replica():
+    return REPLICA in connections.settings
+
+@contextmanager
+def en_replica():
+    """Manda a la réplica las lecturas hechas dentro del bloque (si hay réplica)."""
+    token = _en_replica.set(True)
+    try:
+        yield
+    finally:
+        _en_replica.reset(token)
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        if not _en_replica.get() or not hay_replica():
+            return None
+        # El caché en la base (DatabaseCache) se lee siempre del primario: en la réplica llegaría tarde
+        if model._meta.app_label == "django_cache":
+            return None
+        # Dentro de una transacción en el primario hay que leer lo propio
+        if connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return None
+        return REPLICA
+
+    def db_for_write(self, model, **hints):
+        return None
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Primario y réplica tienen los mismos datos
+        return True
+
+    def allow_migrate(self, db, app_label, **hints):
+        # La réplica se actualiza por replicación, no con migrate
+        return db != REPLICA
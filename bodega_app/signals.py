@@ -0,0 +1,21 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from .contadores import invalidar_dashboard
+from .models import Compra, Producto, Proveedor, Venta
+from .versiones import cambiar_version
+
+@receiver(post_save, sender=Producto)
+@receiver(post_delete, sender=Producto)
+@receiver(post_save, sender=Venta)
+@receiver(post_delete, sender=Venta)
+@receiver(post_save, sender=Compra)
+@receiver(post_delete, sender=Compra)
+def _invalidar_dashboard(sender, **kwargs):
+    invalidar_dashboard()
+
+@receiver(post_save, sender=Producto)
+@receiver(post_delete, sender=Producto)
+@receiver(post_save, sender=Proveedor)
+@receiver(post_delete, sender=Proveedor)
+def _cambiar_version(sender, **kwargs):
+    cambiar_version(sender)
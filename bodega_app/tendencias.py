@@ -0,0 +1,137 @@
+"""
+Tendencias de ventas y compras por día, semana o mes.
+
+Se leen de los resúmenes diarios (ResumenDiario / ResumenProductoDiario), que
+ya están en días de la hora local de la bodega; la base agrupa esos días por
+semana o mes con Trunc. Un período cerrado (terminó antes de hoy) no cambia
+más, así que su resultado se guarda en el caché sin vencimiento y solo el
+período abierto se recalcula en cada request.
+
+Si se modifica un día ya cerrado (editar o anular una compra vieja,
+reconstruir_resumenes), `invalidar_tendencias` cambia la generación que
+forma parte de las claves y los períodos guardados dejan de usarse.
+"""
+import uuid
+from datetime import timedelta
+from decimal import Decimal
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import DateField, Sum
+from django.db.models.functions import Trunc
+from django.utils import timezone
+from .models import ResumenDiario, ResumenProductoDiario
+
+GRANULARIDADES = (
+    # valor, etiqueta, kind de Trunc, cantidad de períodos por defecto
+    ("dia", "Día", "day", 30),
+    ("semana", "Semana", "week", 26),
+    ("mes", "Mes", "month", 24),
+)
+MAX_PERIODOS = 120
+
+_CLAVE_GENERACION = "tendencias:generacion"
+
+_CAMPOS_TOTALES = {
+    "cantidad": "cantidad_ventas",
+    "ventas": "total_ventas",
+    "cantidad_mayorista": "cantidad_mayorista",
+    "mayorista": "total_mayorista",
+    "compras": "total_compras",
+}
+_CAMPOS_PRODUCTO = {
+    "cantidad": "cantidad_vendida",
+    "ventas": "total_vendido",
+    "cantidad_comprada": "cantidad_comprada",
+    "compras": "total_comprado",
+}
+
+def inicio_periodo(dia, por):
+    if por == "semana":
+        return dia - timedelta(days=dia.weekday())
+    if por == "mes":
+        return dia.replace(day=1)
+    return dia
+
+def siguiente_periodo(inicio, por):
+    if por == "semana":
+        return inicio + timedelta(days=7)
+    if por == "mes":
+        return (inicio + timedelta(days=32)).replace(day=1)
+    return inicio + timedelta(days=1)
+
+def _inicios(por, cantidad, hoy):
+    """Inicios de los últimos `cantidad` períodos; el último es el que contiene a hoy."""
+    inicio = inicio_periodo(hoy, por)
+    inicios = [inicio]
+    for _ in range(cantidad - 1):
+        inicio = inicio_periodo(inicio - timedelta(days=1), por)
+        inicios.append(inicio)
+    return inicios[::-1]
+
+def _vacio(producto_id):
+    campos = _CAMPOS_PRODUCTO if producto_id else _CAMPOS_TOTALES
+    return {c: Decimal("0") if not c.startswith("cantidad") else 0 for c in campos}
+
+def _calcular(por, desde, hasta, producto_id=None):
+    """{inicio_de_periodo: valores} de [desde, hasta], en una sola consulta agrupada."""
+    kind = next(k for valor, _, k, _ in GRANULARIDADES if valor == por)
+    if producto_id:
+        qs, campos = ResumenProductoDiario.objects.filter(producto_id=producto_id), _CAMPOS_PRODUCTO
+    else:
+        qs, campos = ResumenDiario.objects.all(), _CAMPOS_TOTALES
+    filas = (
+        qs.filter(fecha__gte=desde, fecha__lte=hasta)
+        .annotate(periodo=Trunc("fecha", kind, output_field=DateField()))
+        .values("periodo")
+        .annotate(**{c: Sum(campo) for c, campo in campos.items()})
+        .order_by()
+    )
+    return {
+        f.pop("periodo"): {c: v or 0 for c, v in f.items()}
+        for f in filas
+    }
+
+def _generacion():
+    return cache.get_or_set(_CLAVE_GENERACION, lambda: uuid.uuid4().hex, None)
+
+def invalidar_tendencias():
+    """Descarta los períodos cerrados guardados cuando la transacción en curso se confirma."""
+    transaction.on_commit(lambda: cache.set(_CLAVE_GENERACION, uuid.uuid4().hex, None))
+
+def serie(por, cantidad=None, producto_id=None, hoy=None):
+    """
+    Lista de períodos (del más viejo al actual) con inicio, fin, si está
+    cerrado y los totales. Sin `producto_id` incluye el reparto minorista /
+    mayorista; con `producto_id`, las cantidades y montos de ese producto.
+    """
+    hoy = hoy or timezone.localdate()
+    if cantidad is None:
+        cantidad = next(n for valor, _, _, n in GRANULARIDADES if valor == por)
+    inicios = _inicios(por, max(1, min(cantidad, MAX_PERIODOS)), hoy)
+    cerrados, abierto = inicios[:-1], inicios[-1]
+
+    generacion = _generacion()
+    claves = {
+        i: f"tendencias:{generacion}:{por}:{producto_id or 'total'}:{i.isoformat()}" for i in cerrados
+    }
+    guardados = cache.get_many(claves.values()) if claves else {}
+    faltan = [i for i in cerrados if claves[i] not in guardados]
+    if faltan:
+        datos = _calcular(por, faltan[0], abierto - timedelta(days=1), producto_id)
+        nuevos = {claves[i]: datos.get(i, _vacio(producto_id)) for i in faltan}
+        cache.set_many(nuevos, timeout=None)
+        guardados.update(nuevos)
+    actual = _calcular(por, abierto, hoy, producto_id).get(abierto, _vacio(producto_id))
+
+    resultado = []
+    for inicio in inicios:
+        valores = dict(guardados[claves[inicio]] if inicio in claves else actual)
+        if not producto_id:
+            valores["minorista"] = valores["ventas"] - valores["mayorista"]
+        resultado.append({
+            "inicio": inicio,
+            "fin": siguiente_periodo(inicio, por) - timedelta(days=1),
+            "cerrado": inicio != abierto,
+            **valores,
+        })
+    return resultado
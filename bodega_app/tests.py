@@ -1,3 +1,1381 @@
-from django.test import TestCase
+import json
+import tempfile
+from concurrent.futures import Future
+import uuid
+from datetime import date, timedelta
+from io import StringIO
+from types import SimpleNamespace
+from unittest import mock, skipUnless
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.cache.backends.db import DatabaseCache
+from django.core.management import CommandError, call_command
+from django.db import OperationalError, connection
+from django.test import RequestFactory, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from .carrito import Carrito, get_backend
+from .conciliacion import conciliar, desvios
+from .exportar import filas_csv
+from .importar import importar_productos
+from .ingesta import ingerir_ventas
+from .inventario import stock_en, tomar_snapshots
+from .ordenes import OrdenError, anular_orden, crear_orden, editar_orden, lineas_de_csv
+from .models import (
+    Compra, CompraArchivada, DetalleVenta, MovimientoStock, OrdenCompra, PeriodoArchivado, Producto, Proveedor, ResumenDiario, ResumenPendiente, ResumenProductoDiario,
+    ResultadoTrabajo, SnapshotStock, Trabajo, Venta, VentaArchivada,
+)
+from .paginacion import codificar_cursor, paginar
+from .periodos import rango_fechas, rango_timestamps
+from . import routers
+from .reposicion import sugerencias as sugerencias_reposicion
+from .routers import ReplicaRouter, en_replica
+from .resumenes import consolidar_pendientes, sumar_dia
+from .tendencias import serie
+from . import trabajos
+from . import vender
+from .vender import VentaError, crear_venta
+from .versiones import version
+
+Usuario = get_user_model()
+
+CACHES_MEMORIA = {
+    "default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"},
+    "carritos": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache", "LOCATION": "carritos"},
+}
+
+
+def cargar_carrito(client, productos, cantidad):
+    """Guarda un carrito con `cantidad` de cada producto para la sesión de `client`."""
+    carrito = Carrito()
+    for p in productos:
+        carrito.agregar(p, cantidad)
+    get_backend().guardar(SimpleNamespace(session=client.session, user=None), carrito)
+
+
+def leer_carrito(client):
+    return get_backend().cargar(SimpleNamespace(session=client.session, user=None))
+
+
+class ConfirmarVentaTests(TestCase):
+    def setUp(self):
+        self.user = Usuario.objects.create_user(username="caja", password="x")
+        self.client.force_login(self.user)
+
+    def _crear_productos(self, n, stock=100):
+        return Producto.objects.bulk_create([
+            Producto(nombre=f"Prod {i}", precio_compra=50, precio_venta=100 + i, stock=stock)
+            for i in range(n)
+        ])
+
+    def _cargar_carrito(self, productos, cantidad=2):
+        cargar_carrito(self.client, productos, cantidad)
+
+    def _confirmar(self):
+        # Los on_commit cuentan: en producción corren dentro del mismo pedido
+        with CaptureQueriesContext(connection) as ctx, self.captureOnCommitCallbacks(execute=True):
+            resp = self.client.get(reverse("bodega:confirmar_venta"))
+        self.assertEqual(resp.status_code, 302)
+        return len(ctx.captured_queries)
+
+    def test_confirmar_descuenta_stock_y_crea_detalles(self):
+        productos = self._crear_productos(3, stock=10)
+        self._cargar_carrito(productos, cantidad=4)
+        self._confirmar()
+
+        venta = Venta.objects.get()
+        self.assertEqual(venta.total, sum(p.precio_venta * 4 for p in productos))
+        detalles = DetalleVenta.objects.filter(venta=venta).order_by("producto_id")
+        self.assertEqual(
+            [(d.producto_id, d.cantidad, d.precio_unitario) for d in detalles],
+            [(p.id, 4, p.precio_venta) for p in productos],
+        )
+        self.assertEqual(set(Producto.objects.values_list("stock", flat=True)), {6})
+        self.assertFalse(leer_carrito(self.client))
+
+    def test_stock_insuficiente_no_registra_venta(self):
+        productos = self._crear_productos(2, stock=1)
+        self._cargar_carrito(productos, cantidad=3)
+        self._confirmar()
+
+        self.assertFalse(Venta.objects.exists())
+        self.assertEqual(set(Producto.objects.values_list("stock", flat=True)), {1})
+
+    def test_cantidad_de_consultas_no_crece_con_el_carrito(self):
+        productos = self._crear_productos(40)
+
+        self._cargar_carrito(productos[:1])
+        consultas_chico = self._confirmar()
+
+        self._cargar_carrito(productos)
+        consultas_grande = self._confirmar()
+
+        self.assertEqual(consultas_chico, consultas_grande)
+        self.assertEqual(Venta.objects.count(), 2)
+        self.assertEqual(DetalleVenta.objects.count(), 41)
+
+
+class ResumenesTests(TestCase):
+    def setUp(self):
+        self.user = Usuario.objects.create_user(username="caja", password="x")
+        self.client.force_login(self.user)
+        self.producto = Producto.objects.create(nombre="Yerba", precio_compra=80, precio_venta=120, stock=0)
+
+    def _vender(self, cantidad):
+        cargar_carrito(self.client, [self.producto], cantidad)
+        self.client.get(reverse("bodega:confirmar_venta"))
+        # Lo que haría el runner en su siguiente vuelta
+        consolidar_pendientes()
+
+    def _filas(self):
+        return (
+            list(ResumenDiario.objects.values_list("fecha", "cantidad_ventas", "total_ventas", "total_compras")),
+            list(ResumenProductoDiario.objects.values_list(
+                "fecha", "producto_id", "cantidad_vendida", "total_vendido", "cantidad_comprada", "total_comprado",
+            )),
+        )
+
+    def test_resumenes_siguen_compras_y_ventas(self):
+        self.client.post(reverse("bodega:compras"), {
+            "producto_id": self.producto.id, "precio_compra": "80", "cantidad": "10",
+        })
+        compra = Compra.objects.get()
+        self.client.post(reverse("bodega:compras_editar", args=[compra.id]), {
+            "cantidad": "8", "precio_total": "640",
+        })
+        self._vender(3)
+
+        resumen = ResumenDiario.objects.get()
+        self.assertEqual((resumen.cantidad_ventas, resumen.total_ventas, resumen.total_compras), (1, 360, 640))
+        fila = ResumenProductoDiario.objects.get()
+        self.assertEqual(
+            (fila.cantidad_vendida, fila.total_vendido, fila.cantidad_comprada, fila.total_comprado),
+            (3, 360, 8, 640),
+        )
+
+        resp = self.client.get(reverse("bodega:reportes"))
+        self.assertEqual(resp.context["total_ventas"], 360)
+        self.assertEqual(resp.context["total_compras"], 640)
+
+        self.client.post(reverse("bodega:compras"), {
+            "producto_id": self.producto.id, "precio_compra": "80", "cantidad": "4",
+        })
+        self.assertEqual(ResumenDiario.objects.get().total_compras, 960)
+        otra = Compra.objects.latest("id")
+        self.client.get(reverse("bodega:compras_eliminar", args=[otra.id]))
+        self.assertEqual(ResumenDiario.objects.get().total_compras, 640)
+
+    def test_reconstruir_coincide_con_incremental(self):
+        self.client.post(reverse("bodega:compras"), {
+            "producto_id": self.producto.id, "precio_compra": "80", "cantidad": "10",
+        })
+        self._vender(2)
+        self._vender(5)
+        incremental = self._filas()
+
+        ResumenDiario.objects.all().delete()
+        ResumenProductoDiario.objects.all().delete()
+        call_command("reconstruir_resumenes", stdout=StringIO())
+
+        self.assertEqual(self._filas(), incremental)
+
+    def test_la_venta_no_toca_los_resumenes_compartidos(self):
+        self.client.post(reverse("bodega:compras"), {
+            "producto_id": self.producto.id, "precio_compra": "80", "cantidad": "10",
+        })
+        antes = self._filas()
+        with CaptureQueriesContext(connection) as ctx, self.captureOnCommitCallbacks(execute=True):
+            crear_venta([{"producto_id": self.producto.id, "cantidad": 2}])
+        sql = " ".join(q["sql"] for q in ctx.captured_queries)
+        self.assertNotIn("bodega_app_resumendiario", sql)
+        self.assertNotIn("bodega_app_resumenproductodiario", sql)
+        self.assertEqual(self._filas(), antes)
+        self.assertEqual(ResumenPendiente.objects.count(), 2)
+
+        self.assertEqual(consolidar_pendientes(), 2)
+        self.assertFalse(ResumenPendiente.objects.exists())
+        self.assertEqual(ResumenDiario.objects.get().total_ventas, 240)
+        self.assertEqual(ResumenProductoDiario.objects.get().cantidad_vendida, 2)
+
+        # Si la consolidación no llegó a correr, reconstruir no cuenta la venta dos veces
+        crear_venta([{"producto_id": self.producto.id, "cantidad": 1}])
+        call_command("reconstruir_resumenes", stdout=StringIO())
+        self.assertFalse(ResumenPendiente.objects.exists())
+        self.assertEqual(ResumenDiario.objects.get().total_ventas, 360)
+        self.assertEqual(consolidar_pendientes(), 0)
+
+    def test_optimista_bloquea_productos_al_final(self):
+        # Consultas que corren con las filas de producto ya bloqueadas (hasta el COMMIT)
+        Producto.objects.filter(pk=self.producto.pk).update(stock=10)
+        con_bloqueo = {}
+        for modo in vender.MODOS:
+            with CaptureQueriesContext(connection) as ctx:
+                crear_venta([{"producto_id": self.producto.id, "cantidad": 1}], modo=modo)
+            sql = [q["sql"].upper() for q in ctx.captured_queries if "SAVEPOINT" not in q["sql"].upper()]
+            if modo == "bloqueo":
+                primera = next(i for i, q in enumerate(sql) if q.startswith("SELECT") and "BODEGA_APP_PRODUCTO" in q)
+            else:
+                primera = next(i for i, q in enumerate(sql) if q.startswith("UPDATE") and "BODEGA_APP_PRODUCTO" in q)
+            con_bloqueo[modo] = len(sql) - primera
+        self.assertEqual(con_bloqueo["optimista"], 1)
+        self.assertGreater(con_bloqueo["bloqueo"], 3)
+
+
+class ReportesPeriodoTests(TestCase):
+    def setUp(self):
+        self.user = Usuario.objects.create_user(username="caja", password="x")
+        self.client.force_login(self.user)
+        self.producto = Producto.objects.create(nombre="Yerba", precio_compra=80, precio_venta=120)
+        for dia, cantidad in ((date(2025, 3, 1), 2), (date(2025, 3, 31), 3), (date(2025, 4, 1), 7)):
+            ResumenDiario.objects.create(fecha=dia, cantidad_ventas=1, total_ventas=120 * cantidad)
+            ResumenProductoDiario.objects.create(
+                fecha=dia, producto=self.producto, cantidad_vendida=cantidad, total_vendido=120 * cantidad,
+            )
+
+    def test_rango_fechas(self):
+        ref = date(2025, 3, 12)
+        self.assertEqual(rango_fechas("dia", ref), (ref, ref))
+        self.assertEqual(rango_fechas("semana", ref), (date(2025, 3, 10), date(2025, 3, 16)))
+        self.assertEqual(rango_fechas("mes", ref), (date(2025, 3, 1), date(2025, 3, 31)))
+        with self.assertRaises(ValueError):
+            rango_fechas("personalizado", date(2025, 3, 2), date(2025, 3, 1))
+
+    def test_reporte_mensual_suma_solo_el_mes(self):
+        resp = self.client.get(reverse("bodega:reportes"), {"periodo": "mes", "desde": "2025-03-15"})
+        self.assertEqual(resp.context["total_ventas"], 600)
+        self.assertEqual(resp.context["cantidad_ventas"], 2)
+        self.assertEqual(
+            [(r["producto__nombre"], r["cantidad"]) for r in resp.context["ventas_detalle"]],
+            [("Yerba", 5)],
+        )
+
+
+class PaginacionTests(TestCase):
+    def setUp(self):
+        Producto.objects.bulk_create([
+            Producto(nombre=f"Prod {i:02d}", precio_compra=1, precio_venta=1) for i in range(10)
+        ])
+        self.factory = RequestFactory()
+
+    def _pagina(self, **params):
+        return paginar(Producto.objects.all(), ["nombre", "id"], self.factory.get("/", params), por_pagina=4)
+
+    def test_recorre_hacia_adelante_y_atras(self):
+        p1 = self._pagina()
+        self.assertEqual([p.nombre for p in p1], ["Prod 00", "Prod 01", "Prod 02", "Prod 03"])
+        self.assertIsNone(p1.cursor_anterior)
+
+        p2 = self._pagina(cursor=p1.cursor_siguiente, dir="sig")
+        p3 = self._pagina(cursor=p2.cursor_siguiente, dir="sig")
+        self.assertEqual([p.nombre for p in p3], ["Prod 08", "Prod 09"])
+        self.assertIsNone(p3.cursor_siguiente)
+
+        atras = self._pagina(cursor=p3.cursor_anterior, dir="ant")
+        self.assertEqual([p.nombre for p in atras], [p.nombre for p in p2])
+        atras = self._pagina(cursor=atras.cursor_anterior, dir="ant")
+        self.assertEqual([p.nombre for p in atras], [p.nombre for p in p1])
+        self.assertIsNone(atras.cursor_anterior)
+
+    def test_cursor_invalido_vuelve_a_la_primera_pagina(self):
+        self.assertEqual(self._pagina(cursor="???").items[0].nombre, "Prod 00")
+        # Bien codificado pero con valores de otro tipo
+        for valores in (["a", "xx"], ["a", None], ["a", [1]], ["a", "1.5"]):
+            cursor = codificar_cursor(valores)
+            self.assertEqual(self._pagina(cursor=cursor, dir="ant").items[0].nombre, "Prod 00")
+        user = Usuario.objects.create_user(username="caja", password="x")
+        self.client.force_login(user)
+        resp = self.client.get(reverse("bodega:productos"), {"cursor": codificar_cursor(["a", "xx"])})
+        self.assertEqual(resp.status_code, 200)
+        resp = self.client.get(reverse("bodega:ventas_historial"), {"cursor": codificar_cursor(["ayer", 1])})
+        self.assertEqual(resp.status_code, 200)
+
+    def test_historial_sin_count_ni_offset(self):
+        user = Usuario.objects.create_user(username="caja", password="x")
+        self.client.force_login(user)
+        with CaptureQueriesContext(connection) as ctx:
+            self.client.get(reverse("bodega:ventas_historial"))
+        sql = " ".join(q["sql"] for q in ctx.captured_queries).upper()
+        self.assertNotIn("COUNT(", sql)
+        self.assertNotIn("OFFSET", sql)
+
+
+class BuscarProductosTests(TestCase):
+    def setUp(self):
+        self.user = Usuario.objects.create_user(username="caja", password="x")
+        self.client.force_login(self.user)
+        Producto.objects.bulk_create([
+            Producto(nombre=n, precio_compra=1, precio_venta=2)
+            for n in ("Arroz", "Azúcar", "Yerba Mate", "Mate cocido", "Galletitas")
+        ])
+
+    def _buscar(self, q):
+        resp = self.client.get(reverse("bodega:productos_buscar"), {"q": q})
+        self.assertEqual(resp.status_code, 200)
+        return [r["nombre"] for r in resp.json()["resultados"]]
+
+    def test_prefijo_primero_y_luego_subcadena(self):
+        self.assertEqual(self._buscar("mate"), ["Mate cocido", "Yerba Mate"])
+        self.assertEqual(self._buscar("A"), ["Arroz", "Azúcar", "Galletitas", "Mate cocido", "Yerba Mate"])
+        self.assertEqual(self._buscar(""), [])
+
+    def test_resultados_limitados(self):
+        Producto.objects.bulk_create([
+            Producto(nombre=f"Aceite {i}", precio_compra=1, precio_venta=2) for i in range(30)
+        ])
+        self.assertEqual(len(self._buscar("aceite")), 20)
+
+
+class ExportarTests(TestCase):
+    def setUp(self):
+        self.user = Usuario.objects.create_user(username="caja", password="x")
+        self.client.force_login(self.user)
+        producto = Producto.objects.create(nombre="Yerba", precio_compra=80, precio_venta=120, stock=10)
+        venta = Venta.objects.create(total=240, tipo="minorista")
+        DetalleVenta.objects.create(venta=venta, producto=producto, cantidad=2, precio_unitario=120, costo_unitario=80)
+
+    def test_exporta_detalles_en_streaming(self):
+        resp = self.client.get(reverse("bodega:exportar_csv", args=["detalles"]))
+        self.assertTrue(resp.streaming)
+        lineas = b"".join(resp.streaming_content).decode().splitlines()
+        self.assertEqual(lineas[0], "venta_id,fecha,producto,cantidad,precio_unitario,subtotal,costo_unitario")
+        self.assertEqual(len(lineas), 2)
+        self.assertTrue(lineas[1].endswith(",Yerba,2,120,240,80"))
+
+    def test_comando_exportar(self):
+        out = StringIO()
+        call_command("exportar_csv", "ventas", stdout=out)
+        self.assertEqual(len(out.getvalue().splitlines()), 2)
+
+
+class ImportarProductosTests(TestCase):
+    def test_upsert_por_nombre(self):
+        Producto.objects.create(nombre="Yerba", precio_compra=80, precio_venta=120, stock=7, stock_minimo=2)
+        csv_texto = (
+            "nombre,precio_compra,precio_venta,stock,stock_minimo,proveedor\n"
+            "Yerba,90,130,,,Distribuidora Sur\n"
+            "Arroz,50,70,20,4,Distribuidora Sur\n"
+            "Azúcar,abc,70,1,1,\n"
+        )
+        r = importar_productos(StringIO(csv_texto))
+
+        self.assertEqual((r.insertados, r.actualizados, r.rechazados), (1, 1, 1))
+        self.assertIn("Línea 4", r.errores[0])
+        yerba = Producto.objects.get(nombre="Yerba")
+        self.assertEqual((yerba.precio_venta, yerba.stock, yerba.stock_minimo), (130, 7, 2))
+        self.assertEqual(yerba.proveedor.nombre, "Distribuidora Sur")
+        self.assertEqual(Proveedor.objects.count(), 1)
+        self.assertEqual(Producto.objects.get(nombre="Arroz").stock, 20)
+
+    def test_sin_proveedor_conserva_el_del_producto(self):
+        sur = Proveedor.objects.create(nombre="Distribuidora Sur")
+        Producto.objects.create(nombre="Yerba", precio_compra=80, precio_venta=120, proveedor=sur)
+        Producto.objects.create(nombre="Arroz", precio_compra=40, precio_venta=60, proveedor=sur)
+        # Lista de precios sin la columna, y otra con la celda vacía
+        importar_productos(StringIO("nombre,precio_compra,precio_venta\nYerba,11,22\n"))
+        importar_productos(StringIO("nombre,precio_compra,precio_venta,proveedor\nArroz,12,24,\n"))
+        self.assertEqual(
+            list(Producto.objects.order_by("nombre").values_list("nombre", "precio_venta", "proveedor_id")),
+            [("Arroz", 24, sur.id), ("Yerba", 22, sur.id)],
+        )
+
+    def test_consultas_por_lote_acotadas(self):
+        filas = "".join(f"Prod {i},10,20,1,1,Prov {i % 3}\n" for i in range(300))
+        archivo = StringIO("nombre,precio_compra,precio_venta,stock,stock_minimo,proveedor\n" + filas)
+        with CaptureQueriesContext(connection) as ctx:
+            r = importar_productos(archivo, lote=100)
+        self.assertEqual(r.insertados, 300)
+        # 3 lotes x (proveedores, existentes, upsert, ids, movimientos y transacción),
+        # más el alta inicial de proveedores
+        self.assertLessEqual(len(ctx.captured_queries), 3 * 8 + 2)
+
+
+class CarritoTests(TestCase):
+    def setUp(self):
+        self.user = Usuario.objects.create_user(username="caja", password="x")
+        self.client.force_login(self.user)
+        self.yerba = Producto.objects.create(nombre="Yerba", precio_compra=80, precio_venta=120, stock=50)
+        self.arroz = Producto.objects.create(nombre="Arroz", precio_compra=40, precio_venta=60, stock=50)
+
+    def _agregar(self, producto, cantidad):
+        return self.client.post(reverse("bodega:ventas"), {
+            "accion": "agregar", "producto_id": producto.id, "cantidad": cantidad,
+        })
+
+    def _operar_carrito(self):
+        self._agregar(self.yerba, 2)
+        self._agregar(self.arroz, 1)
+        self._agregar(self.yerba, 3)
+        self.client.post(reverse("bodega:ventas_modificar_item", args=[self.arroz.id]), {"cantidad": "4"})
+        carrito = leer_carrito(self.client)
+        self.assertEqual([(i["producto"], i["cantidad"]) for i in carrito.items()], [("Yerba", 5), ("Arroz", 4)])
+        self.assertEqual(carrito.total, 5 * 120 + 4 * 60)
+
+        self.client.get(reverse("bodega:ventas_eliminar_item", args=[self.yerba.id]))
+        self.assertEqual(len(leer_carrito(self.client)), 1)
+
+    def test_carrito_en_cache_no_escribe_la_sesion(self):
+        with CaptureQueriesContext(connection) as ctx:
+            self._operar_carrito()
+        self.assertFalse(any("django_session" in q["sql"] and "UPDATE" in q["sql"] for q in ctx.captured_queries))
+
+    def test_backend_de_sesion(self):
+        with self.settings(CARRITO_BACKEND="bodega_app.carrito.SesionCarrito"):
+            self._operar_carrito()
+            self.assertIn("carrito", self.client.session)
+
+
+class ApiVentasTests(TestCase):
+    def setUp(self):
+        self.user = Usuario.objects.create_user(username="caja", password="x")
+        self.client.force_login(self.user)
+        self.yerba = Producto.objects.create(nombre="Yerba", codigo="7790001", precio_compra=80, precio_venta=120, stock=10)
+        self.arroz = Producto.objects.create(nombre="Arroz", precio_compra=40, precio_venta=60, stock=10)
+
+    def _post(self, datos, clave=None):
+        headers = {"Idempotency-Key": clave} if clave else {}
+        return self.client.post(
+            reverse("bodega:api_ventas"), data=json.dumps(datos), content_type="application/json", headers=headers,
+        )
+
+    def test_crea_venta_completa(self):
+        resp = self._post({"tipo": "mayorista", "items": [
+            {"codigo": "7790001", "cantidad": 3},
+            {"producto_id": self.arroz.id, "cantidad": 2},
+        ]})
+        self.assertEqual(resp.status_code, 201)
+        data = resp.json()
+        self.assertEqual((data["tipo"], data["total"]), ("mayorista", 3 * 120 + 2 * 60))
+        self.assertEqual([d["producto"] for d in data["detalles"]], ["Yerba", "Arroz"])
+        self.yerba.refresh_from_db()
+        self.assertEqual(self.yerba.stock, 7)
+
+    def test_reintento_con_misma_clave_no_vende_dos_veces(self):
+        datos = {"items": [{"producto_id": self.yerba.id, "cantidad": 4}]}
+        primera = self._post(datos, clave="term1-0001")
+        segunda = self._post(datos, clave="term1-0001")
+        self.assertEqual((primera.status_code, segunda.status_code), (201, 200))
+        self.assertEqual(primera.json()["id"], segunda.json()["id"])
+        self.assertEqual(Venta.objects.count(), 1)
+        self.yerba.refresh_from_db()
+        self.assertEqual(self.yerba.stock, 6)
+
+    def test_stock_insuficiente_y_errores(self):
+        self.assertEqual(self._post({"items": [{"producto_id": self.yerba.id, "cantidad": 11}]}).status_code, 409)
+        self.assertEqual(self._post({"items": [{"codigo": "nope"}]}).status_code, 409)
+        self.assertEqual(self._post({"tipo": "otro", "items": []}).status_code, 400)
+        self.assertFalse(Venta.objects.exists())
+
+    def test_datos_mal_formados_son_400(self):
+        item = {"producto_id": self.yerba.id, "cantidad": 1}
+        for datos in (
+            {"items": [{"producto_id": self.yerba.id, "cantidad": 0}]},
+            {"items": [{"cantidad": 1}]},
+            {"items": ["yerba"]},
+            {"items": []},
+            {"clave_cliente": 123, "items": [item]},
+            {"tipo": [], "items": [item]},
+        ):
+            with self.subTest(datos=datos):
+                self.assertEqual(self._post(datos).status_code, 400)
+        self.assertFalse(Venta.objects.exists())
+
+    def test_requiere_login(self):
+        self.client.logout()
+        self.assertEqual(self._post({"items": []}).status_code, 401)
+
+
+@override_settings(CACHES=CACHES_MEMORIA)
+class DashboardCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = Usuario.objects.create_user(username="caja", password="x")
+        self.client.force_login(self.user)
+        self.producto = Producto.objects.create(nombre="Yerba", precio_compra=80, precio_venta=120, stock=10)
+
+    def _contadores(self):
+        resp = self.client.get(reverse("bodega:dashboard"))
+        return resp.context["total_productos"], resp.context["stock_bajo"], resp.context["total_ventas_dia"]
+
+    def test_cero_consultas_con_cache_caliente(self):
+        self._contadores()
+        with CaptureQueriesContext(connection) as ctx:
+            self._contadores()
+        tablas = " ".join(q["sql"] for q in ctx.captured_queries)
+        self.assertNotIn("bodega_app_producto", tablas)
+        self.assertNotIn("bodega_app_resumendiario", tablas)
+
+    def test_se_invalida_con_ventas_y_compras(self):
+        self.assertEqual(self._contadores(), (1, 0, 0))
+        with self.captureOnCommitCallbacks(execute=True):
+            cargar_carrito(self.client, [self.producto], 6)
+            self.client.get(reverse("bodega:confirmar_venta"))
+            consolidar_pendientes()
+        self.assertEqual(self._contadores(), (1, 1, 720))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse("bodega:compras"), {"nombre": "Arroz", "precio_compra": "40", "cantidad": "20"})
+        self.assertEqual(self._contadores(), (2, 1, 720))
+
+
+class StockBajoTests(TestCase):
+    def setUp(self):
+        self.user = Usuario.objects.create_user(username="caja", password="x")
+        self.client.force_login(self.user)
+        sur = Proveedor.objects.create(nombre="Sur")
+        Producto.objects.bulk_create([
+            Producto(nombre="Yerba", precio_compra=1, precio_venta=2, stock=1, stock_minimo=5, proveedor=sur),
+            Producto(nombre="Arroz", precio_compra=1, precio_venta=2, stock=0, stock_minimo=10, proveedor=sur),
+            Producto(nombre="Sal", precio_compra=1, precio_venta=2, stock=3, stock_minimo=3),
+            Producto(nombre="Azúcar", precio_compra=1, precio_venta=2, stock=50, stock_minimo=5, proveedor=sur),
+        ])
+
+    def _lista(self):
+        data = self.client.get(reverse("bodega:api_stock_bajo")).json()
+        return [(g["proveedor"], [p["nombre"] for p in g["productos"]]) for g in data["proveedores"]]
+
+    def test_agrupa_por_proveedor_y_ordena_por_faltante(self):
+        self.assertEqual(self._lista(), [("Sur", ["Arroz", "Yerba"]), (None, ["Sal"])])
+
+    def test_sigue_las_compras(self):
+        yerba = Producto.objects.get(nombre="Yerba")
+        self.client.post(reverse("bodega:compras"), {"producto_id": yerba.id, "precio_compra": "1", "cantidad": "10"})
+        self.assertEqual(self._lista(), [("Sur", ["Arroz"]), (None, ["Sal"])])
+
+
+@override_settings(CACHES=CACHES_MEMORIA)
+class PresupuestoConsultasTests(TestCase):
+    """Corre el benchmark con datos chicos y exige los presupuestos de consultas (no los de tiempo)."""
+
+    def test_vistas_dentro_del_presupuesto(self):
+        from . import benchmark
+
+        benchmark.sembrar(*benchmark.TAMANOS["chico"])
+        usuario = Usuario.objects.create_user(username="bench", password="x")
+        # Con los on_commit ejecutados, como en el comando: lo que cuesta después del COMMIT también cuenta
+        resultados = benchmark.medir(
+            usuario, repeticiones=2, envolver=lambda: self.captureOnCommitCallbacks(execute=True),
+        )
+        presupuestos = {
+            vista: {"consultas": p["consultas"]} for vista, p in benchmark.cargar_presupuestos().items()
+        }
+        self.assertEqual(benchmark.excesos("chico", resultados, presupuestos), [])
+
+    def test_comando_no_toca_el_cache_configurado(self):
+        from django.test.runner import DiscoverRunner
+        from . import benchmark
+
+        cache.clear()
+        cache.set("carrito-real", "x")
+
+        def medir(usuario, repeticiones):
+            cache.set("contador-sembrado", 1)
+            return {}
+
+        comando = "bodega_app.management.commands.benchmark"
+        with mock.patch.object(DiscoverRunner, "setup_databases"), \
+                mock.patch.object(DiscoverRunner, "teardown_databases"), \
+                mock.patch(f"{comando}.setup_test_environment"), \
+                mock.patch(f"{comando}.teardown_test_environment"), \
+                mock.patch.object(benchmark, "sembrar"), mock.patch.object(benchmark, "medir", medir):
+            call_command("benchmark", "--tamanos", "chico", stdout=StringIO(), stderr=StringIO())
+        self.assertEqual(cache.get("carrito-real"), "x")
+        self.assertIsNone(cache.get("contador-sembrado"))
+
+
+class MetricasTests(TestCase):
+    def setUp(self):
+        self.admin = Usuario.objects.create_user(username="jefe", password="x", rol="admin")
+        self.client.force_login(self.admin)
+        Producto.objects.create(nombre="Yerba", precio_compra=80, precio_venta=120)
+
+    def test_server_timing_y_metricas(self):
+        resp = self.client.get(reverse("bodega:productos"))
+        self.assertRegex(resp["Server-Timing"], r'app;dur=[\d.]+, sql;dur=[\d.]+;desc="\d+ consultas", tpl;dur=[\d.]+')
+
+        texto = self.client.get(reverse("bodega:metricas")).content.decode()
+        self.assertIn('bodega_request_duration_seconds_count{vista="bodega:productos"}', texto)
+        self.assertIn('bodega_sql_queries_bucket{vista="bodega:productos",le="+Inf"}', texto)
+
+    def test_metricas_solo_admin_o_token(self):
+        empleado = Usuario.objects.create_user(username="caja", password="x")
+        self.client.force_login(empleado)
+        self.assertEqual(self.client.get(reverse("bodega:metricas")).status_code, 403)
+        with self.settings(METRICAS_TOKEN="secreto"):
+            self.client.logout()
+            resp = self.client.get(reverse("bodega:metricas"), headers={"Authorization": "Bearer secreto"})
+            self.assertEqual(resp.status_code, 200)
+
+
+class MovimientosStockTests(TestCase):
+    def setUp(self):
+        self.user = Usuario.objects.create_user(username="caja", password="x")
+        self.client.force_login(self.user)
+        self.client.post(reverse("bodega:compras"), {"nombre": "Yerba", "precio_compra": "80", "cantidad": "10"})
+        self.yerba = Producto.objects.get(nombre="Yerba")
+
+    def _movimientos(self):
+        return list(self.yerba.movimientos.order_by("id").values_list("tipo", "cantidad"))
+
+    def test_cada_cambio_de_stock_queda_en_el_libro(self):
+        cargar_carrito(self.client, [self.yerba], 3)
+        self.client.get(reverse("bodega:confirmar_venta"))
+        compra = Compra.objects.get()
+        self.client.post(reverse("bodega:compras_editar", args=[compra.id]), {"cantidad": "12", "precio_total": "960"})
+        self.assertEqual(self._movimientos(), [("compra", 10), ("venta", -3), ("compra_edicion", 2)])
+        self.yerba.refresh_from_db()
+        self.assertEqual(self.yerba.stock, sum(c for _, c in self._movimientos()))
+
+    def test_stock_en_un_momento_con_snapshot(self):
+        antes = timezone.now()
+        cargar_carrito(self.client, [self.yerba], 4)
+        self.client.get(reverse("bodega:confirmar_venta"))
+        self.assertEqual(stock_en(self.yerba.id, antes), 10)
+        self.assertEqual(stock_en(self.yerba.id, timezone.now()), 6)
+
+        self.assertEqual(tomar_snapshots(timezone.now()), 1)
+        self.assertEqual(SnapshotStock.objects.get().stock, 6)
+        # Sin movimientos nuevos no hace falta otro snapshot
+        self.assertEqual(tomar_snapshots(timezone.now()), 0)
+        with CaptureQueriesContext(connection) as ctx:
+            self.assertEqual(stock_en(self.yerba.id, timezone.now()), 6)
+        self.assertEqual(len(ctx.captured_queries), 2)
+
+    def test_api_stock_historico(self):
+        url = reverse("bodega:api_stock_historico", args=[self.yerba.id])
+        hoy = timezone.localdate()
+        self.assertEqual(self.client.get(url, {"fecha": hoy.isoformat()}).json()["stock"], 10)
+        ayer = hoy - timedelta(days=1)
+        self.assertEqual(self.client.get(url, {"fecha": ayer.isoformat()}).json()["stock"], 0)
+        self.assertEqual(self.client.get(url).status_code, 400)
+
+    def test_editar_registra_ajuste_y_el_admin_no_toca_el_stock(self):
+        with CaptureQueriesContext(connection) as ctx:
+            self.client.get(reverse("bodega:editar_productos", args=[self.yerba.id]))
+        self.assertFalse(any("FOR UPDATE" in q["sql"].upper() for q in ctx.captured_queries))
+        self.client.post(reverse("bodega:editar_productos", args=[self.yerba.id]), {
+            "nombre": "Yerba", "precio_compra": "80", "precio_venta": "120", "stock": "7",
+        })
+        self.assertEqual(self._movimientos(), [("compra", 10), ("ajuste", -3)])
+
+        from django.contrib import admin
+        self.assertIn("stock", admin.site._registry[Producto].get_readonly_fields(None))
+
+
+@override_settings(CACHES=CACHES_MEMORIA)
+class TendenciasTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.hoy = timezone.localdate()
+        ResumenDiario.objects.bulk_create([
+            ResumenDiario(fecha=self.hoy - timedelta(days=40 + i), cantidad_ventas=1, total_ventas=100,
+                          cantidad_mayorista=1 if i % 2 else 0, total_mayorista=100 if i % 2 else 0)
+            for i in range(300)
+        ])
+        self.yerba = Producto.objects.create(nombre="Yerba", precio_compra=80, precio_venta=120, stock=10)
+        crear_venta([{"producto_id": self.yerba.id, "cantidad": 2}], tipo="mayorista")
+        consolidar_pendientes()
+
+    def test_meses_cerrados_salen_del_cache(self):
+        filas = serie("mes")
+        self.assertEqual(len(filas), 24)
+        self.assertEqual(sum(f["ventas"] for f in filas if f["cerrado"]), 300 * 100)
+        self.assertEqual((filas[-1]["ventas"], filas[-1]["mayorista"], filas[-1]["minorista"]), (240, 240, 0))
+        with CaptureQueriesContext(connection) as ctx:
+            self.assertEqual(serie("mes"), filas)
+        self.assertEqual(len(ctx.captured_queries), 1)
+
+    def test_cambio_en_dia_cerrado_invalida(self):
+        antes = sum(f["compras"] for f in serie("semana"))
+        with self.captureOnCommitCallbacks(execute=True):
+            sumar_dia(self.hoy - timedelta(days=45), total_compras=500)
+        self.assertEqual(sum(f["compras"] for f in serie("semana")), antes + 500)
+
+    def test_vista_por_producto(self):
+        user = Usuario.objects.create_user(username="caja", password="x")
+        self.client.force_login(user)
+        resp = self.client.get(reverse("bodega:reportes_tendencias"), {"por": "dia", "producto_id": self.yerba.id})
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(resp.context["filas"][-1]["cantidad"], 2)
+        self.assertEqual(resp.context["total_ventas"], 240)
+
+
+class MargenesTests(TestCase):
+    def setUp(self):
+        self.user = Usuario.objects.create_user(username="caja", password="x")
+        self.client.force_login(self.user)
+        sur = Proveedor.objects.create(nombre="Sur")
+        self.yerba = Producto.objects.create(nombre="Yerba", precio_compra=80, precio_venta=120, stock=20, proveedor=sur)
+        self.arroz = Producto.objects.create(nombre="Arroz", precio_compra=40, precio_venta=50, stock=20)
+
+    def test_costo_del_momento_de_la_venta(self):
+        crear_venta([{"producto_id": self.yerba.id, "cantidad": 2}])
+        # Una compra más cara después no cambia el costo de lo ya vendido
+        self.client.post(reverse("bodega:compras"), {"producto_id": self.yerba.id, "precio_compra": "100", "cantidad": "5"})
+        crear_venta([{"producto_id": self.yerba.id, "cantidad": 1}])
+        consolidar_pendientes()
+        self.assertEqual(
+            sorted(DetalleVenta.objects.values_list("costo_unitario", flat=True)), [80, 100],
+        )
+        resumen = ResumenProductoDiario.objects.get(producto=self.yerba)
+        self.assertEqual((resumen.total_vendido, resumen.costo_vendido), (360, 260))
+
+    def test_reporte_por_producto_y_proveedor_sin_detalles(self):
+        crear_venta([{"producto_id": self.yerba.id, "cantidad": 2}, {"producto_id": self.arroz.id, "cantidad": 3}])
+        consolidar_pendientes()
+        url = reverse("bodega:reportes_margenes")
+        with CaptureQueriesContext(connection) as ctx:
+            resp = self.client.get(url)
+        self.assertNotIn("bodega_app_detalleventa", " ".join(q["sql"] for q in ctx.captured_queries))
+        self.assertEqual(
+            [(f["nombre"], f["margen"]) for f in resp.context["filas"]], [("Yerba", 80), ("Arroz", 30)],
+        )
+        resp = self.client.get(url, {"agrupar": "proveedor"})
+        self.assertEqual([(f["nombre"], f["margen"]) for f in resp.context["filas"]], [("Sur", 80), (None, 30)])
+        self.assertEqual(resp.context["total_margen"], 110)
+
+    def test_reconstruir_resumenes_incluye_costo(self):
+        crear_venta([{"producto_id": self.arroz.id, "cantidad": 3}])
+        call_command("reconstruir_resumenes", stdout=StringIO())
+        self.assertEqual(ResumenProductoDiario.objects.get(producto=self.arroz).costo_vendido, 120)
+
+
+class ReposicionTests(TestCase):
+    def setUp(self):
+        hoy = timezone.localdate()
+        sur = Proveedor.objects.create(nombre="Sur")
+        self.yerba = Producto.objects.create(nombre="Yerba", precio_compra=1, precio_venta=2, stock=10,
+                                             stock_minimo=5, proveedor=sur)
+        self.sal = Producto.objects.create(nombre="Sal", precio_compra=1, precio_venta=2, stock=100, stock_minimo=30)
+        self.quieto = Producto.objects.create(nombre="Clavo", precio_compra=1, precio_venta=2, stock=0, stock_minimo=3)
+        # Yerba: 4 por día; Sal: 1 por día; hoy no cuenta (el día no terminó)
+        ResumenProductoDiario.objects.bulk_create(
+            [ResumenProductoDiario(fecha=hoy - timedelta(days=d), producto=self.yerba, cantidad_vendida=4)
+             for d in range(0, 29)]
+            + [ResumenProductoDiario(fecha=hoy - timedelta(days=d), producto=self.sal, cantidad_vendida=1)
+               for d in range(1, 29)]
+        )
+
+    def test_demanda_cobertura_y_pedido(self):
+        with CaptureQueriesContext(connection) as ctx:
+            filas = {p.nombre: p for p in sugerencias_reposicion(dias=28, plazo=7, cobertura=14)}
+        self.assertEqual(len(ctx.captured_queries), 1)
+        yerba, sal, clavo = filas["Yerba"], filas["Sal"], filas["Clavo"]
+        self.assertEqual((yerba.demanda, yerba.dias_cobertura), (4, 2.5))
+        self.assertEqual((yerba.minimo_sugerido, yerba.cantidad_sugerida), (28, 4 * 21 - 10))
+        self.assertEqual((sal.minimo_sugerido, sal.cantidad_sugerida), (7, 0))
+        self.assertIsNone(clavo.dias_cobertura)
+        self.assertEqual(clavo.cantidad_sugerida, 0)
+
+    def test_guardar_stock_minimo_solo_con_ventas(self):
+        out = StringIO()
+        call_command("sugerir_reposicion", "--guardar", stdout=out)
+        self.assertIn("Sur: 1 productos, 74 unidades", out.getvalue())
+        self.assertEqual(
+            dict(Producto.objects.values_list("nombre", "stock_minimo")), {"Yerba": 28, "Sal": 7, "Clavo": 3},
+        )
+
+    def test_vista_agrupa_por_proveedor(self):
+        user = Usuario.objects.create_user(username="caja", password="x")
+        self.client.force_login(user)
+        resp = self.client.get(reverse("bodega:productos_reposicion"))
+        self.assertEqual([[p.nombre for p in g["productos"]] for g in resp.context["grupos"]], [["Yerba"]])
+        self.client.post(reverse("bodega:productos_reposicion"))
+        self.yerba.refresh_from_db()
+        self.assertEqual(self.yerba.stock_minimo, 5)
+
+
+class VentaOptimistaTests(TestCase):
+    def setUp(self):
+        self.yerba = Producto.objects.create(nombre="Yerba", precio_compra=80, precio_venta=120, stock=10)
+        self.arroz = Producto.objects.create(nombre="Arroz", precio_compra=40, precio_venta=60, stock=3)
+        self.lineas = [{"producto_id": self.yerba.id, "cantidad": 2}, {"producto_id": self.arroz.id, "cantidad": 3}]
+
+    def test_update_condicional(self):
+        self.assertFalse(vender.descontar_stock_condicional({self.yerba.id: 2, self.arroz.id: 4}))
+        self.assertTrue(vender.descontar_stock_condicional({self.arroz.id: 3}))
+        self.arroz.refresh_from_db()
+        self.assertEqual(self.arroz.stock, 0)
+
+    def test_carrera_perdida_deshace_todo(self):
+        # Otra caja vendió entre la lectura y el UPDATE
+        with mock.patch.object(vender, "descontar_stock_condicional", return_value=False):
+            with self.assertRaises(VentaError):
+                crear_venta(self.lineas)
+        self.assertFalse(Venta.objects.exists())
+        self.assertFalse(MovimientoStock.objects.exists())
+        self.assertFalse(ResumenDiario.objects.exists())
+
+    def test_reintenta_deadlock(self):
+        class Deadlock(Exception):
+            pgcode = "40P01"
+
+        error = OperationalError("deadlock detected")
+        error.__cause__ = Deadlock()
+        registrar = vender._registrar
+        intentos = []
+
+        def falla_una_vez(*args, **kwargs):
+            intentos.append(1)
+            if len(intentos) == 1:
+                raise error
+            return registrar(*args, **kwargs)
+
+        with mock.patch.object(vender, "_registrar", side_effect=falla_una_vez), \
+                mock.patch.object(vender.time, "sleep"):
+            crear_venta(self.lineas)
+        self.assertEqual(len(intentos), 2)
+        self.assertEqual(Venta.objects.count(), 1)
+        self.yerba.refresh_from_db()
+        self.assertEqual(self.yerba.stock, 8)
+
+    def test_modo_bloqueo(self):
+        with self.settings(VENTA_MODO="bloqueo"):
+            crear_venta(self.lineas)
+        self.arroz.refresh_from_db()
+        self.assertEqual(self.arroz.stock, 0)
+
+
+@skipUnless(connection.vendor == "postgresql", "La concurrencia real necesita PostgreSQL.")
+class VentasConcurrentesTests(TransactionTestCase):
+    def test_sin_sobreventa_en_ambos_modos(self):
+        from . import benchmark
+
+        por_segundo = {}
+        for modo in vender.MODOS:
+            with self.subTest(modo=modo):
+                r = benchmark.medir_checkouts(modo, cajas=8, ventas_por_caja=10)
+                self.assertEqual((r["vendidas"], r["rechazadas"], r["stock_final"]), (40, 40, 0))
+                por_segundo[modo] = r["por_segundo"]
+        # Con el mismo carrito en todas las cajas, el modo con bloqueo las pone en fila durante
+        # toda la venta; el optimista, solo en el UPDATE final
+        self.assertGreater(por_segundo["optimista"], por_segundo["bloqueo"])
+
+
+class ReplicaRouterTests(TestCase):
+    def setUp(self):
+        self.router = ReplicaRouter()
+        self.user = Usuario.objects.create_user(username="caja", password="x")
+        self.client.force_login(self.user)
+
+    def test_sin_replica_configurada_todo_va_al_primario(self):
+        with en_replica():
+            self.assertIsNone(self.router.db_for_read(Venta))
+
+    def test_lecturas_marcadas_van_a_la_replica(self):
+        with mock.patch("bodega_app.routers.hay_replica", return_value=True), \
+                mock.patch.object(connection, "in_atomic_block", False):
+            self.assertIsNone(self.router.db_for_read(Venta))
+            with en_replica():
+                self.assertEqual(self.router.db_for_read(Venta), "replica")
+                self.assertIsNone(self.router.db_for_write(Venta))
+                # El caché en la base no: tiene que ver las invalidaciones recién hechas
+                self.assertIsNone(self.router.db_for_read(DatabaseCache("bodega_cache", {}).cache_model_class))
+        self.assertFalse(self.router.allow_migrate("replica", "bodega_app"))
+
+    def test_dentro_de_una_transaccion_lee_del_primario(self):
+        # TestCase corre todo dentro de una transacción en "default"
+        with mock.patch("bodega_app.routers.hay_replica", return_value=True), en_replica():
+            self.assertIsNone(self.router.db_for_read(Venta))
+
+    def test_exportacion_en_streaming_consulta_en_replica(self):
+        marcas = []
+        original = ReplicaRouter.db_for_read
+
+        def espiar(router, model, **hints):
+            marcas.append(routers._en_replica.get())
+            return original(router, model, **hints)
+
+        with mock.patch.object(ReplicaRouter, "db_for_read", espiar):
+            resp = self.client.get(reverse("bodega:exportar_csv", args=["ventas"]))
+            b"".join(resp.streaming_content)
+            self.client.get(reverse("bodega:dashboard"))
+        self.assertIn(True, marcas)
+        self.assertEqual(marcas[-1], False)
+
+
+class IngestaVentasTests(TestCase):
+    def setUp(self):
+        self.user = Usuario.objects.create_user(username="caja", password="x")
+        self.client.force_login(self.user)
+        self.yerba = Producto.objects.create(nombre="Yerba", codigo="7790001", precio_compra=80, precio_venta=120, stock=10)
+        self.arroz = Producto.objects.create(nombre="Arroz", precio_compra=40, precio_venta=60, stock=3)
+
+    def _venta(self, items, **extra):
+        return {"uuid": str(uuid.uuid4()), "items": items, **extra}
+
+    def _post(self, ventas):
+        return self.client.post(
+            reverse("bodega:api_ventas_lote"), data=json.dumps({"ventas": ventas}), content_type="application/json",
+        )
+
+    def test_lote_idempotente_con_rechazos(self):
+        ayer = timezone.localtime() - timedelta(days=1)
+        ventas = [
+            self._venta([{"codigo": "7790001", "cantidad": 2}], fecha=ayer.isoformat(), tipo="mayorista"),
+            self._venta([{"producto_id": self.arroz.id, "cantidad": 2, "precio": 50}]),
+            self._venta([{"producto_id": self.arroz.id, "cantidad": 2}]),  # ya no alcanza
+            self._venta([{"codigo": "nope"}]),
+            {"uuid": "no-es-uuid", "items": []},
+        ]
+        ventas.append(dict(ventas[1]))  # repetida dentro del lote
+        data = self._post(ventas).json()
+        self.assertEqual(data["registradas"], [ventas[0]["uuid"], ventas[1]["uuid"]])
+        self.assertEqual(data["repetidas"], [ventas[1]["uuid"]])
+        self.assertEqual(
+            [r["uuid"] for r in data["rechazadas"]], ["no-es-uuid", ventas[2]["uuid"], ventas[3]["uuid"]],
+        )
+
+        self.yerba.refresh_from_db()
+        self.arroz.refresh_from_db()
+        self.assertEqual((self.yerba.stock, self.arroz.stock), (8, 1))
+        venta = Venta.objects.get(clave_cliente=ventas[0]["uuid"])
+        self.assertEqual((venta.fecha, venta.total), (ayer, 240))
+        self.assertEqual(ResumenDiario.objects.get(fecha=ayer.date()).total_mayorista, 240)
+        self.assertEqual(ResumenDiario.objects.get(fecha=timezone.localdate()).total_ventas, 100)
+        self.assertEqual(MovimientoStock.objects.filter(tipo="venta").count(), 2)
+
+        # Reenviar el lote no vuelve a vender
+        data = self._post(ventas[:2]).json()
+        self.assertEqual((data["registradas"], len(data["repetidas"])), ([], 2))
+        self.assertEqual(Venta.objects.count(), 2)
+
+    def test_consultas_no_dependen_del_tamano(self):
+        Producto.objects.filter(pk=self.yerba.pk).update(stock=1000)
+
+        def consultas(n):
+            with CaptureQueriesContext(connection) as ctx:
+                r = ingerir_ventas([self._venta([{"producto_id": self.yerba.id, "cantidad": 1}]) for _ in range(n)])
+            self.assertEqual(len(r.registradas), n)
+            return len(ctx.captured_queries)
+
+        self.assertEqual(consultas(3), consultas(60))
+
+    def test_campos_de_tipo_inesperado_rechazan_solo_esa_venta(self):
+        ok = self._venta([{"producto_id": self.yerba.id, "cantidad": 1}])
+        malas = [
+            self._venta([{"producto_id": self.yerba.id}], tipo=[]),
+            self._venta([{"producto_id": self.yerba.id}], tipo={"a": 1}),
+            self._venta([{"codigo": ["x"]}]),
+            self._venta([{"producto_id": self.yerba.id}], fecha=[2024]),
+            {"uuid": [], "items": []},
+        ]
+        r = ingerir_ventas([ok, *malas])
+        self.assertEqual(r.registradas, [ok["uuid"]])
+        self.assertEqual(len(r.rechazadas), len(malas))
+
+    def test_comando(self):
+        out, err = StringIO(), StringIO()
+        with tempfile.NamedTemporaryFile("w", suffix=".jsonl", encoding="utf-8") as f:
+            f.write(json.dumps(self._venta([{"producto_id": self.yerba.id, "cantidad": 1}])) + "\n{roto\n")
+            f.flush()
+            call_command("ingerir_ventas", f.name, stdout=out, stderr=err)
+        self.assertIn("Registradas: 1 · Repetidas: 0 · Rechazadas: 1", out.getvalue())
+        self.assertIn("Línea 2", err.getvalue())
+
+
+@override_settings(CACHES=CACHES_MEMORIA)
+class VersionesCatalogoTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = Usuario.objects.create_user(username="caja", password="x")
+        self.client.force_login(self.user)
+        self.yerba = Producto.objects.create(nombre="Yerba", precio_compra=80, precio_venta=120, stock=10)
+
+    def _consultas_catalogo(self, **headers):
+        with CaptureQueriesContext(connection) as ctx:
+            resp = self.client.get(reverse("bodega:productos"), headers=headers)
+        tablas = ("bodega_app_producto", "bodega_app_proveedor")
+        return resp, [q["sql"] for q in ctx.captured_queries if any(t in q["sql"] for t in tablas)]
+
+    def test_304_sin_consultas_ni_plantilla(self):
+        resp, consultas = self._consultas_catalogo()
+        self.assertEqual(resp.status_code, 200)
+        self.assertTrue(consultas)
+        with mock.patch("bodega_app.views.render") as render:
+            resp, consultas = self._consultas_catalogo(if_none_match=resp["ETag"])
+        self.assertEqual((resp.status_code, consultas), (304, []))
+        render.assert_not_called()
+
+    def test_tabla_sale_del_fragmento(self):
+        self._consultas_catalogo()
+        resp, consultas = self._consultas_catalogo()
+        self.assertEqual(consultas, [])
+        self.assertContains(resp, "Yerba")
+
+    def test_escrituras_cambian_la_version(self):
+        etag = self.client.get(reverse("bodega:productos"))["ETag"]
+        with self.captureOnCommitCallbacks(execute=True):
+            crear_venta([{"producto_id": self.yerba.id, "cantidad": 3}])
+        resp = self.client.get(reverse("bodega:productos"), headers={"if-none-match": etag})
+        self.assertEqual(resp.status_code, 200)
+        self.assertContains(resp, "<td>7</td>")
+
+        antes = version(Proveedor)
+        with self.captureOnCommitCallbacks(execute=True):
+            Proveedor.objects.create(nombre="Sur")
+        self.assertNotEqual(version(Proveedor), antes)
+        self.assertContains(self.client.get(reverse("bodega:compras")), '<option value="{}">Sur</option>'.format(
+            Proveedor.objects.get().id))
+
+
+class OrdenesCompraTests(TestCase):
+    def setUp(self):
+        self.user = Usuario.objects.create_user(username="caja", password="x")
+        self.client.force_login(self.user)
+        self.sur = Proveedor.objects.create(nombre="Sur")
+        self.yerba = Producto.objects.create(nombre="Yerba", codigo="779001", precio_compra=80, precio_venta=120, stock=2)
+        self.arroz = Producto.objects.create(nombre="Arroz", precio_compra=40, precio_venta=70, stock=0)
+
+    def test_formulario_aplica_stock_y_crea_productos(self):
+        resp = self.client.post(reverse("bodega:ordenes_compra_nueva"), {
+            "proveedor_id": self.sur.id,
+            "producto": ["779001", "Arroz", "Fideos", ""],
+            "cantidad": ["10", "5", "3", ""],
+            "precio_compra": ["90", "45", "30", ""],
+        })
+        orden = OrdenCompra.objects.get()
+        self.assertRedirects(resp, reverse("bodega:ordenes_compra_detalle", args=[orden.id]))
+
+        self.yerba.refresh_from_db()
+        self.assertEqual((self.yerba.stock, self.yerba.precio_compra), (12, 90))
+        self.assertEqual(Producto.objects.get(nombre="Arroz").stock, 5)
+        fideos = Producto.objects.get(nombre="Fideos")
+        self.assertEqual((fideos.stock, fideos.precio_venta, fideos.proveedor), (3, 30, self.sur))
+        self.assertEqual(orden.lineas.count(), 3)
+        self.assertEqual(set(orden.lineas.values_list("proveedor", flat=True)), {self.sur.id})
+        self.assertEqual(ResumenDiario.objects.get(fecha=timezone.localdate()).total_compras, 900 + 225 + 90)
+        self.assertEqual(MovimientoStock.objects.filter(tipo="compra").count(), 3)
+        self.assertContains(self.client.get(resp.url), "Fideos")
+        self.assertContains(self.client.get(reverse("bodega:ordenes_compra"), {"producto": "fide"}), "<td>1215</td>")
+
+    def test_orden_con_errores_no_registra_nada(self):
+        resp = self.client.post(reverse("bodega:ordenes_compra_nueva"), {
+            "producto": ["Yerba", "Arroz"], "cantidad": ["10", "0"], "precio_compra": ["90", "45"],
+        })
+        self.assertContains(resp, "Línea 2")
+        self.assertFalse(OrdenCompra.objects.exists())
+        self.assertEqual(Producto.objects.get(pk=self.yerba.pk).stock, 2)
+        self.assertFalse(Compra.objects.exists())
+
+    def test_precio_de_compra_mayor_al_de_venta_solo_avisa(self):
+        resp = self.client.post(reverse("bodega:ordenes_compra_nueva"), {
+            "producto": ["Yerba", "Arroz"], "cantidad": ["1", "2"], "precio_compra": ["500", "40"],
+        }, follow=True)
+        self.assertContains(resp, "Precio de compra mayor al de venta: Yerba.")
+        self.assertEqual(Producto.objects.get(pk=self.yerba.pk).stock, 3)
+
+    def test_editar_una_linea_no_reescribe_las_demas(self):
+        orden = crear_orden(None, [("Yerba", 3, 80), ("Arroz", 5, 40)])
+        yerba_linea, arroz_linea = orden.lineas.order_by("id")
+        # Total que no es múltiplo de la cantidad, como puede dejarlo compras_editar
+        Compra.objects.filter(pk=yerba_linea.pk).update(precio_total=250)
+        url = reverse("bodega:ordenes_compra_detalle", args=[orden.id])
+        self.assertContains(self.client.get(url), 'value="83"')
+        self.client.post(url, {
+            f"cantidad_{yerba_linea.id}": "3", f"precio_{yerba_linea.id}": "83",
+            f"cantidad_{arroz_linea.id}": "6", f"precio_{arroz_linea.id}": "40",
+        })
+        self.assertEqual(
+            list(orden.lineas.order_by("id").values_list("cantidad", "precio_total")), [(3, 250), (6, 240)],
+        )
+
+    def test_consultas_no_dependen_de_las_lineas(self):
+        def consultas(n):
+            lineas = lineas_de_csv(StringIO(
+                "producto,cantidad,precio_compra\n" + "".join(f"Nuevo {n}-{i},2,10\n" for i in range(n)) + "Yerba,1,80\n"
+            ))
+            with CaptureQueriesContext(connection) as ctx:
+                crear_orden(self.sur, lineas)
+            return len(ctx.captured_queries)
+
+        self.assertEqual(consultas(3), consultas(60))
+        self.assertEqual(Producto.objects.get(pk=self.yerba.pk).stock, 4)
+
+    def test_editar_y_anular_revierten_stock(self):
+        orden = crear_orden(None, [("Yerba", 10, 80), ("Arroz", 5, 40)])
+        yerba_linea, arroz_linea = orden.lineas.order_by("producto__nombre").reverse()
+        self.assertEqual(editar_orden(orden, {yerba_linea.id: (4, 80), arroz_linea.id: (0, 40)}), 2)
+        self.assertEqual(Producto.objects.get(pk=self.yerba.pk).stock, 6)
+        self.assertEqual(Producto.objects.get(pk=self.arroz.pk).stock, 0)
+        self.assertEqual(list(orden.lineas.values_list("cantidad", flat=True)), [4])
+        self.assertEqual(ResumenDiario.objects.get(fecha=timezone.localdate()).total_compras, 320)
+
+        crear_venta([{"producto_id": self.yerba.id, "cantidad": 5}])
+        with self.assertRaises(OrdenError):
+            anular_orden(orden)
+        crear_orden(None, [("Yerba", 3, 80)])
+        resp = self.client.post(reverse("bodega:ordenes_compra_eliminar", args=[orden.id]))
+        self.assertRedirects(resp, reverse("bodega:ordenes_compra"))
+        self.assertEqual(Producto.objects.get(pk=self.yerba.pk).stock, 0)
+        self.assertFalse(OrdenCompra.objects.filter(pk=orden.pk).exists())
+        self.assertEqual(MovimientoStock.objects.get(tipo="compra_anulacion").cantidad, -4)
+
+
+class ArchivoHistoricoTests(TestCase):
+    def setUp(self):
+        self.user = Usuario.objects.create_user(username="caja", password="x")
+        self.client.force_login(self.user)
+        self.yerba = Producto.objects.create(nombre="Yerba", precio_compra=80, precio_venta=120, stock=100)
+        self.viejo = timezone.now() - timedelta(days=3 * 365)
+        for _ in range(3):
+            venta = Venta.objects.create(fecha=self.viejo, tipo="minorista", total=240)
+            DetalleVenta.objects.create(venta=venta, producto=self.yerba, cantidad=2, precio_unitario=120, costo_unitario=80)
+        compra = Compra.objects.create(producto=self.yerba, cantidad=10, precio_total=800)
+        Compra.objects.filter(pk=compra.pk).update(fecha=self.viejo)
+        crear_venta([{"producto_id": self.yerba.id, "cantidad": 1}])
+        call_command("reconstruir_resumenes", stdout=StringIO())
+
+    def test_mueve_meses_viejos_y_conserva_resumenes(self):
+        antes = list(ResumenDiario.objects.order_by("fecha").values_list("fecha", "total_ventas", "total_compras"))
+        out = StringIO()
+        call_command("archivar_historial", "--meses", "12", "--lote", "2", stdout=out)
+
+        self.assertIn("3 ventas, 3 detalles, 1 compras", out.getvalue())
+        self.assertEqual(Venta.objects.count(), 1)
+        self.assertEqual(DetalleVenta.objects.count(), 1)
+        self.assertFalse(Compra.objects.exists())
+        archivada = VentaArchivada.objects.first()
+        self.assertEqual(archivada.detalles, [[self.yerba.id, 2, 120, 80]])
+        self.assertEqual(CompraArchivada.objects.get().precio_total, 800)
+        mes = PeriodoArchivado.objects.get(mes=timezone.localdate(self.viejo).replace(day=1))
+        self.assertEqual((mes.ventas, mes.compras), (3, 1))
+
+        # Reconstruir no pisa los días archivados
+        call_command("reconstruir_resumenes", stdout=StringIO())
+        self.assertEqual(
+            list(ResumenDiario.objects.order_by("fecha").values_list("fecha", "total_ventas", "total_compras")),
+            antes,
+        )
+        resp = self.client.get(reverse("bodega:reportes_margenes"), {
+            "periodo": "personalizado", "desde": timezone.localdate(self.viejo).isoformat(),
+            "hasta": timezone.localdate().isoformat(),
+        })
+        self.assertEqual(resp.status_code, 200)
+
+    def test_archivar_sin_resumenes_los_calcula_antes(self):
+        # Resúmenes nunca cargados para los meses viejos (la migración crea las tablas vacías)
+        ResumenDiario.objects.all().delete()
+        ResumenProductoDiario.objects.all().delete()
+        call_command("archivar_historial", "--meses", "12", stdout=StringIO())
+        self.assertFalse(Venta.objects.filter(fecha=self.viejo).exists())
+
+        dia = ResumenDiario.objects.get(fecha=timezone.localdate(self.viejo))
+        self.assertEqual((dia.cantidad_ventas, dia.total_ventas, dia.total_compras), (3, 720, 800))
+        fila = ResumenProductoDiario.objects.get(fecha=dia.fecha, producto=self.yerba)
+        self.assertEqual((fila.cantidad_vendida, fila.cantidad_comprada), (6, 10))
+        # Reconstruir después ya no los toca
+        call_command("reconstruir_resumenes", stdout=StringIO())
+        self.assertTrue(ResumenDiario.objects.filter(fecha=dia.fecha).exists())
+
+        # La exportación incluye las filas archivadas, antes que las actuales
+        filas = list(filas_csv("detalles", self.viejo - timedelta(days=1), timezone.now() + timedelta(days=1)))
+        self.assertEqual(len(filas), 1 + 3 + 1)
+        self.assertIn("Yerba,2,120,240,80", filas[1])
+
+    def test_ingesta_rechaza_periodos_archivados(self):
+        call_command("archivar_historial", "--meses", "12", stdout=StringIO())
+        r = ingerir_ventas([{
+            "uuid": str(uuid.uuid4()), "fecha": self.viejo.isoformat(),
+            "items": [{"producto_id": self.yerba.id, "cantidad": 1}],
+        }])
+        self.assertIn("archivado", r.rechazadas[0]["error"])
+
+
+class TrabajosTests(TestCase):
+    def setUp(self):
+        self.user = Usuario.objects.create_user(username="caja", password="x")
+        self.client.force_login(self.user)
+        self.yerba = Producto.objects.create(nombre="Yerba", precio_compra=80, precio_venta=120, stock=10)
+        crear_venta([{"producto_id": self.yerba.id, "cantidad": 2}])
+        self.hoy = timezone.localdate().isoformat()
+        # Dentro del TestCase no hay que cerrar la conexión de la transacción del test
+        patcher = mock.patch.object(trabajos, "close_old_connections")
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def encolar_exportacion(self):
+        resp = self.client.post(reverse("bodega:trabajos"), {
+            "tipo": "exportar_csv", "exportacion": "detalles", "desde": self.hoy, "hasta": self.hoy,
+        })
+        trabajo = Trabajo.objects.get()
+        self.assertRedirects(resp, reverse("bodega:trabajo_detalle", args=[trabajo.id]))
+        return trabajo
+
+    def test_exportacion_en_segundo_plano(self):
+        trabajo = self.encolar_exportacion()
+        self.assertEqual((trabajo.estado, trabajo.creado_por), ("pendiente", self.user))
+
+        self.assertEqual(trabajos.tomar_siguiente(), trabajo.id)
+        self.assertIsNone(trabajos.tomar_siguiente())
+        # Trozos chicos: el archivo queda repartido en varias filas
+        with mock.patch.object(trabajos, "TROZO_RESULTADO", 16):
+            trabajos.ejecutar(trabajo.id)
+
+        estado = self.client.get(reverse("bodega:trabajo_estado", args=[trabajo.id])).json()
+        self.assertEqual((estado["estado"], estado["progreso"]), ("terminado", 100))
+        resp = self.client.get(estado["archivo"])
+        contenido = b"".join(resp.streaming_content).decode()
+        resp.close()
+        self.assertEqual(contenido.splitlines()[1:], [l.strip() for l in list(filas_csv(
+            "detalles", *rango_timestamps(timezone.localdate(), timezone.localdate())))[1:]])
+        self.assertIn("Yerba,2", contenido)
+        self.assertEqual(resp["Content-Disposition"], f'attachment; filename="detalles_{self.hoy}_{self.hoy}.csv"')
+        # El resultado queda en la base, no en el disco del runner, y se manda de a un trozo
+        trozos = [bytes(c) for c in trabajo.trozos.order_by("orden").values_list("contenido", flat=True)]
+        self.assertGreater(len(trozos), 1)
+        self.assertTrue(all(len(t) <= 16 for t in trozos))
+        self.assertEqual(b"".join(trozos).decode(), contenido)
+        self.assertTrue(resp.streaming)
+
+    def test_runjobs_una_vez(self):
+        trabajo = self.encolar_exportacion()
+        out = StringIO()
+        # Con hilos, el trabajo correría en otra conexión sin ver la transacción del test
+        with mock.patch("bodega_app.management.commands.runjobs.ThreadPoolExecutor", _PoolSincronico):
+            call_command("runjobs", "--una-vez", stdout=out)
+        self.assertIn(f"Trabajo {trabajo.id} finalizado.", out.getvalue())
+        trabajo.refresh_from_db()
+        self.assertEqual(trabajo.estado, "terminado")
+        # De paso suma los aportes que dejó la venta del setUp
+        self.assertFalse(ResumenPendiente.objects.exists())
+        self.assertEqual(ResumenDiario.objects.get().total_ventas, 240)
+
+    def test_runjobs_exige_un_cache_compartido(self):
+        # Con la configuración por defecto (caché en la base) el runner arranca
+        self.assertIsNone(trabajos.problema_de_cache())
+        locmem = {"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}}
+        with override_settings(CACHES=locmem), self.assertRaisesMessage(CommandError, "caché compartido"):
+            call_command("runjobs", "--una-vez", stdout=StringIO())
+        # El caché en disco solo vale si se declara que el disco es el mismo
+        disco = {"default": {"BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
+                             "LOCATION": tempfile.mkdtemp()}}
+        with override_settings(CACHES=disco), self.assertRaisesMessage(CommandError, "TRABAJOS_CACHE_COMPARTIDO"):
+            call_command("runjobs", "--una-vez", stdout=StringIO())
+        with override_settings(CACHES=disco, TRABAJOS_CACHE_COMPARTIDO=True):
+            self.assertIsNone(trabajos.problema_de_cache())
+
+    def test_cancelar(self):
+        pendiente = self.encolar_exportacion()
+        self.client.post(reverse("bodega:trabajo_cancelar", args=[pendiente.id]))
+        pendiente.refresh_from_db()
+        self.assertEqual(pendiente.estado, "cancelado")
+        self.assertIsNone(trabajos.tomar_siguiente())
+
+        # Uno en curso se entera en su siguiente aviso de avance y no deja archivo a medias
+        en_curso = trabajos.encolar("exportar_csv", {"tipo": "ventas", "desde": self.hoy, "hasta": self.hoy}, self.user)
+        trabajos.tomar_siguiente()
+        self.client.post(reverse("bodega:trabajo_cancelar", args=[en_curso.id]))
+        trabajos.ejecutar(en_curso.id)
+        en_curso.refresh_from_db()
+        self.assertEqual((en_curso.estado, en_curso.archivo), ("cancelado", ""))
+        self.assertFalse(ResultadoTrabajo.objects.exists())
+
+    def test_solo_admin_y_solo_propios(self):
+        self.client.post(reverse("bodega:trabajos"), {"tipo": "reconstruir_resumenes", "desde": self.hoy, "hasta": self.hoy})
+        self.assertFalse(Trabajo.objects.exists())
+        otro = trabajos.encolar("exportar_csv", {"tipo": "ventas", "desde": self.hoy, "hasta": self.hoy})
+        self.assertEqual(self.client.get(reverse("bodega:trabajo_detalle", args=[otro.id])).status_code, 404)
+
+
+
+class ConciliacionStockTests(TestCase):
+    def setUp(self):
+        self.user = Usuario.objects.create_user(username="admin", password="x", rol="admin")
+        self.client.force_login(self.user)
+        crear_orden(None, [("Yerba", 10, 80), ("Azúcar", 5, 50), ("Arroz", 3, 40)])
+        self.yerba, self.azucar, self.arroz = (Producto.objects.get(nombre=n) for n in ("Yerba", "Azúcar", "Arroz"))
+        crear_venta([{"producto_id": self.yerba.id, "cantidad": 4}])
+
+    def test_detecta_y_corrige_desvios(self):
+        self.assertEqual(list(desvios()), [])
+        # Cambios por fuera del libro, como un update directo o una compra borrada a mano
+        Producto.objects.filter(pk=self.yerba.pk).update(stock=9)
+        Compra.objects.filter(producto=self.azucar)._raw_delete(Compra.objects.db)
+
+        with CaptureQueriesContext(connection) as consultas:
+            filas = list(desvios(lote=2))
+        # Límite del archivo + dos tandas + la tanda vacía, sin importar cuánta historia haya
+        self.assertEqual(len(consultas), 4)
+        self.assertEqual(
+            [(f["nombre"], f["stock"], f["esperado"], f["diferencia"]) for f in filas],
+            [("Yerba", 9, 6, 3), ("Azúcar", 5, 0, 5)],
+        )
+        resp = self.client.get(reverse("bodega:reportes_stock"))
+        self.assertContains(resp, "Azúcar")
+
+        out = StringIO()
+        call_command("conciliar_stock", "--corregir", stdout=out)
+        self.assertIn("2 productos desviados, 2 corregidos", out.getvalue())
+        self.assertEqual(Producto.objects.get(pk=self.yerba.pk).stock, 6)
+        self.assertEqual(
+            MovimientoStock.objects.get(producto=self.azucar, tipo="conciliacion").cantidad, -5,
+        )
+        self.assertEqual(conciliar(), [])
+
+    def test_producto_anterior_al_libro_parte_del_saldo_de_apertura(self):
+        fideos = Producto.objects.create(nombre="Fideos", precio_compra=40, precio_venta=60, stock=55)
+        # El snapshot que dejó la migración del libro, con una compra de antes ya incluida en el stock
+        antes = timezone.now() - timedelta(days=30)
+        SnapshotStock.objects.create(producto=fideos, fecha=antes, stock=55)
+        crear_orden(None, [("Fideos", 10, 40)])
+        Compra.objects.create(producto=fideos, cantidad=20, precio_total=800)
+        Compra.objects.filter(producto=fideos, cantidad=20).update(fecha=antes - timedelta(days=1))
+        crear_venta([{"producto_id": fideos.id, "cantidad": 5}])
+        tomar_snapshots(timezone.now())
+        self.assertEqual(list(desvios()), [])
+
+        self.assertEqual(conciliar(corregir_desvios=True), [])
+        self.assertEqual(Producto.objects.get(pk=fideos.pk).stock, 60)
+        # Un desvío posterior a la apertura se sigue viendo
+        Producto.objects.filter(pk=fideos.pk).update(stock=70)
+        self.assertEqual([(f["nombre"], f["esperado"]) for f in desvios()], [("Fideos", 60)])
+
+    def test_esperado_negativo_no_se_corrige(self):
+        DetalleVenta.objects.filter(producto=self.yerba).update(cantidad=20)
+        filas = conciliar(corregir_desvios=True)
+        self.assertEqual([(f["esperado"], f["corregido"]) for f in filas], [(-10, False)])
+        self.assertEqual(Producto.objects.get(pk=self.yerba.pk).stock, 6)
+
+    def test_cuenta_los_meses_archivados(self):
+        viejo = timezone.now() - timedelta(days=3 * 365)
+        Venta.objects.update(fecha=viejo)
+        Compra.objects.update(fecha=viejo)
+        call_command("reconstruir_resumenes", stdout=StringIO())
+        call_command("archivar_historial", "--meses", "12", stdout=StringIO())
+        self.assertFalse(Compra.objects.exists())
+        self.assertEqual(list(desvios()), [])
+
+    def test_corregir_desde_el_reporte_encola_un_trabajo(self):
+        Producto.objects.filter(pk=self.arroz.pk).update(stock=0)
+        resp = self.client.post(reverse("bodega:reportes_stock_corregir"))
+        trabajo = Trabajo.objects.get(tipo="conciliar_stock")
+        self.assertRedirects(resp, reverse("bodega:trabajo_detalle", args=[trabajo.id]))
+        self.assertEqual(trabajo.parametros, {"corregir": True})
+
+        with mock.patch.object(trabajos, "close_old_connections"):
+            trabajos.ejecutar(trabajos.tomar_siguiente())
+        trabajo.refresh_from_db()
+        self.assertIn("Arroz,,0,3,-3,si", b"".join(trabajos.leer_resultado(trabajo)).decode())
+        self.assertEqual(trabajo.mensaje, "1 productos desviados, 1 corregidos.")
+        self.assertEqual(Producto.objects.get(pk=self.arroz.pk).stock, 3)
+
+
+class _PoolSincronico:
+    """Reemplazo de ThreadPoolExecutor que corre cada trabajo en el momento."""
+
+    def __init__(self, *args, **kwargs):
+        pass
+
+    def submit(self, funcion, *args):
+        futuro = Future()
+        try:
+            futuro.set_result(funcion(*args))
+        except Exception as e:
+            futuro.set_exception(e)
+        return futuro
+
+    def shutdown(self, wait=True):
+        pass
 
-# Create your tests here.
@@ -0,0 +1,229 @@
+"""
+Trabajos en segundo plano sin broker: la cola es la tabla Trabajo.
+
+Las vistas encolan con `encolar` y responden enseguida; `manage.py runjobs`
+(proceso aparte, ver Procfile) toma los pendientes y los ejecuta en un pool
+de hilos o de procesos. Un trabajo se reclama con un UPDATE condicional
+(estado='pendiente'), así varios runners pueden compartir la cola.
+
+Cada tipo de trabajo es una función registrada con `@tarea` que recibe un
+`Avance`: con él informa el progreso, se entera si el usuario pidió
+cancelar (lanza Cancelado) y abre el archivo de resultado. El archivo se
+escribe en un temporal y al terminar se guarda en ResultadoTrabajo, de a
+TROZO_RESULTADO bytes, así la vista lo ofrece (y lo manda trozo a trozo)
+aunque el runner corra en otra máquina (ver Procfile).
+
+Por lo mismo, el runner necesita un caché compartido con el servidor web:
+las tareas invalidan tendencias, contadores y sellos de versión, y con un
+caché local a cada máquina el sitio seguiría mostrando los datos viejos.
+`runjobs` no arranca con un caché en memoria, ni con uno en disco salvo que
+TRABAJOS_CACHE_COMPARTIDO indique que el disco es el mismo.
+"""
+import csv
+import io
+import logging
+import os
+import tempfile
+import time
+from datetime import timedelta
+from django.conf import settings
+from django.core.management import call_command
+from django.db import close_old_connections, transaction
+from django.utils import timezone
+from .conciliacion import conciliar
+from .exportar import EXPORTACIONES, filas_csv
+from .models import Producto, ResultadoTrabajo, Trabajo
+from .periodos import parse_fecha, rango_timestamps
+from .routers import en_replica
+
+logger = logging.getLogger(__name__)
+
+# tipo: (función, etiqueta, solo_admin, en_formulario)
+TAREAS = {}
+# Mínimo entre dos escrituras de avance en la base
+INTERVALO_AVANCE = 1.0
+# Bytes por fila de ResultadoTrabajo
+TROZO_RESULTADO = 512 * 1024
+
+class Cancelado(Exception):
+    """El usuario pidió cancelar el trabajo."""
+
+def tarea(tipo, etiqueta, solo_admin=False, en_formulario=True):
+    """Registra una tarea; las que no van `en_formulario` se encolan desde su propia vista."""
+    def registrar(funcion):
+        TAREAS[tipo] = (funcion, etiqueta, solo_admin, en_formulario)
+        return funcion
+    return registrar
+
+def encolar(tipo, parametros=None, usuario=None):
+    if tipo not in TAREAS:
+        raise ValueError(f"Tipo de trabajo desconocido: {tipo}")
+    return Trabajo.objects.create(tipo=tipo, parametros=parametros or {}, creado_por=usuario)
+
+# Backends de caché que no ven las escrituras de otro proceso o máquina
+_CACHES_LOCALES = (
+    "django.core.cache.backends.locmem.LocMemCache",
+    "django.core.cache.backends.dummy.DummyCache",
+)
+_CACHE_EN_DISCO = "django.core.cache.backends.filebased.FileBasedCache"
+
+def problema_de_cache():
+    """Motivo por el que el caché "default" no sirve para el runner, o None."""
+    backend = settings.CACHES["default"]["BACKEND"]
+    if backend in _CACHES_LOCALES:
+        return f"el caché {backend} es propio de cada proceso."
+    if backend == _CACHE_EN_DISCO and not settings.TRABAJOS_CACHE_COMPARTIDO:
+        return (
+            "el caché en disco solo se comparte si el runner corre en la misma máquina que el "
+            "servidor web (indicarlo con TRABAJOS_CACHE_COMPARTIDO=True); si no, usar el "
+            "caché en la base (el de por defecto, DJANGO_CACHE_BACKEND sin definir) o Redis."
+        )
+    return None
+
+class Avance:
+    def __init__(self, trabajo):
+        self.trabajo = trabajo
+        self._ultimo = 0.0
+        self.ruta = None
+
+    def informar(self, progreso, mensaje="", forzar=False):
+        """Guarda el avance (como mucho una vez por INTERVALO_AVANCE) y lanza Cancelado si se pidió."""
+        ahora = time.monotonic()
+        if not forzar and ahora - self._ultimo < INTERVALO_AVANCE:
+            return
+        self._ultimo = ahora
+        # Es una escritura, así que va al primario aunque la tarea lea de la réplica
+        if not Trabajo.objects.filter(pk=self.trabajo.pk, cancelar=False).update(
+            progreso=max(0, min(100, int(progreso))), mensaje=mensaje[:200], actualizado_en=timezone.now(),
+        ):
+            raise Cancelado()
+
+    def abrir_resultado(self, nombre):
+        """Archivo de texto (temporal) donde la tarea escribe su resultado; `nombre` es el de la descarga."""
+        self.trabajo.archivo = nombre
+        archivo = tempfile.NamedTemporaryFile(
+            "w", newline="", encoding="utf-8", prefix=f"trabajo-{self.trabajo.pk}-", delete=False,
+        )
+        self.ruta = archivo.name
+        return archivo
+
+    @transaction.atomic
+    def guardar_resultado(self):
+        ResultadoTrabajo.objects.filter(trabajo_id=self.trabajo.pk).delete()
+        with open(self.ruta, "rb") as f:
+            for orden, trozo in enumerate(iter(lambda: f.read(TROZO_RESULTADO), b"")):
+                ResultadoTrabajo.objects.create(trabajo_id=self.trabajo.pk, orden=orden, contenido=trozo)
+
+    def descartar_resultado(self):
+        if self.ruta:
+            os.remove(self.ruta)
+            self.ruta = None
+
+def leer_resultado(trabajo):
+    """Genera los trozos del resultado de `trabajo` en orden, trayendo uno por consulta."""
+    ids = list(trabajo.trozos.order_by("orden").values_list("pk", flat=True))
+    for pk in ids:
+        yield bytes(ResultadoTrabajo.objects.values_list("contenido", flat=True).get(pk=pk))
+
+def tomar_siguiente():
+    """Reclama el pendiente más viejo; None si la cola está vacía."""
+    while True:
+        pk = Trabajo.objects.filter(estado="pendiente").order_by("id").values_list("pk", flat=True).first()
+        if pk is None:
+            return None
+        # Si otro runner lo reclamó primero, el UPDATE no toca filas y se prueba con el siguiente
+        ahora = timezone.now()
+        if Trabajo.objects.filter(pk=pk, estado="pendiente").update(
+            estado="en_curso", iniciado_en=ahora, actualizado_en=ahora,
+        ):
+            return pk
+
+def ejecutar(pk):
+    """Corre el trabajo `pk` (ya reclamado) y guarda cómo terminó."""
+    close_old_connections()
+    try:
+        trabajo = Trabajo.objects.get(pk=pk)
+        avance = Avance(trabajo)
+        try:
+            if trabajo.cancelar:
+                raise Cancelado()
+            mensaje = TAREAS[trabajo.tipo][0](avance, **trabajo.parametros) or ""
+            if avance.ruta:
+                avance.guardar_resultado()
+            cambios = {"estado": "terminado", "progreso": 100, "mensaje": mensaje[:200]}
+        except Cancelado:
+            cambios = {"estado": "cancelado", "mensaje": "Cancelado."}
+        except Exception as e:
+            logger.exception("Falló el trabajo %s", pk)
+            cambios = {"estado": "error", "mensaje": f"{type(e).__name__}: {e}"[:200]}
+        finally:
+            avance.descartar_resultado()
+        if cambios["estado"] != "terminado":
+            # Un resultado a medias no se ofrece para descargar
+            trabajo.archivo = ""
+        ahora = timezone.now()
+        Trabajo.objects.filter(pk=pk).update(
+            archivo=trabajo.archivo, actualizado_en=ahora, terminado_en=ahora, **cambios,
+        )
+    finally:
+        close_old_connections()
+
+def rescatar_colgados(minutos=None):
+    """Marca como error los trabajos en curso sin avances hace `minutos` (el runner se cortó)."""
+    minutos = minutos or settings.TRABAJOS_TIMEOUT_MINUTOS
+    limite = timezone.now() - timedelta(minutes=minutos)
+    return Trabajo.objects.filter(estado="en_curso", actualizado_en__lt=limite).update(
+        estado="error", mensaje="Interrumpido (el runner se detuvo).", terminado_en=timezone.now(),
+    )
+
+# -------------------------
+# Tareas
+# -------------------------
+def _dias(desde, hasta):
+    desde, hasta = parse_fecha(desde), parse_fecha(hasta)
+    if desde is None or hasta is None or desde > hasta:
+        raise ValueError("Rango de fechas inválido.")
+    return [desde + timedelta(days=i) for i in range((hasta - desde).days + 1)]
+
+@tarea("exportar_csv", "Exportar CSV")
+def exportar_csv(avance, tipo, desde, hasta):
+    """Como la exportación en streaming, pero de a un día para poder informar el avance."""
+    if tipo not in EXPORTACIONES:
+        raise ValueError(f"Exportación inexistente: {tipo}")
+    dias = _dias(desde, hasta)
+    filas = 0
+    with en_replica(), avance.abrir_resultado(f"{tipo}_{desde}_{hasta}.csv") as destino:
+        for i, dia in enumerate(dias):
+            lineas = filas_csv(tipo, *rango_timestamps(dia, dia))
+            encabezado = next(lineas)
+            if i == 0:
+                destino.write(encabezado)
+            for linea in lineas:
+                destino.write(linea)
+                filas += 1
+            avance.informar(100 * (i + 1) / len(dias), f"{dia}: {filas} filas")
+    return f"{filas} filas exportadas."
+
+@tarea("reconstruir_resumenes", "Reconstruir resúmenes", solo_admin=True)
+def reconstruir_resumenes(avance, desde, hasta):
+    dias = _dias(desde, hasta)
+    # De a un mes: cada tramo es una transacción corta y deja informar el avance
+    tramos = [dias[i:i + 31] for i in range(0, len(dias), 31)]
+    for n, tramo in enumerate(tramos, start=1):
+        call_command("reconstruir_resumenes", desde=tramo[0].isoformat(), hasta=tramo[-1].isoformat(),
+                     stdout=io.StringIO())
+        avance.informar(100 * n / len(tramos), f"Hasta {tramo[-1]}", forzar=True)
+    return f"Resúmenes recalculados del {desde} al {hasta}."
+
+@tarea("conciliar_stock", "Conciliar stock", solo_admin=True, en_formulario=False)
+def conciliar_stock(avance, corregir=False):
+    total = Producto.objects.count() or 1
+    filas = conciliar(corregir, informar=lambda n: avance.informar(100 * n / total, f"{n} productos revisados"))
+    with avance.abrir_resultado("conciliacion_stock.csv") as destino:
+        salida = csv.writer(destino)
+        salida.writerow(["id", "producto", "codigo", "stock", "esperado", "diferencia", "corregido"])
+        for f in filas:
+            salida.writerow([f["id"], f["nombre"], f["codigo"] or "", f["stock"], f["esperado"],
+                             f["diferencia"], "si" if f["corregido"] else "no"])
+    corregidos = sum(f["corregido"] for f in filas)
+    return f"{len(filas)} productos desviados, {corregidos} corregidos."
@@ -31,6 +31,12 @@ urlpatterns = [
     # Productos
     path("productos/",                   views.productos,          name="productos"),
     path("productos/agregar/",           views.agregar_productos,  name="agregar_productos"),
+    path("productos/buscar/",            views.productos_buscar,   name="productos_buscar"),
+    path("productos/importar/",          views.productos_importar, name="productos_importar"),
+    path("productos/stock-bajo/",        views.productos_stock_bajo, name="productos_stock_bajo"),
+    path("productos/reposicion/",        views.productos_reposicion, name="productos_reposicion"),
+    path("api/stock-bajo/",              views.api_stock_bajo,       name="api_stock_bajo"),
+    path("api/productos/<int:pk>/stock/", views.api_stock_historico, name="api_stock_historico"),
     path("productos/editar/<int:pk>/",   views.editar_productos,   name="editar_productos"),
     path("productos/eliminar/<int:pk>/", views.eliminar_productos, name="eliminar_productos"),
 
@@ -44,15 +50,36 @@ urlpatterns = [
     path("compras/",                      views.compras,           name="compras"),
     path("compras/editar/<int:pk>/",      views.compras_editar,    name="compras_editar"),
     path("compras/eliminar/<int:pk>/",    views.compras_eliminar,  name="compras_eliminar"),
+    path("compras/ordenes/",              views.ordenes_compra,          name="ordenes_compra"),
+    path("compras/ordenes/nueva/",        views.ordenes_compra_nueva,    name="ordenes_compra_nueva"),
+    path("compras/ordenes/<int:pk>/",     views.ordenes_compra_detalle,  name="ordenes_compra_detalle"),
+    path("compras/ordenes/<int:pk>/eliminar/", views.ordenes_compra_eliminar, name="ordenes_compra_eliminar"),
 
     # Ventas
     path("ventas/",                       views.ventas,                 name="ventas"),
     path("ventas/historial/",             views.ventas_historial,       name="ventas_historial"),
-    path("ventas/modificar/<int:index>/", views.ventas_modificar_item,  name="ventas_modificar_item"),
-    path("ventas/eliminar/<int:index>/",  views.ventas_eliminar_item,   name="ventas_eliminar_item"),
+    path("ventas/modificar/<int:producto_id>/", views.ventas_modificar_item, name="ventas_modificar_item"),
+    path("ventas/eliminar/<int:producto_id>/",  views.ventas_eliminar_item,  name="ventas_eliminar_item"),
     path("ventas/vaciar/",                views.ventas_vaciar,          name="ventas_vaciar"),
     path("ventas/confirmar/",             views.confirmar_venta,        name="confirmar_venta"),
+    path("api/ventas/",                   views.api_ventas,             name="api_ventas"),
+    path("api/ventas/lote/",              views.api_ventas_lote,        name="api_ventas_lote"),
+
+    # Trabajos en segundo plano
+    path("trabajos/",                     views.trabajos,          name="trabajos"),
+    path("trabajos/<int:pk>/",            views.trabajo_detalle,   name="trabajo_detalle"),
+    path("trabajos/<int:pk>/estado/",     views.trabajo_estado,    name="trabajo_estado"),
+    path("trabajos/<int:pk>/cancelar/",   views.trabajo_cancelar,  name="trabajo_cancelar"),
+    path("trabajos/<int:pk>/descargar/",  views.trabajo_descargar, name="trabajo_descargar"),
+
+    # Métricas
+    path("metrics",                       views.metricas,          name="metricas"),
 
     # Reportes
     path("reportes/",                     views.reportes,          name="reportes"),
+    path("reportes/tendencias/",          views.reportes_tendencias, name="reportes_tendencias"),
+    path("reportes/margenes/",            views.reportes_margenes,   name="reportes_margenes"),
+    path("reportes/stock/",               views.reportes_stock,      name="reportes_stock"),
+    path("reportes/stock/corregir/",      views.reportes_stock_corregir, name="reportes_stock_corregir"),
+    path("reportes/exportar/<str:tipo>/", views.exportar_csv,      name="exportar_csv"),
 ]
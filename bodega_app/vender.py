@@ -0,0 +1,124 @@
+"""
+Registro de ventas, compartido por el carrito (confirmar_venta) y la API JSON.
+
+Hay dos formas de descontar el stock (settings.VENTA_MODO):
+
+- "optimista" (por defecto): no bloquea filas al leer los productos; el
+  stock se descuenta al final con un UPDATE condicional (stock >= cantidad)
+  y si alguna fila no se actualizó es que otra caja se llevó las unidades.
+- "bloqueo": SELECT ... FOR UPDATE de los productos al empezar, como antes.
+
+En PostgreSQL un deadlock o error de serialización deshace la venta y se
+reintenta hasta REINTENTOS veces.
+"""
+import random
+import time
+from decimal import Decimal
+from django.conf import settings
+from django.db import OperationalError, transaction
+from django.db.models import Case, F, PositiveIntegerField, Q, When
+from .inventario import registrar_movimientos
+from .models import DetalleVenta, Producto, Venta
+from .resumenes import registrar_venta_pendiente
+from .versiones import cambiar_version
+
+MODOS = ("optimista", "bloqueo")
+REINTENTOS = 3
+# serialization_failure, deadlock_detected
+_CODIGOS_REINTENTABLES = {"40001", "40P01"}
+
+class VentaError(Exception):
+    """La venta no puede registrarse (producto inexistente o stock insuficiente)."""
+
+def _restar(cantidades):
+    return Case(
+        *[When(id=pid, then=F("stock") - cant) for pid, cant in cantidades.items()],
+        default=F("stock"),
+        output_field=PositiveIntegerField(),
+    )
+
+def descontar_stock(cantidades):
+    """Resta {producto_id: cantidad} del stock con un único UPDATE ... CASE."""
+    Producto.objects.filter(id__in=list(cantidades)).update(stock=_restar(cantidades))
+
+def descontar_stock_condicional(cantidades):
+    """
+    Como descontar_stock, pero solo toca las filas con stock suficiente.
+    Devuelve False si alguna no alcanzó; el llamador debe deshacer la transacción.
+    """
+    condicion = Q()
+    for pid, cant in cantidades.items():
+        condicion |= Q(id=pid, stock__gte=cant)
+    return Producto.objects.filter(condicion).update(stock=_restar(cantidades)) == len(cantidades)
+
+def _reintentable(error):
+    return getattr(error.__cause__, "pgcode", None) in _CODIGOS_REINTENTABLES
+
+def crear_venta(lineas, tipo="minorista", clave_cliente=None, modo=None):
+    """
+    Crea la venta de `lineas` (dicts con producto_id, cantidad y, opcional,
+    precio) y descuenta el stock, con una cantidad fija de consultas sin
+    importar cuántas líneas tenga. Lanza VentaError si falta un producto o
+    no alcanza el stock.
+    """
+    modo = modo or getattr(settings, "VENTA_MODO", "optimista")
+    if modo not in MODOS:
+        raise ValueError(f"Modo de venta desconocido: {modo}")
+    cantidades = {}
+    for item in lineas:
+        cantidades[item["producto_id"]] = cantidades.get(item["producto_id"], 0) + item["cantidad"]
+
+    for intento in range(1, REINTENTOS + 1):
+        try:
+            with transaction.atomic():
+                return _registrar(lineas, cantidades, tipo, clave_cliente, bloquear=modo == "bloqueo")
+        except OperationalError as e:
+            if intento == REINTENTOS or not _reintentable(e):
+                raise
+            time.sleep(random.uniform(0, 0.02 * 2 ** intento))
+
+def _registrar(lineas, cantidades, tipo, clave_cliente, bloquear):
+    productos = Producto.objects.filter(id__in=list(cantidades))
+    if bloquear:
+        productos = productos.select_for_update()
+    productos_cache = {p.id: p for p in productos}
+
+    # En modo optimista esto es solo un aviso temprano: la garantía la da el UPDATE condicional
+    for producto_id, cantidad in cantidades.items():
+        p = productos_cache.get(producto_id)
+        if p is None:
+            raise VentaError("Un producto de la venta ya no existe.")
+        if cantidad > p.stock:
+            raise VentaError(f"Stock insuficiente para {p.nombre}.")
+
+    precios = []
+    for item in lineas:
+        precio = item.get("precio")
+        if precio is None:
+            precio = productos_cache[item["producto_id"]].precio_venta
+        precios.append(Decimal(precio))
+    total = sum((precio * item["cantidad"] for precio, item in zip(precios, lineas)), Decimal("0"))
+
+    venta = Venta.objects.create(total=total, tipo=tipo, clave_cliente=clave_cliente)
+
+    # Guardar precio y costo unitarios al momento de la venta
+    detalles = DetalleVenta.objects.bulk_create([
+        DetalleVenta(
+            venta=venta,
+            producto=productos_cache[item["producto_id"]],
+            cantidad=item["cantidad"],
+            precio_unitario=precio,
+            costo_unitario=productos_cache[item["producto_id"]].precio_compra,
+        )
+        for precio, item in zip(precios, lineas)
+    ])
+    registrar_movimientos({pid: -cant for pid, cant in cantidades.items()}, "venta", venta.id)
+    # Los resúmenes los suma después el runner (consolidar_pendientes): la venta no toca la fila de hoy, que comparten todas las cajas
+    registrar_venta_pendiente(venta, detalles)
+    cambiar_version(Producto)  # el UPDATE de stock no dispara señales
+    # En modo optimista las filas de producto recién se bloquean acá, en la última consulta antes del COMMIT
+    if bloquear:
+        descontar_stock(cantidades)
+    elif not descontar_stock_condicional(cantidades):
+        raise VentaError("Stock insuficiente: otra venta se llevó las últimas unidades. Revisá el carrito.")
+    return venta
@@ -0,0 +1,43 @@
+"""
+Sellos de versión por modelo para el caché HTTP y los fragmentos de plantilla.
+
+Cada modelo del catálogo (Producto, Proveedor) tiene en el caché un valor
+opaco que cambia al confirmarse cualquier escritura: las señales cubren
+save() y delete(), y las operaciones masivas (update, bulk_create) llaman a
+`cambiar_version` explícitamente. Las vistas arman su ETag y las claves de
+{% cache %} con esos sellos, así que un listado sin cambios se responde con
+304 (o se arma desde el fragmento guardado) sin consultar la base.
+"""
+import hashlib
+import uuid
+from django.core.cache import cache
+from django.db import transaction
+
+def _clave(modelo):
+    return f"version:{modelo._meta.label_lower}"
+
+def version(modelo):
+    return cache.get_or_set(_clave(modelo), lambda: uuid.uuid4().hex, None)
+
+def versiones(*modelos):
+    """{nombre_del_modelo: sello}, para pasar a la plantilla."""
+    return {modelo._meta.model_name: version(modelo) for modelo in modelos}
+
+def cambiar_version(*modelos):
+    """Cambia el sello de `modelos` cuando la transacción en curso se confirma."""
+    transaction.on_commit(lambda: cache.set_many({_clave(m): uuid.uuid4().hex for m in modelos}, None))
+
+def etag_versiones(*modelos):
+    """
+    Función de ETag para `django.views.decorators.http.etag`: combina los
+    sellos de `modelos` con el usuario, el secreto CSRF (las páginas llevan
+    formularios) y la query string.
+    """
+    def _etag(request, *args, **kwargs):
+        user = request.user
+        partes = [version(m) for m in modelos] + [
+            str(user.pk), getattr(user, "rol", ""), str(user.is_superuser),
+            request.META.get("CSRF_COOKIE", ""), request.GET.urlencode(),
+        ]
+        return hashlib.md5("|".join(partes).encode(), usedforsecurity=False).hexdigest()
+    return _etag
@@ -1,24 +1,73 @@
+import hmac
+import io
+import json
+import mimetypes
+from datetime import timedelta
 from decimal import Decimal
 from django.contrib import messages
 from django.contrib.auth import get_user_model
+from django.conf import settings
 from django.contrib.auth.decorators import login_required, user_passes_test
-from django.db import transaction
-from django.db.models import F, Sum, DecimalField, ExpressionWrapper
+from django.db import IntegrityError, connection, transaction
+from django.db.models import Count, Exists, F, OuterRef, Sum
+from django.db.models.functions import Lower
+from django.http import Http404, HttpResponse, JsonResponse, StreamingHttpResponse
+from django.utils.functional import SimpleLazyObject
+from django.views.decorators.cache import cache_control
+from django.views.decorators.http import etag, require_POST
 from django.shortcuts import get_object_or_404, redirect, render
+from django.urls import reverse
 from django.utils import timezone
-from .models import Compra, DetalleVenta, Producto, Proveedor, Venta
+from .models import (
+    Compra, DetalleVenta, OrdenCompra, Producto, Proveedor, ResumenDiario, ResumenProductoDiario, Trabajo, Venta,
+)
+from .carrito import get_backend
+from .conciliacion import desvios
+from .contadores import contadores_dashboard
+from .decorators import api_login_required, usar_replica
+from .exportar import EXPORTACIONES, filas_csv
+from .importar import importar_productos
+from .ingesta import MAX_VENTAS_POR_LOTE, ingerir_ventas
+from .inventario import registrar_movimientos, stock_en
+from .metricas import texto_prometheus
+from .ordenes import (
+    OrdenError, anular_orden, crear_orden, editar_orden, lineas_de_csv, lineas_de_formulario, precios_sobre_venta,
+)
+from .paginacion import paginar
+from .periodos import PERIODOS, inicio_del_dia, parse_fecha, rango_fechas, rango_timestamps
+from .reposicion import COBERTURA, DIAS as DIAS_REPOSICION, PLAZO, guardar_stock_minimo, sugerencias
+from .resumenes import registrar_compra
+from .tendencias import GRANULARIDADES, serie
+from .trabajos import TAREAS, encolar, leer_resultado
+from .vender import VentaError, crear_venta
+from .versiones import etag_versiones, versiones
 
 Usuario = get_user_model()
 
 # -------------------------
-# Helpers carrito (sesión)
+# Helpers carrito (ver carrito.py)
 # -------------------------
 def _get_carrito(request):
-    return request.session.setdefault("carrito", [])
+    return get_backend().cargar(request)
 
 def _guardar_carrito(request, carrito):
-    request.session["carrito"] = carrito
-    request.session.modified = True
+    get_backend().guardar(request, carrito)
+
+def _vaciar_carrito(request):
+    get_backend().vaciar(request)
+
+# -------------------------
+# Helpers de listados
+# -------------------------
+def _filtrar_fechas(request, qs):
+    """Filtra `fecha` por ?desde=&hasta= (días locales, inclusive) con un rango semiabierto."""
+    desde = parse_fecha(request.GET.get("desde"))
+    hasta = parse_fecha(request.GET.get("hasta"))
+    if desde:
+        qs = qs.filter(fecha__gte=inicio_del_dia(desde))
+    if hasta:
+        qs = qs.filter(fecha__lt=inicio_del_dia(hasta + timedelta(days=1)))
+    return qs
 
 # -------------------------
 # Helpers de permisos
@@ -26,6 +75,18 @@ def _guardar_carrito(request, carrito):
 def es_admin(user):
     return user.is_authenticated and (user.is_superuser or getattr(user, "rol", "") == "admin")
 
+# -------------------------
+# Métricas (Prometheus)
+# -------------------------
+def metricas(request):
+    token = settings.METRICAS_TOKEN
+    autorizado = es_admin(request.user) or (
+        token and hmac.compare_digest(request.headers.get("Authorization", ""), f"Bearer {token}")
+    )
+    if not autorizado:
+        return HttpResponse("No autorizado.\n", status=403, content_type="text/plain")
+    return HttpResponse(texto_prometheus(), content_type="text/plain; version=0.0.4; charset=utf-8")
+
 # -------------------------
 # Setup inicial de usuarios
 # -------------------------
@@ -101,25 +162,71 @@ def usuarios_crear(request):
 # -------------------------
 @login_required(login_url="/usuarios/login/")
 def dashboard(request):
-    total_productos = Producto.objects.count()
-    stock_bajo = Producto.objects.filter(stock__lte=F("stock_minimo")).count()
-    hoy = timezone.localdate()
-    total_ventas_dia = Venta.objects.filter(fecha__date=hoy).aggregate(s=Sum("total"))["s"] or 0
-    return render(request, "dashboard.html", {
-        "total_productos": total_productos,
-        "stock_bajo": stock_bajo,
-        "total_ventas_dia": total_ventas_dia,
-    })
+    return render(request, "dashboard.html", contadores_dashboard())
 
 # -------------------------
 # Productos
 # -------------------------
 @login_required(login_url="/usuarios/login/")
+@cache_control(private=True, no_cache=True)
+@etag(etag_versiones(Producto, Proveedor))
 def productos(request):
-    qs = Producto.objects.select_related("proveedor").order_by("nombre")
-    return render(request, "productos.html", {"productos": qs})
+    qs = Producto.objects.select_related("proveedor")
+    # Perezosa: si la tabla sale del fragmento guardado no se consulta la base
+    pagina = SimpleLazyObject(lambda: paginar(qs, ["nombre", "id"], request))
+    return render(request, "productos.html", {
+        "productos": pagina, "pagina": pagina, "versiones": versiones(Producto, Proveedor),
+    })
+
+BUSQUEDA_LIMITE = 20
+
+def buscar_productos(q, limite=BUSQUEDA_LIMITE):
+    """
+    Productos cuyo nombre empieza con `q` y, si sobran lugares, los que lo
+    contienen. En PostgreSQL ambas búsquedas usan el índice trigram sobre
+    UPPER(nombre); en otros motores el prefijo se busca como rango sobre
+    Lower(nombre) para usar producto_nombre_lower_idx.
+    """
+    q = q.strip().lower()
+    if not q:
+        return []
+    campos = ("id", "nombre", "stock", "precio_venta", "precio_compra")
+    if connection.vendor == "postgresql":
+        prefijo = Producto.objects.filter(nombre__istartswith=q).order_by("nombre")
+    else:
+        prefijo = (
+            Producto.objects
+            .annotate(nombre_min=Lower("nombre"))
+            .filter(nombre_min__gte=q, nombre_min__lt=q + "\U0010ffff")
+            .order_by("nombre_min")
+        )
+    por_prefijo = list(prefijo.values(*campos)[:limite])
+    if len(por_prefijo) < limite:
+        por_prefijo += list(
+            Producto.objects
+            .filter(nombre__icontains=q)
+            .exclude(id__in=[p["id"] for p in por_prefijo])
+            .order_by("nombre")
+            .values(*campos)[:limite - len(por_prefijo)]
+        )
+    return por_prefijo
 
 @login_required(login_url="/usuarios/login/")
+def productos_buscar(request):
+    resultados = buscar_productos(request.GET.get("q", ""))
+    return JsonResponse({"resultados": [
+        {
+            "id": p["id"],
+            "nombre": p["nombre"],
+            "stock": p["stock"],
+            "precio_venta": int(p["precio_venta"]),
+            "precio_compra": int(p["precio_compra"]),
+        }
+        for p in resultados
+    ]})
+
+@login_required(login_url="/usuarios/login/")
+@transaction.atomic
 def agregar_productos(request):
     if request.method == "POST":
         nombre = request.POST.get("nombre", "").strip()
@@ -132,12 +239,13 @@ def agregar_productos(request):
         elif not precio_compra.isdigit() or not precio_venta.isdigit() or not stock.isdigit():
             messages.error(request, "Precio y stock deben ser números enteros.")
         else:
-            Producto.objects.create(
+            producto = Producto.objects.create(
                 nombre=nombre,
                 precio_compra=int(precio_compra),
                 precio_venta=int(precio_venta),
                 stock=int(stock),
             )
+            registrar_movimientos({producto.id: producto.stock}, "ajuste")
             messages.success(request, "Producto agregado.")
             return redirect("bodega:productos")
 
@@ -146,8 +254,11 @@ def agregar_productos(request):
 agregar_producto = agregar_productos
 
 @login_required(login_url="/usuarios/login/")
+@transaction.atomic
 def editar_productos(request, pk):
-    producto = get_object_or_404(Producto, pk=pk)
+    # Solo el POST bloquea la fila: el stock anterior es el que se descuenta en el ajuste
+    qs = Producto.objects.select_for_update() if request.method == "POST" else Producto.objects.all()
+    producto = get_object_or_404(qs, pk=pk)
     if request.method == "POST":
         nombre = request.POST.get("nombre", "").strip()
         precio_compra = request.POST.get("precio_compra", "").strip()
@@ -162,6 +273,7 @@ def editar_productos(request, pk):
             producto.nombre = nombre
             producto.precio_compra = int(precio_compra)
             producto.precio_venta = int(precio_venta)
+            registrar_movimientos({producto.id: int(stock) - producto.stock}, "ajuste")
             producto.stock = int(stock)
             producto.save()
             messages.success(request, "Producto actualizado.")
@@ -169,6 +281,118 @@ def editar_productos(request, pk):
 
     return render(request, "editar_productos.html", {"producto": producto})
 
+def _productos_en_riesgo():
+    """
+    Productos con stock <= stock_minimo agrupados por proveedor, del faltante
+    mayor al menor. El filtro coincide con el índice parcial producto_stock_bajo_idx.
+    """
+    qs = (
+        Producto.objects
+        .filter(stock__lte=F("stock_minimo"))
+        .select_related("proveedor")
+        .annotate(faltante=F("stock_minimo") - F("stock"))
+        .order_by(F("proveedor__nombre").asc(nulls_last=True), "-faltante", "nombre")
+    )
+    grupos = {}
+    for p in qs:
+        grupos.setdefault(p.proveedor_id, {"proveedor": p.proveedor, "productos": []})["productos"].append(p)
+    return list(grupos.values())
+
+@login_required(login_url="/usuarios/login/")
+def productos_stock_bajo(request):
+    return render(request, "productos_stock_bajo.html", {"grupos": _productos_en_riesgo()})
+
+@api_login_required
+def api_stock_bajo(request):
+    return JsonResponse({"proveedores": [
+        {
+            "proveedor_id": g["proveedor"].id if g["proveedor"] else None,
+            "proveedor": g["proveedor"].nombre if g["proveedor"] else None,
+            "productos": [
+                {
+                    "id": p.id,
+                    "nombre": p.nombre,
+                    "stock": p.stock,
+                    "stock_minimo": p.stock_minimo,
+                    "faltante": p.faltante,
+                }
+                for p in g["productos"]
+            ],
+        }
+        for g in _productos_en_riesgo()
+    ]})
+
+def _parametro(request, nombre, defecto, minimo, maximo):
+    valor = request.GET.get(nombre, "")
+    return min(max(int(valor), minimo), maximo) if valor.isdigit() else defecto
+
+@login_required(login_url="/usuarios/login/")
+def productos_reposicion(request):
+    params = {
+        "dias": _parametro(request, "dias", DIAS_REPOSICION, 1, 365),
+        "plazo": _parametro(request, "plazo", PLAZO, 0, 90),
+        "cobertura": _parametro(request, "cobertura", COBERTURA, 0, 180),
+    }
+    if request.method == "POST":
+        if not es_admin(request.user):
+            messages.error(request, "Solo un administrador puede actualizar el stock mínimo.")
+        else:
+            n = guardar_stock_minimo(**params)
+            messages.success(request, f"Stock mínimo actualizado en {n} productos.")
+        return redirect(f"{request.path}?dias={params['dias']}&plazo={params['plazo']}&cobertura={params['cobertura']}")
+
+    qs = (
+        sugerencias(**params)
+        .filter(cantidad_sugerida__gt=0)
+        .select_related("proveedor")
+        .order_by(F("proveedor__nombre").asc(nulls_last=True), F("dias_cobertura").asc(nulls_last=True), "nombre")
+    )
+    grupos = {}
+    for p in qs:
+        grupos.setdefault(p.proveedor_id, {"proveedor": p.proveedor, "productos": []})["productos"].append(p)
+    return render(request, "productos_reposicion.html", {
+        "grupos": list(grupos.values()),
+        "puede_guardar": es_admin(request.user),
+        **params,
+    })
+
+@api_login_required
+def api_stock_historico(request, pk):
+    """Stock del producto al cierre del día ?fecha=AAAA-MM-DD (hora local)."""
+    producto = get_object_or_404(Producto, pk=pk)
+    fecha = parse_fecha(request.GET.get("fecha"))
+    if fecha is None:
+        return JsonResponse({"error": "Indicá ?fecha=AAAA-MM-DD."}, status=400)
+    # Cierre del día: instante anterior a la medianoche siguiente
+    _, fin = rango_timestamps(fecha, fecha)
+    momento = fin - timedelta(microseconds=1)
+    return JsonResponse({
+        "producto_id": producto.id,
+        "producto": producto.nombre,
+        "fecha": fecha.isoformat(),
+        "stock": stock_en(producto.id, momento),
+    })
+
+@user_passes_test(es_admin, login_url="/usuarios/login/")
+def productos_importar(request):
+    resultado = None
+    if request.method == "POST":
+        archivo = request.FILES.get("archivo")
+        if not archivo:
+            messages.error(request, "Elegí un archivo CSV.")
+        else:
+            try:
+                resultado = importar_productos(io.TextIOWrapper(archivo.file, encoding="utf-8-sig", newline=""))
+            except UnicodeDecodeError:
+                messages.error(request, "El archivo debe estar en UTF-8.")
+            else:
+                messages.success(
+                    request,
+                    f"Importación terminada: {resultado.insertados} nuevos, "
+                    f"{resultado.actualizados} actualizados, {resultado.rechazados} rechazados.",
+                )
+    return render(request, "productos_importar.html", {"resultado": resultado})
+
 @login_required(login_url="/usuarios/login/")
 def eliminar_productos(request, pk):
     producto = get_object_or_404(Producto, pk=pk)
@@ -180,6 +404,8 @@ def eliminar_productos(request, pk):
 # Proveedores
 # -------------------------
 @login_required(login_url="/usuarios/login/")
+@cache_control(private=True, no_cache=True)
+@etag(etag_versiones(Proveedor))
 def proveedores_list(request):
     if request.method == "POST":
         nombre = (request.POST.get("nombre") or "").strip()
@@ -236,8 +462,8 @@ def proveedores_eliminar(request, pk):
 # Compras
 # -------------------------
 @login_required(login_url="/usuarios/login/")
+@transaction.atomic
 def compras(request):
-    productos = Producto.objects.order_by("nombre")
     proveedores = Proveedor.objects.order_by("nombre")
 
     if request.method == "POST":
@@ -257,7 +483,7 @@ def compras(request):
             messages.error(request, "Valores inválidos.")
             return redirect("bodega:compras")
 
-        if producto_id:
+        if producto_id and producto_id.isdigit():
             prod = get_object_or_404(Producto, pk=producto_id)
         else:
             if not nombre_nuevo:
@@ -277,25 +503,34 @@ def compras(request):
 
         proveedor = get_object_or_404(Proveedor, pk=proveedor_id) if proveedor_id else None
 
-        Compra.objects.create(
+        compra = Compra.objects.create(
             producto=prod,
             cantidad=cantidad,
             precio_total=precio_compra * cantidad,
             proveedor=proveedor,
         )
+        registrar_compra(compra, cantidad, compra.precio_total)
+        registrar_movimientos({prod.id: cantidad}, "compra", compra.id)
 
         messages.success(request, "Compra registrada.")
         return redirect("bodega:compras")
 
-    ultimas = Compra.objects.select_related("producto", "proveedor").order_by("-fecha")[:25]
+    qs = _filtrar_fechas(request, Compra.objects.select_related("producto", "proveedor"))
+    producto_q = (request.GET.get("producto") or "").strip()
+    if producto_q:
+        qs = qs.filter(producto__nombre__icontains=producto_q)
+    ultimas = paginar(qs, ["-fecha", "-id"], request, por_pagina=25)
 
     return render(request, "compras.html", {
-        "productos": productos,
         "proveedores": proveedores,
         "ultimas": ultimas,
+        "pagina": ultimas,
+        "producto_q": producto_q,
+        "versiones": versiones(Proveedor),
     })
 
 @login_required(login_url="/usuarios/login/")
+@transaction.atomic
 def compras_editar(request, pk):
     compra = get_object_or_404(Compra, pk=pk)
 
@@ -328,6 +563,8 @@ def compras_editar(request, pk):
     producto = compra.producto
     producto.stock = F("stock") + delta
     producto.save(update_fields=["stock"])
+    registrar_compra(compra, delta, nuevo_precio_total - compra.precio_total)
+    registrar_movimientos({producto.id: delta}, "compra_edicion", compra.id)
 
     compra.cantidad = nueva_cantidad
     compra.precio_total = nuevo_precio_total
@@ -337,21 +574,130 @@ def compras_editar(request, pk):
     return redirect("bodega:compras")
 
 @login_required(login_url="/usuarios/login/")
+@transaction.atomic
 def compras_eliminar(request, pk):
     compra = get_object_or_404(Compra, pk=pk)
     producto = compra.producto
     producto.stock = F("stock") - compra.cantidad
     producto.save(update_fields=["stock"])
+    registrar_compra(compra, -compra.cantidad, -compra.precio_total)
+    registrar_movimientos({producto.id: -compra.cantidad}, "compra_anulacion", compra.id)
     compra.delete()
     messages.info(request, "Compra eliminada.")
     return redirect("bodega:compras")
 
+# -------------------------
+# Órdenes de compra (ver ordenes.py)
+# -------------------------
+FILAS_ORDEN = 10
+
+@login_required(login_url="/usuarios/login/")
+def ordenes_compra(request):
+    qs = _filtrar_fechas(request, OrdenCompra.objects.select_related("proveedor").annotate(
+        cantidad_lineas=Count("lineas"), total=Sum("lineas__precio_total"),
+    ))
+    producto_q = (request.GET.get("producto") or "").strip()
+    if producto_q:
+        qs = qs.filter(Exists(Compra.objects.filter(orden=OuterRef("pk"), producto__nombre__icontains=producto_q)))
+    ordenes = paginar(qs, ["-fecha", "-id"], request, por_pagina=25)
+    return render(request, "ordenes_compra.html", {
+        "ordenes": ordenes, "pagina": ordenes, "producto_q": producto_q,
+    })
+
+@login_required(login_url="/usuarios/login/")
+def ordenes_compra_nueva(request):
+    errores = []
+    filas = [{}] * FILAS_ORDEN
+    proveedor_id = request.POST.get("proveedor_id") or ""
+    if request.method == "POST":
+        proveedor = get_object_or_404(Proveedor, pk=proveedor_id) if proveedor_id.isdigit() else None
+        archivo = request.FILES.get("archivo")
+        try:
+            if archivo:
+                lineas = lineas_de_csv(io.TextIOWrapper(archivo.file, encoding="utf-8-sig", newline=""))
+            else:
+                lineas = lineas_de_formulario(request.POST)
+            orden = crear_orden(proveedor, lineas)
+        except UnicodeDecodeError:
+            errores = ["El archivo debe estar en UTF-8."]
+        except OrdenError as e:
+            errores = e.errores
+        else:
+            messages.success(request, f"Orden #{orden.id} registrada con {len(lineas)} líneas.")
+            caros = precios_sobre_venta(orden)
+            if caros:
+                messages.warning(request, f"Precio de compra mayor al de venta: {', '.join(caros)}. Revisá los precios de venta.")
+            return redirect("bodega:ordenes_compra_detalle", pk=orden.id)
+        # Se vuelven a mostrar las filas cargadas para corregirlas
+        cargadas = [
+            dict(zip(("producto", "cantidad", "precio_compra"), valores))
+            for valores in zip(*(request.POST.getlist(c) for c in ("producto", "cantidad", "precio_compra")))
+        ]
+        filas = cargadas + [{}] * max(0, FILAS_ORDEN - len(cargadas))
+
+    return render(request, "ordenes_compra_form.html", {
+        "proveedores": Proveedor.objects.order_by("nombre"),
+        "proveedor_id": proveedor_id,
+        "filas": filas,
+        "errores": errores,
+    })
+
+def _precio_unitario(precio_total, cantidad):
+    """Precio unitario que muestra el detalle de la orden (redondeado hacia abajo)."""
+    return int(precio_total // cantidad)
+
+@login_required(login_url="/usuarios/login/")
+def ordenes_compra_detalle(request, pk):
+    orden = get_object_or_404(OrdenCompra.objects.select_related("proveedor"), pk=pk)
+    if request.method == "POST":
+        cambios = {}
+        for compra_id, cantidad_actual, total_actual in orden.lineas.values_list("id", "cantidad", "precio_total"):
+            cantidad = request.POST.get(f"cantidad_{compra_id}", "").strip()
+            precio = request.POST.get(f"precio_{compra_id}", "").strip()
+            if not cantidad.isdigit() or not precio.isdigit():
+                messages.error(request, "Cantidad y precio deben ser enteros.")
+                return redirect("bodega:ordenes_compra_detalle", pk=orden.id)
+            # El formulario manda todas las líneas: las que no se tocaron conservan su total, aunque
+            # no sea múltiplo de la cantidad (p. ej. editado desde compras_editar)
+            if (int(cantidad), int(precio)) == (cantidad_actual, _precio_unitario(total_actual, cantidad_actual)):
+                continue
+            cambios[compra_id] = (int(cantidad), int(precio))
+        try:
+            editadas = editar_orden(orden, cambios)
+        except OrdenError as e:
+            for error in e.errores:
+                messages.error(request, error)
+        else:
+            messages.success(request, f"Orden actualizada ({editadas} líneas).")
+        return redirect("bodega:ordenes_compra_detalle", pk=orden.id)
+
+    lineas = list(orden.lineas.select_related("producto").order_by("id"))
+    for c in lineas:
+        c.precio_unitario = _precio_unitario(c.precio_total, c.cantidad)
+    return render(request, "ordenes_compra_detalle.html", {
+        "orden": orden,
+        "lineas": lineas,
+        "total": sum(c.precio_total for c in lineas),
+    })
+
+@login_required(login_url="/usuarios/login/")
+@require_POST
+def ordenes_compra_eliminar(request, pk):
+    orden = get_object_or_404(OrdenCompra, pk=pk)
+    try:
+        anular_orden(orden)
+    except OrdenError as e:
+        for error in e.errores:
+            messages.error(request, error)
+        return redirect("bodega:ordenes_compra_detalle", pk=pk)
+    messages.info(request, f"Orden #{pk} anulada.")
+    return redirect("bodega:ordenes_compra")
+
 # -------------------------
 # Ventas
 # -------------------------
 @login_required(login_url="/usuarios/login/")
 def ventas(request):
-    productos = Producto.objects.order_by("nombre")
     carrito = _get_carrito(request)
 
     if request.method == "POST" and request.POST.get("accion") == "agregar":
@@ -367,46 +713,31 @@ def ventas(request):
             messages.error(request, "Cantidad inválida.")
             return redirect("bodega:ventas")
 
+        if not (producto_id or "").isdigit():
+            messages.error(request, "Elegí un producto.")
+            return redirect("bodega:ventas")
         prod = get_object_or_404(Producto, pk=producto_id)
 
         if cantidad > prod.stock:
             messages.error(request, f"Stock insuficiente para {prod.nombre}. Stock: {prod.stock}")
             return redirect("bodega:ventas")
 
-        for item in carrito:
-            if item["producto_id"] == prod.id:
-                item["cantidad"] += cantidad
-                item["total"] = int(item["precio"]) * item["cantidad"]
-                break
-        else:
-            precio = int(prod.precio_venta)
-            carrito.append({
-                "producto_id": prod.id,
-                "producto": prod.nombre,
-                "precio": precio,
-                "cantidad": cantidad,
-                "total": precio * cantidad,
-                "tipo": tipo,
-            })
-
+        carrito.agregar(prod, cantidad, tipo)
         _guardar_carrito(request, carrito)
         messages.success(request, "Producto agregado al carrito.")
         return redirect("bodega:ventas")
 
-    total_carrito = sum(int(i["total"]) for i in carrito) if carrito else 0
-
     return render(request, "ventas.html", {
-        "productos": productos, "carrito": carrito, "total_carrito": total_carrito
+        "carrito": carrito.items(), "total_carrito": carrito.total
     })
 
 @login_required(login_url="/usuarios/login/")
-def ventas_modificar_item(request, index):
+def ventas_modificar_item(request, producto_id):
     carrito = _get_carrito(request)
-    if request.method == "POST" and 0 <= index < len(carrito):
+    if request.method == "POST" and producto_id in carrito:
         cantidad = request.POST.get("cantidad", "1")
         if cantidad.isdigit() and int(cantidad) > 0:
-            carrito[index]["cantidad"] = int(cantidad)
-            carrito[index]["total"] = int(carrito[index]["precio"]) * int(cantidad)
+            carrito.modificar(producto_id, int(cantidad))
             _guardar_carrito(request, carrito)
             messages.info(request, "Ítem actualizado.")
         else:
@@ -414,113 +745,421 @@ def ventas_modificar_item(request, index):
     return redirect("bodega:ventas")
 
 @login_required(login_url="/usuarios/login/")
-def ventas_eliminar_item(request, index):
+def ventas_eliminar_item(request, producto_id):
     carrito = _get_carrito(request)
-    if 0 <= index < len(carrito):
-        carrito.pop(index)
+    if carrito.quitar(producto_id):
         _guardar_carrito(request, carrito)
         messages.info(request, "Ítem eliminado.")
     return redirect("bodega:ventas")
 
 @login_required(login_url="/usuarios/login/")
 def ventas_vaciar(request):
-    request.session["carrito"] = []
-    request.session.modified = True
+    _vaciar_carrito(request)
     messages.info(request, "Carrito vaciado.")
     return redirect("bodega:ventas")
 
 @login_required(login_url="/usuarios/login/")
-@transaction.atomic
 def confirmar_venta(request):
-    carrito = _get_carrito(request)
+    carrito = _get_carrito(request).items()
     if not carrito:
         messages.error(request, "Carrito vacío.")
         return redirect("bodega:ventas")
 
-    total = Decimal("0")
-    ids = [i["producto_id"] for i in carrito]
-    productos_cache = {p.id: p for p in Producto.objects.select_for_update().filter(id__in=ids)}
-
-    for item in carrito:
-        p = productos_cache[item["producto_id"]]
-        if item["cantidad"] > p.stock:
-            messages.error(request, f"Stock insuficiente para {p.nombre}.")
-            return redirect("bodega:ventas")
-        total += Decimal(item["precio"]) * item["cantidad"]
-
-    venta = Venta.objects.create(total=total, tipo="minorista")
-
-    for item in carrito:
-        p = productos_cache[item["producto_id"]]
-        # Guardar precio_unitario al momento de la venta
-        DetalleVenta.objects.create(
-            venta=venta,
-            producto=p,
-            cantidad=item["cantidad"],
-            precio_unitario=p.precio_venta
-        )
-        p.stock = F("stock") - item["cantidad"]
-        p.save(update_fields=["stock"])
+    try:
+        venta = crear_venta(carrito, tipo="minorista")
+    except VentaError as e:
+        messages.error(request, str(e))
+        return redirect("bodega:ventas")
 
-    request.session["carrito"] = []
-    request.session.modified = True
+    _vaciar_carrito(request)
 
     messages.success(request, f"Venta #{venta.id} confirmada.")
     return redirect("bodega:ventas")
 
+def _venta_json(venta):
+    return {
+        "id": venta.id,
+        "fecha": venta.fecha.isoformat(),
+        "tipo": venta.tipo,
+        "total": int(venta.total),
+        "clave_cliente": venta.clave_cliente,
+        "detalles": [
+            {
+                "producto_id": d.producto_id,
+                "producto": d.producto.nombre,
+                "cantidad": d.cantidad,
+                "precio_unitario": int(d.precio_unitario),
+                "subtotal": int(d.subtotal),
+            }
+            for d in venta.detalles.all()
+        ],
+    }
+
+def _leer_lineas_api(items):
+    """
+    Convierte los ítems del JSON ({producto_id|codigo, cantidad}) en líneas
+    de venta, resolviendo todos los códigos en una sola consulta. Lanza
+    ValueError si los ítems están mal formados y VentaError si un código no existe.
+    """
+    if not isinstance(items, list) or not items:
+        raise ValueError("La venta no tiene ítems.")
+    codigos = {str(i["codigo"]) for i in items if isinstance(i, dict) and i.get("codigo")}
+    por_codigo = dict(Producto.objects.filter(codigo__in=codigos).values_list("codigo", "id")) if codigos else {}
+
+    lineas = []
+    for item in items:
+        if not isinstance(item, dict):
+            raise ValueError("Ítem inválido.")
+        cantidad = item.get("cantidad", 1)
+        if not isinstance(cantidad, int) or isinstance(cantidad, bool) or cantidad <= 0:
+            raise ValueError("Cantidad inválida.")
+        if item.get("codigo"):
+            producto_id = por_codigo.get(str(item["codigo"]))
+            if producto_id is None:
+                raise VentaError(f"Código desconocido: {item['codigo']}.")
+        elif isinstance(item.get("producto_id"), int):
+            producto_id = item["producto_id"]
+        else:
+            raise ValueError("Cada ítem necesita producto_id o codigo.")
+        lineas.append({"producto_id": producto_id, "cantidad": cantidad})
+    return lineas
+
+@api_login_required
+@require_POST
+def api_ventas(request):
+    """
+    Registra una venta completa en un solo request JSON:
+    {"tipo": "minorista", "items": [{"codigo": "...", "cantidad": 2}, ...]}.
+    El header Idempotency-Key (o "clave_cliente" en el cuerpo) hace que un
+    reintento devuelva la venta ya creada en lugar de vender dos veces.
+    """
+    try:
+        datos = json.loads(request.body or b"{}")
+    except ValueError:
+        return JsonResponse({"error": "JSON inválido."}, status=400)
+    if not isinstance(datos, dict):
+        return JsonResponse({"error": "JSON inválido."}, status=400)
+
+    clave = request.headers.get("Idempotency-Key") or datos.get("clave_cliente") or ""
+    if not isinstance(clave, str):
+        return JsonResponse({"error": "clave_cliente debe ser un texto."}, status=400)
+    clave = clave.strip() or None
+    if clave and len(clave) > Venta._meta.get_field("clave_cliente").max_length:
+        return JsonResponse({"error": "Clave de idempotencia demasiado larga."}, status=400)
+    tipo = datos.get("tipo", "minorista")
+    if not isinstance(tipo, str) or tipo not in dict(Venta.TIPO_VENTA):
+        return JsonResponse({"error": "Tipo de venta inválido."}, status=400)
+
+    ventas_con_detalles = Venta.objects.prefetch_related("detalles__producto")
+    if clave:
+        previa = ventas_con_detalles.filter(clave_cliente=clave).first()
+        if previa:
+            return JsonResponse(_venta_json(previa), status=200)
+
+    try:
+        lineas = _leer_lineas_api(datos.get("items"))
+    except ValueError as e:
+        # Datos mal formados; VentaError (producto inexistente, sin stock) es 409
+        return JsonResponse({"error": str(e)}, status=400)
+    except VentaError as e:
+        return JsonResponse({"error": str(e)}, status=409)
+    try:
+        venta = crear_venta(lineas, tipo=tipo, clave_cliente=clave)
+    except VentaError as e:
+        return JsonResponse({"error": str(e)}, status=409)
+    except IntegrityError:
+        # Otro request con la misma clave ganó la carrera
+        previa = ventas_con_detalles.filter(clave_cliente=clave).first() if clave else None
+        if previa is None:
+            raise
+        return JsonResponse(_venta_json(previa), status=200)
+
+    return JsonResponse(_venta_json(ventas_con_detalles.get(pk=venta.pk)), status=201)
+
+@api_login_required
+@require_POST
+def api_ventas_lote(request):
+    """
+    Recibe ventas registradas sin conexión: {"ventas": [{"uuid": "...",
+    "fecha": "2025-01-31T18:05:00", "tipo": "minorista", "items": [...]}, ...]}.
+    Las ventas cuyo uuid ya se registró se informan como repetidas; las que
+    no pueden aplicarse, como rechazadas con su motivo.
+    """
+    try:
+        datos = json.loads(request.body or b"{}")
+    except ValueError:
+        return JsonResponse({"error": "JSON inválido."}, status=400)
+    ventas = datos.get("ventas") if isinstance(datos, dict) else None
+    if not isinstance(ventas, list):
+        return JsonResponse({"error": "Falta la lista de ventas."}, status=400)
+    if len(ventas) > MAX_VENTAS_POR_LOTE:
+        return JsonResponse({"error": f"Máximo {MAX_VENTAS_POR_LOTE} ventas por lote."}, status=413)
+    return JsonResponse(ingerir_ventas(ventas).como_dict())
+
 @login_required(login_url="/usuarios/login/")
+@usar_replica
 def ventas_historial(request):
-    ventas = (
-        Venta.objects
-        .prefetch_related("detalles__producto")
-        .order_by("-fecha")[:100]
-    )
-    return render(request, "ventas_historial.html", {"ventas": ventas})
+    qs = _filtrar_fechas(request, Venta.objects.prefetch_related("detalles__producto"))
+    producto_q = (request.GET.get("producto") or "").strip()
+    if producto_q:
+        qs = qs.filter(Exists(DetalleVenta.objects.filter(
+            venta=OuterRef("pk"), producto__nombre__icontains=producto_q,
+        )))
+    ventas = paginar(qs, ["-fecha", "-id"], request)
+    return render(request, "ventas_historial.html", {
+        "ventas": ventas, "pagina": ventas, "producto_q": producto_q,
+    })
 
 # -------------------------
 # Reportes
 # -------------------------
+def _periodo_pedido(request):
+    """(periodo, desde, hasta) a partir de ?periodo=&desde=&hasta=; si es inválido, hoy."""
+    periodo = request.GET.get("periodo", "dia")
+    if periodo not in dict(PERIODOS):
+        periodo = "dia"
+    try:
+        desde, hasta = rango_fechas(
+            periodo,
+            parse_fecha(request.GET.get("desde")),
+            parse_fecha(request.GET.get("hasta")),
+        )
+    except ValueError as e:
+        messages.error(request, str(e))
+        periodo = "dia"
+        desde, hasta = rango_fechas(periodo)
+    return periodo, desde, hasta
+
 @login_required(login_url="/usuarios/login/")
+@usar_replica
 def reportes(request):
-    hoy = timezone.localdate()
+    periodo, desde, hasta = _periodo_pedido(request)
 
-    detalles_con_subtotal = (
-        DetalleVenta.objects
-        .filter(venta__fecha__date=hoy)
-        .annotate(
-            subtotal=ExpressionWrapper(
-                F("cantidad") * F("producto__precio_venta"),
-                output_field=DecimalField(max_digits=18, decimal_places=0),
-            )
-        )
+    # Los resúmenes están indexados por (fecha, producto): un año son unas
+    # pocas filas por producto, sin tocar Venta ni DetalleVenta.
+    totales = ResumenDiario.objects.filter(fecha__gte=desde, fecha__lte=hasta).aggregate(
+        ventas=Sum("total_ventas"), compras=Sum("total_compras"), cantidad=Sum("cantidad_ventas"),
     )
+    total_ventas = totales["ventas"] or Decimal("0")
+    total_compras = totales["compras"] or Decimal("0")
 
-    ventas_detalle_hoy = (
-        detalles_con_subtotal
+    resumen_productos = (
+        ResumenProductoDiario.objects
+        .filter(fecha__gte=desde, fecha__lte=hasta)
         .values("producto__id", "producto__nombre")
-        .annotate(
-            cantidad=Sum("cantidad"),
-            total=Sum("subtotal"),
-        )
+    )
+    ventas_detalle = (
+        resumen_productos
+        .annotate(cantidad=Sum("cantidad_vendida"), total=Sum("total_vendido"))
+        .filter(cantidad__gt=0)
         .order_by("-total")
     )
-
-    total_ventas = ventas_detalle_hoy.aggregate(s=Sum("total"))["s"] or Decimal("0")
-
-    compras_detalle_hoy = (
-        Compra.objects.filter(fecha__date=hoy)
-        .values("producto__id", "producto__nombre")
-        .annotate(
-            cantidad=Sum("cantidad"),
-            total=Sum("precio_total"),
-        )
+    compras_detalle = (
+        resumen_productos
+        .annotate(cantidad=Sum("cantidad_comprada"), total=Sum("total_comprado"))
+        .filter(cantidad__gt=0)
         .order_by("-total")
     )
-    total_compras = compras_detalle_hoy.aggregate(s=Sum("total"))["s"] or Decimal("0")
 
     return render(request, "reportes.html", {
+        "periodos": PERIODOS,
+        "periodo": periodo,
+        "desde": desde,
+        "hasta": hasta,
+        "cantidad_ventas": totales["cantidad"] or 0,
         "total_ventas": total_ventas,
         "total_compras": total_compras,
-        "ventas_detalle_hoy": ventas_detalle_hoy,
-        "compras_detalle_hoy": compras_detalle_hoy,
+        "ventas_detalle": ventas_detalle,
+        "compras_detalle": compras_detalle,
+    })
+
+@login_required(login_url="/usuarios/login/")
+def reportes_tendencias(request):
+    por = request.GET.get("por", "mes")
+    if por not in {valor for valor, *_ in GRANULARIDADES}:
+        por = "mes"
+    producto = None
+    producto_id = request.GET.get("producto_id", "")
+    if producto_id.isdigit():
+        producto = Producto.objects.filter(pk=producto_id).only("id", "nombre").first()
+
+    # Los períodos cerrados salen del caché: solo el actual se consulta. No usa la
+    # réplica: un período cerrado se guarda para siempre y no puede salir de una lectura atrasada.
+    filas = serie(por, producto_id=producto.id if producto else None)
+    maximo = max(f["ventas"] for f in filas) or 1
+    for f in filas:
+        f["barra"] = round(f["ventas"] * 100 / maximo)
+
+    return render(request, "reportes_tendencias.html", {
+        "granularidades": GRANULARIDADES,
+        "por": por,
+        "producto": producto,
+        "filas": filas,
+        "total_ventas": sum(f["ventas"] for f in filas),
+        "total_compras": sum(f["compras"] for f in filas),
+    })
+
+MARGEN_AGRUPACIONES = {
+    "producto": ("producto__id", "producto__nombre"),
+    "proveedor": ("producto__proveedor__id", "producto__proveedor__nombre"),
+}
+
+@login_required(login_url="/usuarios/login/")
+@usar_replica
+def reportes_margenes(request):
+    periodo, desde, hasta = _periodo_pedido(request)
+    agrupar = request.GET.get("agrupar", "producto")
+    if agrupar not in MARGEN_AGRUPACIONES:
+        agrupar = "producto"
+    id_campo, nombre_campo = MARGEN_AGRUPACIONES[agrupar]
+
+    # Costo y venta ya están sumados por día y producto: no se recorren los detalles
+    filas = list(
+        ResumenProductoDiario.objects
+        .filter(fecha__gte=desde, fecha__lte=hasta, cantidad_vendida__gt=0)
+        .values(grupo=F(id_campo), nombre=F(nombre_campo))
+        .annotate(
+            cantidad=Sum("cantidad_vendida"),
+            ventas=Sum("total_vendido"),
+            costo=Sum("costo_vendido"),
+        )
+        .annotate(margen=F("ventas") - F("costo"))
+        .order_by("-margen", "nombre")
+    )
+    for f in filas:
+        f["margen_pct"] = round(f["margen"] * 100 / f["ventas"], 1) if f["ventas"] else None
+    ventas = sum(f["ventas"] for f in filas)
+    margen = sum(f["margen"] for f in filas)
+
+    return render(request, "reportes_margenes.html", {
+        "periodos": PERIODOS,
+        "periodo": periodo,
+        "desde": desde,
+        "hasta": hasta,
+        "agrupar": agrupar,
+        "filas": filas,
+        "total_ventas": ventas,
+        "total_costo": ventas - margen,
+        "total_margen": margen,
+        "margen_pct": round(margen * 100 / ventas, 1) if ventas else None,
+    })
+
+@login_required(login_url="/usuarios/login/")
+@usar_replica
+def reportes_stock(request):
+    """Productos cuyo stock no coincide con compras - ventas + ajustes (ver conciliacion.py)."""
+    filas = list(desvios())
+    return render(request, "reportes_stock.html", {
+        "filas": filas,
+        "faltante": -sum(f["diferencia"] for f in filas if f["diferencia"] < 0),
+        "sobrante": sum(f["diferencia"] for f in filas if f["diferencia"] > 0),
+        "puede_corregir": es_admin(request.user),
     })
+
+@login_required(login_url="/usuarios/login/")
+@require_POST
+def reportes_stock_corregir(request):
+    if not es_admin(request.user):
+        messages.error(request, "Solo un administrador puede corregir el stock.")
+        return redirect("bodega:reportes_stock")
+    # Recorre todo el catálogo: va en segundo plano y deja el detalle en un CSV
+    trabajo = encolar("conciliar_stock", {"corregir": True}, request.user)
+    messages.success(request, f"Corrección encolada como trabajo #{trabajo.id}.")
+    return redirect("bodega:trabajo_detalle", pk=trabajo.id)
+
+@login_required(login_url="/usuarios/login/")
+@usar_replica
+def exportar_csv(request, tipo):
+    if tipo not in EXPORTACIONES:
+        raise Http404("Exportación inexistente.")
+    _, desde, hasta = _periodo_pedido(request)
+    ini, fin = rango_timestamps(desde, hasta)
+    response = StreamingHttpResponse(filas_csv(tipo, ini, fin), content_type="text/csv; charset=utf-8")
+    response["Content-Disposition"] = f'attachment; filename="{tipo}_{desde}_{hasta}.csv"'
+    return response
+
+# -------------------------
+# Trabajos en segundo plano (ver trabajos.py)
+# -------------------------
+def _trabajos_visibles(user):
+    qs = Trabajo.objects.select_related("creado_por")
+    return qs if es_admin(user) else qs.filter(creado_por=user)
+
+def _trabajo_json(trabajo):
+    return {
+        "id": trabajo.id,
+        "tipo": trabajo.tipo,
+        "estado": trabajo.estado,
+        "progreso": trabajo.progreso,
+        "mensaje": trabajo.mensaje,
+        "archivo": reverse("bodega:trabajo_descargar", args=[trabajo.id]) if trabajo.archivo else None,
+    }
+
+@login_required(login_url="/usuarios/login/")
+def trabajos(request):
+    tareas = [(tipo, etiqueta) for tipo, (_, etiqueta, solo_admin, en_formulario) in TAREAS.items()
+              if en_formulario and (not solo_admin or es_admin(request.user))]
+    if request.method == "POST":
+        tipo = request.POST.get("tipo")
+        desde = parse_fecha(request.POST.get("desde"))
+        hasta = parse_fecha(request.POST.get("hasta"))
+        exportacion = request.POST.get("exportacion")
+        if tipo not in dict(tareas):
+            messages.error(request, "Trabajo inválido.")
+        elif desde is None or hasta is None or desde > hasta:
+            messages.error(request, "Indicá un rango de fechas válido.")
+        elif tipo == "exportar_csv" and exportacion not in EXPORTACIONES:
+            messages.error(request, "Exportación inválida.")
+        else:
+            parametros = {"desde": desde.isoformat(), "hasta": hasta.isoformat()}
+            if tipo == "exportar_csv":
+                parametros["tipo"] = exportacion
+            trabajo = encolar(tipo, parametros, request.user)
+            messages.success(request, f"Trabajo #{trabajo.id} encolado.")
+            return redirect("bodega:trabajo_detalle", pk=trabajo.id)
+        return redirect("bodega:trabajos")
+
+    lista = paginar(_trabajos_visibles(request.user), ["-id"], request, por_pagina=25)
+    hoy = timezone.localdate()
+    return render(request, "trabajos.html", {
+        "trabajos": lista,
+        "pagina": lista,
+        "tareas": tareas,
+        "exportaciones": sorted(EXPORTACIONES),
+        "desde": parse_fecha(request.GET.get("desde")) or hoy,
+        "hasta": parse_fecha(request.GET.get("hasta")) or hoy,
+    })
+
+@login_required(login_url="/usuarios/login/")
+def trabajo_detalle(request, pk):
+    trabajo = get_object_or_404(_trabajos_visibles(request.user), pk=pk)
+    return render(request, "trabajo_detalle.html", {
+        "trabajo": trabajo, "etiqueta": TAREAS.get(trabajo.tipo, (None, trabajo.tipo))[1],
+    })
+
+@login_required(login_url="/usuarios/login/")
+def trabajo_estado(request, pk):
+    """Estado en JSON, para consultar periódicamente desde la página del trabajo."""
+    return JsonResponse(_trabajo_json(get_object_or_404(_trabajos_visibles(request.user), pk=pk)))
+
+@login_required(login_url="/usuarios/login/")
+@require_POST
+def trabajo_cancelar(request, pk):
+    trabajo = get_object_or_404(_trabajos_visibles(request.user), pk=pk)
+    # Uno pendiente se cancela acá; uno en curso lo ve en su próximo aviso de avance
+    if not Trabajo.objects.filter(pk=pk, estado="pendiente").update(
+        estado="cancelado", cancelar=True, mensaje="Cancelado.", terminado_en=timezone.now(),
+    ):
+        Trabajo.objects.filter(pk=pk, estado="en_curso").update(cancelar=True)
+    messages.info(request, f"Se pidió cancelar el trabajo #{trabajo.id}.")
+    return redirect("bodega:trabajo_detalle", pk=pk)
+
+@login_required(login_url="/usuarios/login/")
+def trabajo_descargar(request, pk):
+    trabajo = get_object_or_404(_trabajos_visibles(request.user), pk=pk, estado="terminado")
+    if not trabajo.archivo:
+        raise Http404("El trabajo no tiene archivo.")
+    tipo = mimetypes.guess_type(trabajo.archivo)[0] or "application/octet-stream"
+    response = StreamingHttpResponse(leer_resultado(trabajo), content_type=tipo)
+    response["Content-Disposition"] = f'attachment; filename="{trabajo.archivo}"'
+    return response